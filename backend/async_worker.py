@@ -0,0 +1,303 @@
+"""
+Asyncio analysis worker: many PR analyses in flight in one process.
+
+A prefork Celery child blocks for the whole GitHub + OpenAI round trip,
+so N concurrent analyses cost N processes. This worker drives the same
+steps on httpx/AsyncOpenAI under a semaphore and writes finished reviews
+back in batches, one transaction per batch.
+
+    ANALYSIS_WORKER=async python async_worker.py --concurrency 200
+
+With ANALYSIS_WORKER=async the scheduler queues jobs in Redis
+(services/analysis_queue.py) instead of Celery; debouncing, superseded
+generations and WebSocket notifications behave the same.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import time
+from typing import List, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import settings
+from database import SessionLocal, PullRequest
+from celery_app import (save_review, review_saved, reuse_existing_review, release_job, job_ended,
+                        broadcast_analysis_complete)
+from services.ai_analyzer import analyzer, ANALYZER_VERSION
+from services.analysis_dedup import analysis_dedup
+from services.analysis_queue import analysis_queue
+from services.analysis_scheduler import analysis_scheduler
+from services.fair_share import fair_share
+from services.metrics import metrics
+from services.github_async import github_async
+from services.incremental_review import incremental_review
+from services.payload_store import payload_store
+from services.rate_limiter import RateLimited, backoff_seconds
+from services.task_state import task_state
+
+
+def load_contexts(jobs: List[Dict]) -> List[Dict]:
+    """Build stage contexts (see analyze_pr_task) for a batch of jobs in one query."""
+    db = SessionLocal()
+    try:
+        prs = {
+            pr.id: pr
+            for pr in db.query(PullRequest).filter(PullRequest.id.in_([job["pr_id"] for job in jobs]))
+        }
+        contexts = []
+        for job in jobs:
+            pr = prs.get(job["pr_id"])
+            if pr is None:
+                print(f"❌ PR with ID {job['pr_id']} not found")
+                job_ended(job.get("id"), {"error": "PR not found"})
+                continue
+            payload = payload_store.get(db, pr.payload_hash) or {}
+            base = None if job.get("force") else incremental_review.base_review(db, pr)
+            contexts.append({
+                "pr_id": pr.id,
+                "repo_name": pr.repo_name,
+                "pr_number": pr.pr_number,
+                "generation": job.get("generation"),
+                "head_sha": pr.head_sha,
+                "analyzer_version": ANALYZER_VERSION,
+                "title": pr.title,
+                "body": payload.get("pull_request", {}).get("body", ""),
+                "author": pr.author,
+                "base_review_id": base.id if base else None,
+                "base_sha": base.head_sha if base else None,
+                "started_at": time.time(),
+                "priority_class": job.get("priority_class", "small"),
+                "due_at": job.get("due_at"),
+                "lease": job.get("id"),
+                "task_id": job.get("id"),
+                "force": job.get("force", False),
+                "attempt": job.get("attempt", 0),
+                "fair_share_waits": job.get("fair_share_waits", 0)
+            })
+        return contexts
+    finally:
+        db.close()
+
+
+def reuse_review(context: Dict):
+    """Sync helper for the worker's thread pool: see reuse_existing_review."""
+    db = SessionLocal()
+    try:
+        pr = db.get(PullRequest, context["pr_id"])
+        return reuse_existing_review(db, pr, context["generation"]) if pr else None
+    finally:
+        db.close()
+
+
+class AsyncAnalysisWorker:
+    """Runs analyses concurrently and persists the results in batches."""
+
+    def __init__(self, concurrency: int = None, batch_size: int = None, batch_seconds: float = None):
+        self.concurrency = concurrency or settings.ASYNC_WORKER_CONCURRENCY
+        self.batch_size = batch_size or settings.ASYNC_WORKER_BATCH_SIZE
+        self.batch_seconds = batch_seconds if batch_seconds is not None else settings.ASYNC_WORKER_BATCH_SECONDS
+        self.in_flight = 0
+        self.saved = 0
+
+    async def run(self, context: Dict, results: asyncio.Queue, semaphore: asyncio.Semaphore):
+        self.in_flight += 1
+        try:
+            async with semaphore:
+                await self.analyze(context, results)
+        finally:
+            self.in_flight -= 1
+
+    async def analyze(self, context: Dict, results: asyncio.Queue):
+        """Fetch the diff and run the LLM for one PR, then queue it for writing."""
+        pr_id, repo_name, pr_number = context["pr_id"], context["repo_name"], context["pr_number"]
+        handed_off = False
+        try:
+            if not await asyncio.to_thread(analysis_scheduler.is_current, repo_name, pr_number, context["generation"]):
+                print(f"⏭️  PR {pr_id} superseded by a newer event, skipping")
+                await asyncio.to_thread(job_ended, context["task_id"], {"status": "superseded", "pr_id": pr_id})
+                return
+            
+            if not context["force"]:
+                reused = await asyncio.to_thread(reuse_review, context)
+                if reused:
+                    await asyncio.to_thread(job_ended, context["task_id"], reused)
+                    return
+            
+            # Same commit being analyzed elsewhere, or the repo over its limit
+            retry_in = None
+            if not await asyncio.to_thread(analysis_dedup.acquire, repo_name, pr_number,
+                                           context["head_sha"], context["lease"]):
+                retry_in = settings.ANALYSIS_LOCK_RETRY_SECONDS
+            elif not await asyncio.to_thread(fair_share.acquire, repo_name, context["lease"]):
+                retry_in = fair_share.retry_in(context["fair_share_waits"])
+                if retry_in is None:
+                    print(f"🛑 {repo_name} stayed at its analysis limit through "
+                          f"{context['fair_share_waits']} retries, giving up on PR {pr_id}")
+                    await asyncio.to_thread(broadcast_analysis_complete, pr_id, "error", repo_name, pr_number)
+                    await asyncio.to_thread(job_ended, context["task_id"],
+                                            {"status": "error", "error": f"{repo_name} is at its analysis limit"})
+                    return
+                context["fair_share_waits"] += 1
+            if retry_in is not None:
+                handed_off = True
+                await self.requeue(context, retry_in)
+                return
+            
+            timings = context["timings"] = {}
+            if context["due_at"]:
+                timings["queue_wait"] = round(max(0.0, context["started_at"] - context["due_at"]), 4)
+                metrics.observe("queue_wait_seconds", timings["queue_wait"], priority=context["priority_class"])
+
+            await asyncio.to_thread(task_state.set, context["task_id"], "fetching", pr_id=pr_id)
+            context["diff_data"] = None
+            if repo_name and pr_number:
+                with metrics.job(timings), metrics.stage("github_fetch"):
+                    if context["base_sha"]:
+                        context["diff_data"] = await github_async.get_pr_changes(
+                            repo_name, pr_number, context["base_sha"], context["head_sha"]
+                        )
+                    if not context["diff_data"]:
+                        context["diff_data"] = await github_async.get_pr_diff(repo_name, pr_number, context["head_sha"])
+
+            if not await asyncio.to_thread(analysis_scheduler.is_current, repo_name, pr_number, context["generation"]):
+                print(f"⏭️  PR {pr_id} superseded during diff fetch, skipping")
+                await asyncio.to_thread(job_ended, context["task_id"], {"status": "superseded", "pr_id": pr_id})
+                return
+
+            await asyncio.to_thread(task_state.set, context["task_id"], "analyzing")
+            with metrics.job(timings):
+                context["result"] = await analyzer.analyze_pr_async({
+                    "title": context["title"],
+                    "body": context["body"],
+                    "author": context["author"],
+                    "diff_data": context["diff_data"]
+                })
+            await results.put(context)
+            handed_off = True
+
+        except RateLimited as e:
+            # Upstream budget exhausted: back off (jittered, growing per attempt)
+            handed_off = True
+            attempt = context["attempt"]
+            await self.requeue(context, backoff_seconds(attempt, e.retry_after), attempt=attempt + 1)
+        except Exception as e:
+            print(f"❌ Error analyzing PR {pr_id}: {e}")
+            await asyncio.to_thread(broadcast_analysis_complete, pr_id, "error", repo_name, pr_number)
+            await asyncio.to_thread(job_ended, context["task_id"], {"status": "error", "error": str(e)})
+        finally:
+            if not handed_off:
+                await asyncio.to_thread(release_job, context)
+
+    async def requeue(self, context: Dict, delay: float, attempt: int = 0):
+        """Put a job back in the queue, keeping its priority and due time."""
+        # Release first: the requeued job reuses this lease id
+        await asyncio.to_thread(release_job, context)
+        await asyncio.to_thread(task_state.set, context["task_id"], "queued")
+        await asyncio.to_thread(
+            analysis_queue.push, context["pr_id"], context["generation"],
+            delay=delay, job_id=context["lease"],
+            priority_class=context["priority_class"], due_at=context["due_at"],
+            force=context["force"], attempt=attempt,
+            fair_share_waits=context["fair_share_waits"]
+        )
+
+    def write_batch(self, batch: List[Dict]):
+        """Persist a batch in one transaction; fall back to one at a time if it fails."""
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            saved = [(context, save_review(db, context)) for context in batch]
+            with metrics.stage("db_commit"):
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            db.close()
+            if len(batch) == 1:
+                context = batch[0]
+                print(f"❌ Error saving analysis for PR {context['pr_id']}: {e}")
+                release_job(context)
+                broadcast_analysis_complete(context["pr_id"], "error", context["repo_name"], context["pr_number"])
+                job_ended(context["task_id"], {"status": "error", "error": str(e)})
+                return
+            for context in batch:
+                self.write_batch([context])
+            return
+
+        db.close()
+        for context, review in saved:
+            release_job(context)
+            if review is not None:
+                self.saved += 1
+                review_saved(context, review)
+            else:
+                job_ended(context["task_id"], {"status": "skipped", "pr_id": context["pr_id"]})
+
+    async def writer(self, results: asyncio.Queue):
+        while True:
+            batch = [await results.get()]
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(results.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await asyncio.to_thread(self.write_batch, batch)
+            finally:
+                for _ in batch:
+                    results.task_done()
+
+    async def process(self, jobs: List[Dict]):
+        """Run a fixed list of jobs to completion (used by tests and benchmarks)."""
+        results = asyncio.Queue()
+        writer = asyncio.create_task(self.writer(results))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            contexts = await asyncio.to_thread(load_contexts, jobs)
+            await asyncio.gather(*(self.run(context, results, semaphore) for context in contexts))
+            await results.join()
+        finally:
+            writer.cancel()
+
+    async def serve(self, poll_seconds: float = 0.5):
+        """Claim due jobs from Redis forever, keeping up to `concurrency` in flight."""
+        results = asyncio.Queue()
+        writer = asyncio.create_task(self.writer(results))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        running = set()
+        print(f"🚀 Async analysis worker running {self.concurrency} analyses at a time")
+        try:
+            while True:
+                free = self.concurrency - self.in_flight
+                jobs = await asyncio.to_thread(analysis_queue.claim, min(free, self.batch_size))
+                if not jobs:
+                    await asyncio.sleep(poll_seconds)
+                    continue
+
+                for context in await asyncio.to_thread(load_contexts, jobs):
+                    task = asyncio.create_task(self.run(context, results, semaphore))
+                    running.add(task)  # keep a reference until it finishes
+                    task.add_done_callback(running.discard)
+        finally:
+            writer.cancel()
+            await github_async.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PullSense asyncio analysis worker")
+    parser.add_argument("--concurrency", type=int, default=settings.ASYNC_WORKER_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=settings.ASYNC_WORKER_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if settings.ANALYSIS_WORKER != "async":
+        print("⚠️  ANALYSIS_WORKER is not 'async' - the API will keep queuing jobs for Celery")
+
+    try:
+        asyncio.run(AsyncAnalysisWorker(args.concurrency, args.batch_size).serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,216 @@
+"""
+Throughput and memory: prefork-style workers vs async_worker.py.
+
+Starts a local fake GitHub + OpenAI server (fixed latency per request),
+seeds PRs into a scratch SQLite database, then analyzes them:
+
+  prefork  --processes forked workers, each running the Celery task
+           bodies back to back (one analysis per process at a time)
+  async    one process running AsyncAnalysisWorker with --concurrency
+           analyses in flight, results written in batches
+
+Memory is the summed PSS (proportional set size, so pages shared after
+fork are only counted once) of the worker processes after the run.
+
+    python benchmarks/bench_async_worker.py --prs 400 --processes 16 --concurrency 200
+"""
+import sys
+import os
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import socket
+import subprocess
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+def fake_server(port, github_latency, llm_latency):
+    """GitHub REST + OpenAI chat completions, just enough for both clients."""
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import PlainTextResponse
+
+    app = FastAPI()
+    base = f"http://127.0.0.1:{port}"
+
+    @app.get("/repos/{owner}/{repo}")
+    async def repo(owner: str, repo: str):
+        await asyncio.sleep(github_latency)
+        return {"name": repo, "full_name": f"{owner}/{repo}", "url": f"{base}/repos/{owner}/{repo}"}
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}")
+    async def pull(owner: str, repo: str, number: int, request: Request):
+        await asyncio.sleep(github_latency)
+        if request.headers.get("accept") == "application/vnd.github.diff":
+            return PlainTextResponse("".join(
+                f"diff --git a/src/module_{i}.py b/src/module_{i}.py\n--- a/src/module_{i}.py\n"
+                f"+++ b/src/module_{i}.py\n@@ -1,3 +1,12 @@\n" + "+    value = compute()\n" * 10
+                for i in range(3)
+            ))
+        return {
+            "number": number, "title": f"PR {number}", "body": "Body", "state": "open",
+            "additions": 30, "deletions": 4, "changed_files": 3, "mergeable": True,
+            "url": f"{base}/repos/{owner}/{repo}/pulls/{number}"
+        }
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}/files")
+    async def files(owner: str, repo: str, number: int):
+        await asyncio.sleep(github_latency)
+        return [
+            {"filename": f"src/module_{i}.py", "status": "modified", "additions": 10, "deletions": 1,
+             "changes": 11, "patch": "@@ -1,3 +1,12 @@\n" + "+    value = compute()\n" * 10}
+            for i in range(3)
+        ]
+
+    @app.post("/v1/chat/completions")
+    async def completions():
+        await asyncio.sleep(llm_latency)
+        return {
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+            "model": "gpt-3.5-turbo",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "Looks good. " * 50}}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 300, "total_tokens": 800}
+        }
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def pss_kib():
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def prefork_child(queue, out):
+    import celery_app
+    celery_app.app.conf.task_always_eager = True  # stage hand-offs run inline
+    done = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            pr_id = queue.get()
+            if pr_id is None:
+                break
+            celery_app.analyze_pr_task.run(pr_id)
+            done += 1
+    out.put((done, pss_kib()))
+
+
+def async_child(pr_ids, concurrency, out):
+    with contextlib.redirect_stdout(io.StringIO()):
+        from async_worker import AsyncAnalysisWorker
+        worker = AsyncAnalysisWorker(concurrency=concurrency)
+        asyncio.run(worker.process([{"pr_id": pr_id} for pr_id in pr_ids]))
+    out.put((worker.saved, pss_kib()))
+
+
+def main(args):
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix="pullsense-bench-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{workdir}/pullsense.db",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "GITHUB_API_URL": f"http://127.0.0.1:{port}",
+        "ASYNC_WORKER_CONCURRENCY": str(args.concurrency),
+        "REDIS_URL": "redis://127.0.0.1:1/0",  # no Redis: cache and stage store fall back
+    })
+    os.environ.pop("GITHUB_TOKEN", None)
+
+    server = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve", str(port),
+        "--github-latency", str(args.github_latency), "--llm-latency", str(args.llm_latency)
+    ])
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import migrations
+            import main as api
+            import celery_app
+            from database import engine
+            migrations.upgrade()
+            celery_app.broadcast_analysis_complete = lambda *a, **k: None
+
+            def seed(offset):
+                return [
+                    api.save_pull_request({
+                        "action": "opened",
+                        "pull_request": {"number": offset + n, "title": f"PR {n}", "state": "open",
+                                         "user": {"login": "bench"}, "head": {"sha": f"{n:040x}"}},
+                        "repository": {"full_name": "org/bench"}
+                    })["id"]
+                    for n in range(args.prs)
+                ]
+            prefork_ids, async_ids = seed(0), seed(args.prs)
+            engine.dispose()  # don't share pooled connections across fork
+        time.sleep(1.5)  # let the fake server bind
+
+        ctx = multiprocessing.get_context("fork")
+        print(f"{args.prs} PRs, GitHub {args.github_latency * 1000:.0f} ms/request, "
+              f"LLM {args.llm_latency * 1000:.0f} ms/request")
+
+        queue, out = ctx.Queue(), ctx.Queue()
+        for pr_id in prefork_ids:
+            queue.put(pr_id)
+        start = time.perf_counter()
+        procs = [ctx.Process(target=prefork_child, args=(queue, out)) for _ in range(args.processes)]
+        for p in procs:
+            queue.put(None)
+            p.start()
+        reports = [out.get() for _ in procs]
+        elapsed = time.perf_counter() - start
+        for p in procs:
+            p.join()
+        print(f"  prefork x{args.processes:<4d} {sum(r[0] for r in reports) / elapsed * 60:8.0f} PRs/min  "
+              f"PSS {sum(r[1] for r in reports) / 1024:7.0f} MiB")
+
+        out = ctx.Queue()
+        start = time.perf_counter()
+        proc = ctx.Process(target=async_child, args=(async_ids, args.concurrency, out))
+        proc.start()
+        saved, pss = out.get()
+        elapsed = time.perf_counter() - start
+        proc.join()
+        print(f"  async   c={args.concurrency:<4d} {saved / elapsed * 60:8.0f} PRs/min  PSS {pss / 1024:7.0f} MiB")
+
+        from sqlalchemy import func
+        from database import SessionLocal, CodeReview
+        db = SessionLocal()
+        statuses = dict(db.query(CodeReview.analysis_status, func.count()).group_by(CodeReview.analysis_status).all())
+        db.close()
+        print(f"  reviews saved by status: {statuses}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prs", type=int, default=400)
+    parser.add_argument("--processes", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--github-latency", type=float, default=0.1)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        fake_server(args.serve, args.github_latency, args.llm_latency)
+    else:
+        main(args)
@@ -0,0 +1,100 @@
+"""
+Cache entry size and lookup cost: plain JSON in Redis vs CacheService.
+
+Builds diff_data dicts shaped like get_pr_diff's (--files files, each with
+a --patch-lines line patch) and compares, per entry:
+
+  json      json.dumps / json.loads - what CacheService used to store
+  redis     what CacheService stores in Redis now (msgpack, zlib past 1 KB)
+  local     what its in-process tier keeps (msgpack)
+
+then times cache.get when served by the local tier, hit/miss metrics
+included (they go to Redis from the background flush, as in production).
+With --redis-url, metrics flush to that Redis and the old path - a JSON
+GET against it on every hit - is timed too.
+
+    python benchmarks/bench_cache.py --files 200 --patch-lines 40 --runs 200
+    python benchmarks/bench_cache.py --redis-url redis://localhost:6379/15
+"""
+import sys
+import os
+import argparse
+import json
+import random
+import statistics
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from services.cache_service import CacheService, encode, compress, decode
+from services.metrics import metrics
+
+
+WORDS = ("request", "user", "session", "payload", "config", "result", "items", "cache", "token", "retry",
+         "parse", "build", "fetch", "update", "validate", "render", "record", "index", "count", "limit")
+
+
+def line(rng: random.Random) -> str:
+    target, call = "_".join(rng.sample(WORDS, 2)), rng.choice(WORDS)
+    return f"+    {target} = {call}({', '.join(rng.sample(WORDS, 3))}, {rng.randint(0, 10 ** 6)})\n"
+
+
+def diff_data(files: int, patch_lines: int) -> dict:
+    rng = random.Random(42)
+    return {
+        "title": "Benchmark PR", "body": "Body", "state": "open", "additions": files * patch_lines,
+        "deletions": files, "changed_files": files, "mergeable": True,
+        "files": [
+            {"filename": f"src/package/module_{i}.py", "status": "modified", "additions": patch_lines,
+             "deletions": 1, "changes": patch_lines + 1,
+             "patch": "@@ -10,6 +10,%d @@ def handler(request):\n" % patch_lines
+                      + "".join(line(rng) for _ in range(patch_lines))}
+            for i in range(files)
+        ]
+    }
+
+
+def timed(fn, runs: int) -> float:
+    """Median milliseconds per call."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main(args):
+    if args.redis_url:
+        settings.REDIS_URL = args.redis_url  # before anything connects
+    value = diff_data(args.files, args.patch_lines)
+    as_json, local = json.dumps(value).encode(), encode(value)
+    stored = compress(local)
+    print(f"{args.files} files x {args.patch_lines} patch lines")
+    for label, data, load in [("json", as_json, json.loads), ("redis", stored, decode), ("local", local, decode)]:
+        print(f"  {label:<9s} {len(data) / 1024:8.1f} KB   decode {timed(lambda: load(data), args.runs):7.3f} ms")
+
+    cache = CacheService()
+    cache._redis_client, cache._resolved = None, True  # local tier only
+    cache.set("bench:diff", value, 600)
+    print(f"  cache.get from the local tier     {timed(lambda: cache.get('bench:diff'), args.runs):7.3f} ms")
+    metrics.flush()
+    print(f"  lookups counted                   {sum(metrics.counter('cache_requests_total').values()):7.0f}")
+
+    if args.redis_url:
+        import redis
+        client = redis.Redis.from_url(args.redis_url)
+        client.setex("pullsense:bench:json", 600, as_json)
+        print(f"  json GET + loads from Redis       "
+              f"{timed(lambda: json.loads(client.get('pullsense:bench:json')), args.runs):7.3f} ms")
+        client.delete("pullsense:bench:json")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--patch-lines", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--redis-url", help="also time the old JSON round trip against this Redis")
+    main(parser.parse_args())
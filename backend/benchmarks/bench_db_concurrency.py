@@ -0,0 +1,95 @@
+"""
+N writers vs M readers against one SQLite file.
+
+Compares a plain engine (rollback journal, no busy timeout - what
+database.py used to build) with database.build_engine() (WAL,
+synchronous=NORMAL, busy_timeout, mmap). Writers insert PullRequest rows
+the way the webhook handler and workers do; readers run the
+/pull-requests list query.
+
+    python benchmarks/bench_db_concurrency.py --writers 4 --readers 8 --seconds 5
+"""
+import sys
+import os
+import argparse
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKDIR = tempfile.mkdtemp(prefix="pullsense-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{WORKDIR}/app.db")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, PullRequest, build_engine
+
+
+def run(engine, args):
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(n):
+        i = 0
+        while not stop.is_set():
+            db = Session()
+            try:
+                db.add(PullRequest(repo_name=f"org/repo{n}", pr_number=i, title="bench", action="opened"))
+                db.commit()
+                bump("writes")
+            except Exception:
+                db.rollback()
+                bump("errors")
+            finally:
+                db.close()
+            i += 1
+
+    def reader():
+        while not stop.is_set():
+            db = Session()
+            try:
+                db.query(PullRequest.id, PullRequest.title)\
+                    .order_by(PullRequest.created_at.desc())\
+                    .limit(20)\
+                    .all()
+                bump("reads")
+            except Exception:
+                bump("errors")
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    return {k: v / args.seconds if k != "errors" else v for k, v in counts.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    legacy = create_engine(f"sqlite:///{WORKDIR}/legacy.db", connect_args={"check_same_thread": False})
+    tuned = build_engine(f"sqlite:///{WORKDIR}/tuned.db")
+
+    print(f"{args.writers} writers / {args.readers} readers for {args.seconds}s")
+    for name, engine in [("rollback journal", legacy), ("WAL + pragmas", tuned)]:
+        result = run(engine, args)
+        print(f"  {name:17s} writes/s={result['writes']:8.0f} reads/s={result['reads']:8.0f} "
+              f"errors={result['errors']}")
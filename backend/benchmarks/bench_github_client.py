@@ -0,0 +1,177 @@
+"""
+Diff-fetch latency: the old serial PyGithub calls vs GitHubService.get_pr_diff.
+
+Starts a local mock GitHub (fixed latency per request, paginated files
+with Link headers) and fetches --prs pull requests one after another:
+
+  pygithub  get_repo, then get_pull, then get_files page by page - what
+            GitHubService.get_pr_diff used to do
+  async     GitHubService.get_pr_diff: PR and its streamed .diff together
+            over one pooled keep-alive client (--no-diff: the mock answers
+            the .diff with 406, so file pages are fetched concurrently)
+
+    python benchmarks/bench_github_client.py --prs 50 --latency 0.08 --files 250 --max-files 300
+
+The mock speaks plain HTTP/1.1, so this measures request concurrency and
+connection reuse; against api.github.com the async client also
+negotiates HTTP/2 and saves the per-connection TLS handshakes.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import contextlib
+import io
+import socket
+import statistics
+import subprocess
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+def mock_github(port, latency, changed_files, serve_diff):
+    import uvicorn
+    from fastapi import FastAPI, Request, Response
+    from fastapi.responses import PlainTextResponse
+
+    app = FastAPI()
+    base = f"http://127.0.0.1:{port}"
+    served = {"requests": 0}
+
+    @app.middleware("http")
+    async def slow(request: Request, call_next):
+        served["requests"] += 1
+        await asyncio.sleep(latency)
+        return await call_next(request)
+
+    @app.get("/stats")
+    async def stats():
+        return served
+
+    @app.get("/repos/{owner}/{repo}")
+    async def repo(owner: str, repo: str):
+        return {"name": repo, "full_name": f"{owner}/{repo}", "url": f"{base}/repos/{owner}/{repo}"}
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}")
+    async def pull(owner: str, repo: str, number: int, request: Request):
+        if request.headers.get("accept") == "application/vnd.github.diff":
+            if not serve_diff:
+                return Response(status_code=406)
+            return PlainTextResponse("".join(
+                f"diff --git a/src/module_{i}.py b/src/module_{i}.py\n--- a/src/module_{i}.py\n"
+                f"+++ b/src/module_{i}.py\n@@ -1,3 +1,12 @@\n" + "+    value = compute()\n" * 10
+                for i in range(changed_files)
+            ))
+        return {
+            "number": number, "title": f"PR {number}", "body": "Body", "state": "open",
+            "additions": changed_files * 10, "deletions": changed_files, "changed_files": changed_files,
+            "mergeable": True, "url": f"{base}/repos/{owner}/{repo}/pulls/{number}"
+        }
+
+    @app.get("/repos/{owner}/{repo}/pulls/{number}/files")
+    async def files(owner: str, repo: str, number: int, response: Response, page: int = 1, per_page: int = 30):
+        last = max(1, -(-changed_files // per_page))
+        if page < last:
+            url = f"{base}/repos/{owner}/{repo}/pulls/{number}/files?per_page={per_page}"
+            response.headers["Link"] = f'<{url}&page={page + 1}>; rel="next", <{url}&page={last}>; rel="last"'
+        start = (page - 1) * per_page
+        return [
+            {"sha": "0" * 40, "filename": f"src/module_{i}.py", "status": "modified", "additions": 10,
+             "deletions": 1, "changes": 11, "patch": "@@ -1,3 +1,12 @@\n" + "+    value = compute()\n" * 10}
+            for i in range(start, min(start + per_page, changed_files))
+        ]
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fetch_pygithub(service, repo_name, pr_number, max_files):
+    """The pre-async GitHubService.get_pr_diff, minus the cache."""
+    repo = service.client.get_repo(repo_name)
+    pr = repo.get_pull(pr_number)
+    files = [
+        {"filename": f.filename, "status": f.status, "additions": f.additions,
+         "deletions": f.deletions, "changes": f.changes, "patch": f.patch}
+        for f in pr.get_files()[:max_files]
+    ]
+    return {"title": pr.title, "changed_files": pr.changed_files, "files": files}
+
+
+def run(label, fetch, prs, requests_served):
+    before = requests_served()
+    latencies = []
+    for number in prs:
+        start = time.perf_counter()
+        diff = fetch(number)
+        latencies.append(time.perf_counter() - start)
+        assert diff and diff["files"], f"{label}: no files for PR {number}"
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"  {label:<9s} p50 {statistics.median(latencies) * 1000:7.1f} ms   p95 {p95 * 1000:7.1f} ms   "
+          f"{(requests_served() - before) / len(prs):5.1f} requests/PR   {len(diff['files'])} files")
+
+
+def main(args):
+    port = free_port()
+    os.environ.update({
+        "GITHUB_API_URL": f"http://127.0.0.1:{port}",
+        "REDIS_URL": "redis://127.0.0.1:1/0",  # no Redis: nothing cached, no shared budget
+    })
+    os.environ.pop("GITHUB_TOKEN", None)
+
+    server = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve", str(port),
+        "--latency", str(args.latency), "--files", str(args.files)
+    ] + (["--no-diff"] if args.no_diff else []))
+    try:
+        import httpx
+        for _ in range(100):
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/stats")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+
+        def requests_served():
+            return httpx.get(f"http://127.0.0.1:{port}/stats").json()["requests"] - 1
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            from services.github_service import GitHubService
+            service = GitHubService()
+            service.client.per_page = 100
+
+        print(f"{args.prs} PRs, {args.files} files each, {args.latency * 1000:.0f} ms/request, "
+              f"pygithub keeping {args.max_files} files")
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Warm both clients' connections and imports
+            fetch_pygithub(service, "octo/bench", 0, args.max_files)
+            service.get_pr_diff("octo/bench", 0)
+        run("pygithub", lambda n: fetch_pygithub(service, "octo/bench", n, args.max_files),
+            range(1, args.prs + 1), requests_served)
+        run("async", lambda n: service.get_pr_diff("octo/bench", n),
+            range(args.prs + 1, 2 * args.prs + 1), requests_served)
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prs", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.08)
+    parser.add_argument("--files", type=int, default=250)
+    parser.add_argument("--max-files", type=int, default=300)
+    parser.add_argument("--no-diff", action="store_true", help="no .diff media type: async uses file pages")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        mock_github(args.serve, args.latency, args.files, not args.no_diff)
+    else:
+        main(args)
@@ -0,0 +1,173 @@
+"""
+DB size and list-endpoint latency: inline raw_data vs the payload store.
+
+Seeds the same synthetic GitHub webhooks into two SQLite files:
+  legacy - the old schema, full payload in pull_requests.raw_data (JSON)
+  store  - the current schema, payloads in payload_blobs
+
+then compares file size and the latency of the /pull-requests query.
+
+    python benchmarks/bench_payload_store.py --prs 2000 --repos 10
+"""
+import sys
+import os
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# database.py opens ./pullsense.db - keep it in a scratch directory
+WORKDIR = tempfile.mkdtemp(prefix="pullsense-bench-")
+os.chdir(WORKDIR)
+
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, JSON, DateTime, select
+
+import main
+import migrations
+from database import SessionLocal, PullRequest, engine
+from services.payload_store import payload_store
+
+
+def github_user(login):
+    base = f"https://api.github.com/users/{login}"
+    return {
+        "login": login, "id": abs(hash(login)) % 10**8, "node_id": f"U_{login}",
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{login}?v=4",
+        "gravatar_id": "", "url": base, "html_url": f"https://github.com/{login}",
+        "followers_url": f"{base}/followers", "following_url": f"{base}/following{{/other_user}}",
+        "gists_url": f"{base}/gists{{/gist_id}}", "starred_url": f"{base}/starred{{/owner}}{{/repo}}",
+        "subscriptions_url": f"{base}/subscriptions", "organizations_url": f"{base}/orgs",
+        "repos_url": f"{base}/repos", "events_url": f"{base}/events{{/privacy}}",
+        "received_events_url": f"{base}/received_events", "type": "User", "site_admin": False
+    }
+
+
+def github_repo(full_name):
+    owner = full_name.split("/")[0]
+    base = f"https://api.github.com/repos/{full_name}"
+    repo = {
+        "id": abs(hash(full_name)) % 10**9, "node_id": f"R_{full_name}",
+        "name": full_name.split("/")[1], "full_name": full_name, "private": False,
+        "owner": github_user(owner), "html_url": f"https://github.com/{full_name}",
+        "description": "A repository used for benchmarking " * 3, "fork": False, "url": base,
+        "created_at": "2020-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z",
+        "pushed_at": "2024-01-01T00:00:00Z", "homepage": None, "size": 123456,
+        "stargazers_count": 4200, "watchers_count": 4200, "language": "Python",
+        "has_issues": True, "has_projects": True, "has_downloads": True, "has_wiki": True,
+        "forks_count": 300, "open_issues_count": 42, "default_branch": "main",
+        "topics": ["python", "fastapi", "code-review", "ai"],
+    }
+    for rel in ["forks", "keys", "collaborators", "teams", "hooks", "issue_events", "events",
+                "assignees", "branches", "tags", "blobs", "git_tags", "git_refs", "trees",
+                "statuses", "languages", "stargazers", "contributors", "subscribers",
+                "subscription", "commits", "git_commits", "comments", "issue_comment",
+                "contents", "compare", "merges", "archive", "downloads", "issues", "pulls",
+                "milestones", "notifications", "labels", "releases", "deployments"]:
+        repo[f"{rel}_url"] = f"{base}/{rel}{{/id}}"
+    return repo
+
+
+def webhook(i, repos):
+    repo = repos[i % len(repos)]
+    author = f"dev{i % 37}"
+    pr_number = i // 3 + 1
+    return {
+        "action": ["opened", "synchronize", "synchronize"][i % 3],
+        "number": pr_number,
+        "pull_request": {
+            "number": pr_number, "title": f"Improve module {i % 97}", "state": "open",
+            "user": github_user(author),
+            "body": f"This PR refactors module {i % 97}.\n\n" + "Details about the change. " * 20,
+            "head": {"ref": f"feature/{i}", "sha": f"{i:040x}", "repo": repo, "user": github_user(author)},
+            "base": {"ref": "main", "sha": f"{i * 7:040x}", "repo": repo, "user": repo["owner"]},
+            "additions": i % 500, "deletions": i % 200, "changed_files": i % 30,
+            "created_at": "2024-01-15T10:30:00Z", "updated_at": "2024-01-15T10:30:00Z",
+        },
+        "repository": repo,
+        "sender": github_user(author),
+    }
+
+
+def seed(args):
+    migrations.upgrade()
+    repos = [github_repo(f"org{r}/repo{r}") for r in range(args.repos)]
+
+    legacy_engine = create_engine(f"sqlite:///{WORKDIR}/legacy.db")
+    legacy = Table(
+        "pull_requests", MetaData(),
+        Column("id", Integer, primary_key=True), Column("repo_name", String),
+        Column("pr_number", Integer), Column("title", String), Column("author", String),
+        Column("action", String), Column("raw_data", JSON), Column("created_at", DateTime),
+    )
+    legacy.metadata.create_all(legacy_engine)
+
+    start = datetime(2024, 1, 1)
+    legacy_rows = []
+    db = SessionLocal()
+    try:
+        for i in range(args.prs):
+            payload = webhook(i, repos)
+            row = {
+                "repo_name": payload["repository"]["full_name"],
+                "pr_number": payload["number"],
+                "title": payload["pull_request"]["title"],
+                "author": payload["sender"]["login"],
+                "action": payload["action"],
+                "created_at": start + timedelta(minutes=i),
+            }
+            legacy_rows.append({**row, "raw_data": payload})
+            db.add(PullRequest(payload_hash=payload_store.put(db, payload), **row))
+            if i % 500 == 0:
+                db.commit()
+        db.commit()
+    finally:
+        db.close()
+
+    with legacy_engine.begin() as conn:
+        conn.execute(legacy.insert(), legacy_rows)
+
+    return legacy_engine, legacy
+
+
+def time_it(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return statistics.median(samples) * 1000
+
+
+def main_bench(args):
+    legacy_engine, legacy = seed(args)
+    engine.dispose()
+    legacy_engine.dispose()
+
+    def legacy_list():
+        # What /pull-requests used to do: load full rows (raw_data included)
+        with legacy_engine.connect() as conn:
+            rows = conn.execute(select(legacy).order_by(legacy.c.created_at.desc()).limit(20)).fetchall()
+            return [{"id": r.id, "title": r.title, "created": r.created_at.isoformat()} for r in rows]
+
+    legacy_size = os.path.getsize(f"{WORKDIR}/legacy.db")
+    store_size = os.path.getsize(f"{WORKDIR}/pullsense.db")
+
+    legacy_ms = time_it(legacy_list, args.runs)
+    store_ms = time_it(lambda: main.get_pull_requests(limit=20, cursor=None, repo=None,
+                                                      author=None, action=None, status=None), args.runs)
+
+    print(f"{args.prs} webhooks across {args.repos} repos")
+    print(f"  legacy raw_data: {legacy_size / 1024:8.0f} KiB  /pull-requests {legacy_ms:6.2f} ms")
+    print(f"  payload store:   {store_size / 1024:8.0f} KiB  /pull-requests {store_ms:6.2f} ms")
+    print(f"  size ratio {legacy_size / store_size:.1f}x, latency ratio {legacy_ms / store_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prs", type=int, default=2000)
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=50)
+    main_bench(parser.parse_args())
@@ -0,0 +1,129 @@
+"""
+PRs per minute on one worker node: monolithic task vs staged pipeline.
+
+Runs the real task bodies from celery_app against a scratch SQLite
+database, with GitHub and the LLM stubbed by sleeps. Each Celery worker is
+modelled as a pool of N slots:
+
+  monolithic  one queue, --prefork slots; every slot runs fetch, LLM and
+              persist back to back (what analyze_pr_task used to do)
+  staged      github / llm / db queues with their own slot counts, e.g.
+              threads for the I/O-bound stages and a few processes for DB
+
+Prefork slots are memory-bound (one interpreter each), which is why the
+monolithic node can't simply run more of them; the staged node keeps
+--db-slots processes and runs the I/O stages on threads.
+
+    python benchmarks/bench_pipeline.py --prs 200 --prefork 8 \\
+        --github-slots 16 --llm-slots 64 --db-slots 2
+"""
+import sys
+import os
+import argparse
+import contextlib
+import io
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+WORKDIR = tempfile.mkdtemp(prefix="pullsense-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{WORKDIR}/pullsense.db")
+
+import migrations
+import main
+import celery_app
+from services.github_service import github_service
+from services.ai_analyzer import analyzer
+
+
+def install_stubs(args):
+    def get_pr_diff(repo_name, pr_number, head_sha=None):
+        time.sleep(args.github_latency)
+        return {"changed_files": 3, "additions": 40, "deletions": 5, "files": []}
+
+    def analyze_pr(pr_data):
+        time.sleep(args.llm_latency)
+        return {"analysis": "Looks fine.", "status": "completed", "model": "stub"}
+
+    github_service.get_pr_diff = get_pr_diff
+    analyzer.analyze_pr = analyze_pr
+    celery_app.broadcast_analysis_complete = lambda *a, **k: None
+
+
+def seed(args, offset):
+    ids = []
+    for n in range(args.prs):
+        pr = main.save_pull_request({
+            "action": "opened",
+            "pull_request": {"number": offset + n, "title": f"PR {n}", "state": "open",
+                             "user": {"login": "bench"}, "head": {"sha": f"{n:040x}"}, "body": "..."},
+            "repository": {"full_name": "org/bench"}
+        })
+        ids.append(pr["id"])
+    return ids
+
+
+def run(args, mode, pr_ids):
+    done = threading.Semaphore(0)
+    tasks = [celery_app.analyze_stage_task, celery_app.persist_stage_task]
+    original = {task: task.apply_async for task in tasks}
+
+    if mode == "monolithic":
+        pools = {"github": ThreadPoolExecutor(args.prefork)}
+        # Hand-offs run inline: one slot does the whole job
+        celery_app.analyze_stage_task.apply_async = lambda args, **options: celery_app.analyze_stage_task.run(*args)
+        celery_app.persist_stage_task.apply_async = lambda args, **options: (
+            celery_app.persist_stage_task.run(*args), done.release())
+    else:
+        pools = {
+            "github": ThreadPoolExecutor(args.github_slots),
+            "llm": ThreadPoolExecutor(args.llm_slots),
+            "db": ThreadPoolExecutor(args.db_slots),
+        }
+        celery_app.analyze_stage_task.apply_async = lambda args, **options: pools["llm"].submit(
+            celery_app.analyze_stage_task.run, *args)
+        celery_app.persist_stage_task.apply_async = lambda args, **options: pools["db"].submit(
+            lambda: (celery_app.persist_stage_task.run(*args), done.release()))
+
+    try:
+        start = time.perf_counter()
+        for pr_id in pr_ids:
+            pools["github"].submit(celery_app.analyze_pr_task.run, pr_id)
+        for _ in pr_ids:
+            done.acquire()
+        elapsed = time.perf_counter() - start
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+        for task, apply_async in original.items():
+            task.apply_async = apply_async
+
+    return len(pr_ids) / elapsed * 60
+
+
+def main_bench(args):
+    migrations.upgrade()
+    install_stubs(args)
+
+    print(f"{args.prs} PRs, GitHub {args.github_latency * 1000:.0f} ms, LLM {args.llm_latency * 1000:.0f} ms")
+    for i, mode in enumerate(["monolithic", "staged"]):
+        with contextlib.redirect_stdout(io.StringIO()):
+            pr_ids = seed(args, offset=i * args.prs)
+            rate = run(args, mode, pr_ids)
+        slots = (f"{args.prefork} prefork" if mode == "monolithic" else
+                 f"github {args.github_slots} / llm {args.llm_slots} threads, db {args.db_slots} prefork")
+        print(f"  {mode:10s} {rate:8.0f} PRs/min  ({slots})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--prs", type=int, default=200)
+    parser.add_argument("--github-latency", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=2.0)
+    parser.add_argument("--prefork", type=int, default=8)
+    parser.add_argument("--github-slots", type=int, default=16)
+    parser.add_argument("--llm-slots", type=int, default=64)
+    parser.add_argument("--db-slots", type=int, default=2)
+    main_bench(parser.parse_args())
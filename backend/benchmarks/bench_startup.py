@@ -0,0 +1,89 @@
+"""
+Cold-start cost of the API and the workers, from `python -X importtime`.
+
+Imports each entry point (main for the API, celery_app and async_worker
+for the workers) in a fresh interpreter --runs times and reports the
+median total import time plus the modules that cost the most, so a new
+eager import or a client built at import time shows up as a regression.
+
+    python benchmarks/bench_startup.py --runs 5 --top 8
+    python benchmarks/bench_startup.py --json startup.json          # save a baseline
+    python benchmarks/bench_startup.py --compare startup.json       # diff against it
+
+REDIS_URL defaults to a non-routable address here: importing must not
+wait on Redis (connections are made on first use, see /ready).
+"""
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ("main", "celery_app", "async_worker")
+
+
+def import_times(module: str, env: dict) -> dict:
+    """{module: cumulative microseconds} for one cold `import module`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name] = int(cumulative)
+    return times
+
+
+def measure(module: str, runs: int, env: dict) -> dict:
+    samples = [import_times(module, env) for _ in range(runs)]
+    medians = {
+        name: statistics.median(sample.get(name, 0) for sample in samples)
+        for name in samples[0]
+    }
+    return {"total_ms": medians[module] / 1000,
+            "modules_ms": {name: us / 1000 for name, us in medians.items() if name != module}}
+
+
+def main(args):
+    env = dict(os.environ)
+    env.setdefault("REDIS_URL", "redis://10.255.255.1:6379/0")
+    baseline = json.load(open(args.compare)) if args.compare else {}
+
+    report = {}
+    for module in args.modules:
+        report[module] = measure(module, args.runs, env)
+        total = report[module]["total_ms"]
+        line = f"{module:<14s} {total:8.1f} ms"
+        if module in baseline:
+            before = baseline[module]["total_ms"]
+            line += f"   (was {before:.1f} ms, {total - before:+.1f} ms)"
+        print(line)
+
+        heaviest = sorted(report[module]["modules_ms"].items(), key=lambda item: -item[1])
+        # Only top-level packages, so openai.types doesn't crowd out openai
+        shown = [(name, ms) for name, ms in heaviest if "." not in name][:args.top]
+        for name, ms in shown:
+            print(f"    {name:<28s} {ms:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=list(ENTRY_POINTS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--compare", help="a previous --json file to diff against")
+    main(parser.parse_args())
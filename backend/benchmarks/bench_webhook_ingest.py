@@ -0,0 +1,104 @@
+"""
+Load test for POST /webhook/github with a slow database.
+
+Fires bursts of concurrent pull_request webhooks while a probe hits `/`
+every few milliseconds. The DB write is replaced by a `time.sleep` to
+simulate a slow SQLite fsync, and the analysis scheduler is stubbed out.
+
+    python benchmarks/bench_webhook_ingest.py --db-delay 0.2 --burst 50
+
+Pass --blocking to run the old behaviour (DB work inline on the loop)
+for comparison.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the throwaway SQLite file out of the repo
+os.chdir(tempfile.mkdtemp(prefix="pullsense-bench-"))
+
+import httpx
+import main
+from services.offload import offload
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_payload(n):
+    return {
+        "action": "synchronize",
+        "pull_request": {"number": n, "title": f"PR {n}", "user": {"login": "bench"}},
+        "repository": {"full_name": "bench/repo"}
+    }
+
+
+async def run(args):
+    next_id = iter(range(1, 10**9))
+    
+    def slow_save(payload):
+        time.sleep(args.db_delay)  # simulated fsync stall
+        return {"id": next(next_id), "pr_number": payload["pull_request"]["number"], "title": "x"}
+    
+    main.save_pull_request = slow_save
+    main.analysis_scheduler.schedule = lambda *a, **kw: None
+    
+    if args.blocking:
+        async def inline(func, *a, **kw):
+            return func(*a, **kw)
+        offload.run_db = inline
+        offload.run_broker = inline
+    
+    webhook_latencies, probe_latencies = [], []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        
+        async def send(n, start):
+            # Latency is measured from when the burst was submitted, so requests
+            # that sat behind a blocked loop are charged for the wait
+            await client.post(
+                "/webhook/github",
+                json=make_payload(n),
+                headers={"X-GitHub-Event": "pull_request"}
+            )
+            webhook_latencies.append(time.perf_counter() - start)
+        
+        async def probe(stop):
+            while not stop.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+        
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(stop))
+        for burst in range(args.bursts):
+            start = time.perf_counter()
+            await asyncio.gather(*(send(burst * args.burst + i, start) for i in range(args.burst)))
+        stop.set()
+        await prober
+    
+    mode = "blocking" if args.blocking else "offloaded"
+    print(f"mode={mode} db_delay={args.db_delay}s burst={args.burst} x{args.bursts}")
+    print(f"  webhook p50={statistics.median(webhook_latencies) * 1000:.1f}ms "
+          f"p99={percentile(webhook_latencies, 99) * 1000:.1f}ms")
+    print(f"  probe   p50={statistics.median(probe_latencies) * 1000:.1f}ms "
+          f"p99={percentile(probe_latencies, 99) * 1000:.1f}ms "
+          f"(n={len(probe_latencies)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-delay", type=float, default=0.2)
+    parser.add_argument("--burst", type=int, default=16)
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--blocking", action="store_true")
+    asyncio.run(run(parser.parse_args()))
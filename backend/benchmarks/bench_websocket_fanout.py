@@ -0,0 +1,129 @@
+"""
+WebSocket fan-out with thousands of simulated clients.
+
+Compares the old ConnectionManager.broadcast (await send_text on every
+socket in turn) with services.connection_manager (per-client queues and
+writer tasks, topic subscriptions). A few clients are slow, as on a bad
+mobile link; the rest answer immediately.
+
+Reports, per broadcast, how long the publisher is blocked and how long
+until every fast client subscribed to the message has it.
+
+    python benchmarks/bench_websocket_fanout.py --clients 5000 --slow 10 --repos 50
+"""
+import sys
+import os
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import statistics
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.connection_manager import ConnectionManager
+
+
+class SimulatedClient:
+    def __init__(self, delay, expected):
+        self.delay = delay
+        self.expected = expected  # frames this client should see
+        self.received = 0
+        self.done = asyncio.Event()
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+
+
+class SequentialManager:
+    """The previous ConnectionManager.broadcast, for the baseline."""
+
+    def __init__(self):
+        self.active_connections = []
+
+    async def broadcast(self, message: dict):
+        message_str = json.dumps(message)
+        for connection in self.active_connections:
+            try:
+                await connection.send_text(message_str)
+            except Exception:
+                pass
+
+
+def message(i, repos):
+    return {"type": "analysis_complete", "data": {"pr_id": i, "repo": f"org/repo{i % repos}", "status": "completed"}}
+
+
+async def run(args, mode):
+    messages = [message(i, args.repos) for i in range(args.messages)]
+    clients = []
+
+    if mode == "sequential":
+        manager = SequentialManager()
+    else:
+        manager = ConnectionManager(queue_size=args.queue_size, slow_client_policy="drop")
+
+    for n in range(args.clients):
+        slow = n < args.slow
+        if mode == "topics":
+            # Each dashboard only watches one repo
+            repo = f"org/repo{n % args.repos}"
+            expected = sum(1 for m in messages if m["data"]["repo"] == repo)
+        else:
+            repo, expected = None, len(messages)
+        client = SimulatedClient(args.slow_delay if slow else 0, expected)
+        client.slow = slow
+        clients.append(client)
+
+        if mode == "sequential":
+            manager.active_connections.append(client)
+        else:
+            await manager.connect(client, accept=False)
+            if repo:
+                manager.unsubscribe(client, ["all"])
+                manager.subscribe(client, [f"repo:{repo}"])
+
+    fast = [c for c in clients if not c.slow and c.expected]
+    blocked = []
+    start = time.perf_counter()
+    for m in messages:
+        t = time.perf_counter()
+        await manager.broadcast(m)
+        blocked.append(time.perf_counter() - t)
+        await asyncio.sleep(0)
+    await asyncio.wait_for(asyncio.gather(*(c.done.wait() for c in fast)), timeout=600)
+    delivered = time.perf_counter() - start
+
+    return {
+        "blocked_ms": statistics.median(blocked) * 1000,
+        "delivered_s": delivered,
+        "frames": sum(c.received for c in clients)
+    }
+
+
+def main(args):
+    print(f"{args.clients} clients ({args.slow} slow at {args.slow_delay * 1000:.0f} ms/frame), "
+          f"{args.messages} messages across {args.repos} repos")
+    for mode in ["sequential", "queued", "topics"]:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(run(args, mode))
+        print(f"  {mode:10s} publisher blocked {result['blocked_ms']:9.2f} ms/msg  "
+              f"all fast clients served in {result['delivered_s']:7.2f} s  "
+              f"frames sent {result['frames']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--slow", type=int, default=10)
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--repos", type=int, default=50)
+    parser.add_argument("--queue-size", type=int, default=100)
+    main(parser.parse_args())
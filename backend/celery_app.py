@@ -5,9 +5,25 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from celery import Celery
+from celery.exceptions import Retry
 from config import settings
+from database import SessionLocal, PullRequest, CodeReview
+from services.ai_analyzer import analyzer, ANALYZER_VERSION
+from services.analysis_dedup import analysis_dedup
+from services.analysis_scheduler import analysis_scheduler, PRIORITIES
+from services.fair_share import fair_share
+from services.github_service import github_service
+from services.incremental_review import incremental_review
+from services.metrics import metrics
+from services.payload_store import payload_store
+from services.rate_limiter import RateLimited, backoff_seconds
+from services.redis_client import get_redis, WEBSOCKET_CHANNEL
+from services.stage_store import stage_store
+from services.stats_service import stats_service
+from services.task_state import task_state
 import asyncio
 import json
+import time
 
 # Create Celery application
 app = Celery('pullsense', broker=settings.REDIS_URL)
@@ -19,119 +35,401 @@ app.conf.update(
     accept_content=['json'],
     timezone='UTC',
     enable_utc=True,
+    # Each analysis stage has its own queue, so GitHub, LLM and DB capacity
+    # can be scaled (and given a pool type) independently - see README
+    task_routes={
+        "celery_app.analyze_pr_task": {"queue": "github"},
+        "celery_app.analyze_stage_task": {"queue": "llm"},
+        "celery_app.persist_stage_task": {"queue": "db"},
+        "celery_app.reconcile_stats_task": {"queue": "db"},
+    },
+    # Priority classes (manual < small < bulk) ride on Redis priority
+    # queues; prefetch 1 so a worker doesn't hoard low-priority messages
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    task_default_priority=3,
+    worker_prefetch_multiplier=1,
+    # Run with `celery -A celery_app beat` alongside the workers (docker-compose: celery-beat)
+    beat_schedule={
+        "reconcile-stats-nightly": {
+            "task": "celery_app.reconcile_stats_task",
+            "schedule": 24 * 60 * 60,
+        },
+    },
 )
 
-def broadcast_analysis_complete(pr_id: int, status: str):
-    """Broadcast analysis completion to WebSocket clients."""
+def broadcast_analysis_complete(pr_id: int, status: str, repo_name: str = None, pr_number: int = None):
+    """Broadcast analysis completion to WebSocket clients subscribed to the PR or its repo."""
     try:
-        # Import here to avoid circular imports
-        import redis
-        from config import settings
-        
-        # Use Redis to publish the message
-        r = redis.from_url(settings.REDIS_URL)
+        # Every API process relays this channel to its own sockets
         message = {
             "type": "analysis_complete",
             "data": {
                 "pr_id": pr_id,
+                "repo": repo_name,
+                "pr_number": pr_number,
                 "status": status
             }
         }
-        r.publish("websocket_updates", json.dumps(message))
+        get_redis().publish(WEBSOCKET_CHANNEL, json.dumps(message))
     except Exception as e:
         print(f"❌ Failed to broadcast update: {e}")
 
-@app.task
-def analyze_pr_task(pr_id: int):
+def next_stage(task, ref, context: dict):
+    """
+    Queue the next pipeline stage at the job's priority. The job's task id
+    rides along outside the context so the stage can still end the job if
+    the context has expired.
+    """
+    task.apply_async(args=[ref], kwargs={"job_id": context.get("task_id")},
+                     priority=PRIORITIES.get(context.get("priority_class"), PRIORITIES["small"]))
+
+def release_job(context: dict):
+    """Give back the repo's fair-share slot and the commit's analysis lock (review saved, skipped or failed)."""
+    fair_share.release(context.get("repo_name"), context.get("lease"))
+    analysis_dedup.release(context.get("repo_name"), context.get("pr_number"),
+                           context.get("head_sha"), context.get("lease"))
+
+def job_ended(task_id, result: dict) -> dict:
+    """Record a job's outcome in the task-state store (GET /tasks/{id}); returns `result`."""
+    if result.get("status") == "error" or "error" in result:
+        task_state.set(task_id, "failed", error=result.get("error"))
+    else:
+        task_state.set(task_id, "done", outcome=result.get("status"), review_id=result.get("review_id"))
+    return result
+
+def reuse_existing_review(db, pr, generation: int = None):
+    """
+    If this commit was already reviewed by the current analyzer version,
+    point the PR at that review and notify dashboards - no GitHub or
+    OpenAI calls. Returns the task result, or None if there is nothing to reuse.
+    """
+    review = analysis_dedup.find_review(db, pr.id, pr.head_sha)
+    if review is None:
+        return None
+    
+    pr.analysis_status = review.analysis_status
+    db.commit()
+    analysis_scheduler.finish(pr.repo_name, pr.pr_number, generation)
+    print(f"♻️  PR {pr.id} @ {pr.head_sha[:7]} already reviewed (review {review.id}), reusing it")
+    broadcast_analysis_complete(pr.id, "completed", pr.repo_name, pr.pr_number)
+    return {"status": "reused", "review_id": review.id, "pr_id": pr.id}
+
+@app.task(bind=True, max_retries=None)
+def analyze_pr_task(self, pr_id: int, generation: int = None,
+                    priority_class: str = "small", due_at: float = None, force: bool = False,
+                    fair_share_waits: int = 0):
     """
     Background task to analyze a pull request.
-    This runs in a separate process!
+    
+    Stage 1 of 3 (queue "github"): load the PR and fetch its diff, then
+    hand off to analyze_stage_task (queue "llm") and persist_stage_task
+    (queue "db"). Stages pass a stage_store reference, not the diff itself.
+    
+    `generation` is set by the debounce scheduler; if a newer push (or a
+    close) arrives while this job is queued or running, every stage bails
+    out before spending GitHub/OpenAI calls or saving a stale review.
+    
+    `priority_class` (manual, small, bulk) sets the Celery priority of every
+    stage. Each job holds one of its repo's fair-share slots from here until
+    its review is saved; over the limit, it retries with a growing, jittered
+    delay and fails after FAIR_SHARE_MAX_RETRIES (`fair_share_waits` counts
+    the retries so far).
+    
+    Analyses are idempotent per (repo, pr, head SHA, analyzer version): an
+    existing review is reused unless `force`, and a job that finds the same
+    commit already being analyzed retries until it can reuse that result.
+    If an earlier commit of the PR was reviewed, only the changes since
+    then are fetched and analyzed (services/incremental_review.py);
+    `force` always reviews the whole diff.
+    
+    When GitHub's shared rate-limit budget runs out the job retries with
+    jittered exponential backoff rather than analyzing without a diff.
     """
     print(f"🔄 Starting analysis for PR ID: {pr_id}")
     
-    import time
     start_time = time.time()
     
-    # Import here to avoid circular imports
-    from database import SessionLocal, PullRequest, CodeReview
-    from services.ai_analyzer import analyzer
-    from services.github_service import github_service
-    
     db = SessionLocal()
+    repo_name = pr_number = None
+    task_id = self.request.id
+    lease = task_id or f"eager-{pr_id}-{start_time}"
+    context = {}
     try:
         # Get PR from database
         pr = db.query(PullRequest).filter_by(id=pr_id).first()
         if not pr:
             print(f"❌ PR with ID {pr_id} not found")
-            return {"error": "PR not found"}
+            return job_ended(task_id, {"error": "PR not found"})
+        repo_name, pr_number = pr.repo_name, pr.pr_number
         
-        print(f"📝 Analyzing PR #{pr.pr_number}: {pr.title}")
+        if not analysis_scheduler.is_current(repo_name, pr_number, generation):
+            print(f"⏭️  PR {pr_id} superseded by a newer event, skipping")
+            return job_ended(task_id, {"status": "superseded", "pr_id": pr_id})
+        
+        if not force:
+            reused = reuse_existing_review(db, pr, generation)
+            if reused:
+                return job_ended(task_id, reused)
+        
+        head_sha = pr.head_sha  # the commit this review will describe
+        if not analysis_dedup.acquire(repo_name, pr_number, head_sha, lease):
+            print(f"🔒 PR {pr_id} @ {head_sha[:7]} is already being analyzed, waiting for that result")
+            raise self.retry(countdown=settings.ANALYSIS_LOCK_RETRY_SECONDS)
+        context = {"repo_name": repo_name, "pr_number": pr_number, "head_sha": head_sha, "lease": lease}
+        
+        if not fair_share.acquire(repo_name, lease):
+            release_job(context)
+            retry_in = fair_share.retry_in(fair_share_waits)
+            if retry_in is None:
+                print(f"🛑 {repo_name} stayed at its analysis limit through {fair_share_waits} retries, giving up on PR {pr_id}")
+                broadcast_analysis_complete(pr_id, "error", repo_name, pr_number)
+                return job_ended(task_id, {"status": "error", "error": f"{repo_name} is at its analysis limit"})
+            print(f"⏸️  {repo_name} is at its analysis limit, retrying PR {pr_id} in {retry_in:.0f}s")
+            raise self.retry(countdown=retry_in, kwargs={**(self.request.kwargs or {}), "fair_share_waits": fair_share_waits + 1})
+        
+        timings = {}  # this job's per-stage breakdown, stored on the review
+        if due_at:
+            timings["queue_wait"] = round(max(0.0, start_time - due_at), 4)
+            metrics.observe("queue_wait_seconds", timings["queue_wait"], priority=priority_class)
+        
+        print(f"📝 Analyzing PR #{pr_number}: {pr.title}")
+        task_state.set(task_id, "fetching", pr_id=pr_id)
         
         # Try to get real diff from GitHub
         diff_data = None
-        if pr.repo_name and pr.pr_number:
-            print(f"🔍 Fetching diff from GitHub for {pr.repo_name} PR #{pr.pr_number}")
-            diff_data = github_service.get_pr_diff(pr.repo_name, pr.pr_number)
-            if diff_data:
+        base = None if force else incremental_review.base_review(db, pr)
+        if repo_name and pr_number:
+            print(f"🔍 Fetching diff from GitHub for {repo_name} PR #{pr_number}")
+            with metrics.job(timings), metrics.stage("github_fetch"):
+                if base:
+                    diff_data = github_service.get_pr_changes(repo_name, pr_number, base.head_sha, head_sha)
+                if not diff_data:
+                    diff_data = github_service.get_pr_diff(repo_name, pr_number, head_sha)
+            if diff_data and diff_data.get("base_sha"):
+                print(f"🧩 Reviewing only the {len(diff_data['files'])} files changed since {base.head_sha[:7]}")
+            elif diff_data:
                 print(f"✅ Got diff: {diff_data['changed_files']} files changed")
                 print(f"📊 +{diff_data['additions']} -{diff_data['deletions']} lines")
             else:
                 print("⚠️  Could not fetch diff from GitHub")
         
-        # Perform AI analysis with diff data
-        result = analyzer.analyze_pr({
+        if not analysis_scheduler.is_current(repo_name, pr_number, generation):
+            print(f"⏭️  PR {pr_id} superseded during diff fetch, skipping")
+            release_job(context)
+            return job_ended(task_id, {"status": "superseded", "pr_id": pr_id})
+        
+        # Only now pull the stored webhook payload - we just need the PR body
+        with metrics.job(timings), metrics.stage("payload_load"):
+            payload = payload_store.get(db, pr.payload_hash) or {}
+        
+        context.update({
+            "pr_id": pr_id,
+            "repo_name": repo_name,
+            "pr_number": pr_number,
+            "generation": generation,
+            "head_sha": head_sha,
+            "analyzer_version": ANALYZER_VERSION,
             "title": pr.title,
-            "body": pr.raw_data.get("pull_request", {}).get("body", ""),
+            "body": payload.get("pull_request", {}).get("body", ""),
             "author": pr.author,
-            "diff_data": diff_data  # Pass the GitHub diff data
+            "diff_data": diff_data,
+            "base_review_id": base.id if diff_data and diff_data.get("base_sha") else None,
+            "started_at": start_time,
+            "priority_class": priority_class,
+            "task_id": task_id,
+            "timings": timings
         })
+        next_stage(analyze_stage_task, stage_store.put(context), context)
+        return {"status": "fetched", "pr_id": pr_id, "used_github_diff": diff_data is not None}
         
-        # Calculate processing time
-        analysis_time = time.time() - start_time
+    except Retry:
+        task_state.set(task_id, "queued")
+        raise
+    except RateLimited as e:
+        release_job(context)
+        task_state.set(task_id, "queued")
+        raise self.retry(countdown=backoff_seconds(self.request.retries, e.retry_after))
+    except Exception as e:
+        print(f"❌ Error fetching PR {pr_id}: {e}")
+        release_job(context)
         
-        # Save analysis results to database
-        review = CodeReview(
-            pull_request_id=pr.id,
-            analysis_text=result.get("analysis", "No analysis generated"),
-            analysis_status=result.get("status", "error"),
-            model_used=result.get("model", "unknown"),
-            analysis_time_seconds=round(analysis_time, 2)
-        )
+        # Broadcast error status
+        broadcast_analysis_complete(pr_id, "error", repo_name, pr_number)
         
-        db.add(review)
-        db.commit()
-        db.refresh(review)  # Get the generated ID
+        return job_ended(task_id, {"status": "error", "error": str(e)})
+    finally:
+        db.close()  # Always cleanup database connection
+
+@app.task(bind=True, max_retries=None)  # capped at RATE_LIMIT_MAX_RETRIES below
+def analyze_stage_task(self, ref, job_id: str = None):
+    """
+    Stage 2 of 3 (queue "llm"): run the AI analysis on the fetched diff.
+    
+    Retries with jittered exponential backoff while OpenAI is rate limited,
+    refreshing the stored context's TTL each time, and fails the job after
+    RATE_LIMIT_MAX_RETRIES. `job_id` is the analysis's task id (next_stage).
+    """
+    context = stage_store.get(ref)
+    if context is None:
+        print("❌ Stage context expired before analysis")
+        return job_ended(job_id, {"status": "error", "error": "stage context expired"})
+    pr_id = context["pr_id"]
+    
+    try:
+        if not analysis_scheduler.is_current(context["repo_name"], context["pr_number"], context["generation"]):
+            print(f"⏭️  PR {pr_id} superseded while queued for analysis, skipping")
+            stage_store.delete(ref)
+            release_job(context)
+            return job_ended(context.get("task_id"), {"status": "superseded", "pr_id": pr_id})
         
-        print(f"💾 Saved analysis to database with ID: {review.id}")
-        print(f"✅ Analysis complete for PR {pr_id} in {analysis_time:.2f} seconds")
+        # Perform AI analysis with diff data
+        task_state.set(context.get("task_id"), "analyzing")
+        with metrics.job(context.setdefault("timings", {})):
+            context["result"] = analyzer.analyze_pr({
+                "title": context["title"],
+                "body": context["body"],
+                "author": context["author"],
+                "diff_data": context["diff_data"]  # Pass the GitHub diff data
+            })
         
-        # Broadcast completion to WebSocket clients
-        broadcast_analysis_complete(pr_id, "completed")
+        next_stage(persist_stage_task, stage_store.put(context, ref), context)
+        return {"status": "analyzed", "pr_id": pr_id}
+        
+    except RateLimited as e:
+        if self.request.retries >= settings.RATE_LIMIT_MAX_RETRIES:
+            print(f"🛑 {e.upstream} still rate limited after {self.request.retries} retries, giving up on PR {pr_id}")
+            stage_store.delete(ref)
+            release_job(context)
+            broadcast_analysis_complete(pr_id, "error", context["repo_name"], context["pr_number"])
+            return job_ended(context.get("task_id"), {"status": "error", "error": str(e)})
+        # The context stays in the stage store for the retry - renew its TTL to outlast the backoff
+        stage_store.put(context, ref)
+        task_state.set(context.get("task_id"), "queued")
+        raise self.retry(countdown=backoff_seconds(self.request.retries, e.retry_after))
+    except Exception as e:
+        print(f"❌ Error analyzing PR {pr_id}: {e}")
+        stage_store.delete(ref)
+        release_job(context)
+        broadcast_analysis_complete(pr_id, "error", context["repo_name"], context["pr_number"])
+        return job_ended(context.get("task_id"), {"status": "error", "error": str(e)})
+
+def save_review(db, context: dict):
+    """
+    Add the CodeReview for a finished analysis to `db`; the caller commits.
+    
+    Shared by persist_stage_task and async_worker.py's batched writer.
+    Returns None if the PR is gone or a newer event superseded the job.
+    """
+    pr_id, result = context["pr_id"], context["result"]
+    
+    # A push may have landed while the LLM was running - don't save a stale review
+    if not analysis_scheduler.is_current(context["repo_name"], context["pr_number"], context["generation"]):
+        print(f"⏭️  PR {pr_id} superseded during analysis, discarding result")
+        return None
+    
+    pr = db.query(PullRequest).filter_by(id=pr_id).first()
+    if not pr:
+        print(f"❌ PR with ID {pr_id} not found")
+        return None
+    
+    # Calculate processing time
+    analysis_time = time.time() - context["started_at"]
+    usage = result.get("usage") or {}
+    
+    review = CodeReview(
+        pull_request_id=pr.id,
+        analysis_status=result.get("status", "error"),
+        model_used=result.get("model", "unknown"),
+        analysis_time_seconds=round(analysis_time, 2),
+        head_sha=context["head_sha"],
+        analyzer_version=context.get("analyzer_version"),
+        stage_timings=context.get("timings") or None,
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+        **incremental_review.review_fields(db, context)  # text, plus per-file notes merged across pushes
+    )
+    
+    db.add(review)
+    pr.analysis_status = review.analysis_status  # denormalized for list filters
+    stats_service.record_review(db, review.analysis_status, pr.repo_name)
+    return review
+
+def review_saved(context: dict, review):
+    """After commit: release the scheduler slot, mark the job done and notify dashboards."""
+    analysis_scheduler.finish(context["repo_name"], context["pr_number"], context["generation"])
+    metrics.observe("analysis_seconds", review.analysis_time_seconds or 0.0,
+                    priority=context.get("priority_class", "small"))
+    job_ended(context.get("task_id"), {"status": "analyzed", "review_id": review.id})
+    print(f"💾 Saved analysis to database with ID: {review.id}")
+    print(f"✅ Analysis complete for PR {context['pr_id']} in {review.analysis_time_seconds:.2f} seconds")
+    
+    # Broadcast completion to WebSocket clients
+    broadcast_analysis_complete(context["pr_id"], "completed", context["repo_name"], context["pr_number"])
+
+@app.task
+def persist_stage_task(ref, job_id: str = None):
+    """Stage 3 of 3 (queue "db"): save the review, update stats, notify dashboards."""
+    context = stage_store.get(ref)
+    if context is None:
+        print("❌ Stage context expired before persisting")
+        return job_ended(job_id, {"status": "error", "error": "stage context expired"})
+    pr_id = context["pr_id"]
+    
+    db = SessionLocal()
+    try:
+        review = save_review(db, context)
+        if review is None:
+            return job_ended(context.get("task_id"), {"status": "skipped", "pr_id": pr_id})
+        with metrics.stage("db_commit"):
+            db.commit()
+        db.refresh(review)  # Get the generated ID
+        review_saved(context, review)
         
         return {
             "status": "success",
             "review_id": review.id,
             "pr_id": pr_id,
-            "time_taken": analysis_time,
-            "used_github_diff": diff_data is not None
+            "time_taken": review.analysis_time_seconds,
+            "used_github_diff": context["diff_data"] is not None
         }
         
     except Exception as e:
-        print(f"❌ Error analyzing PR {pr_id}: {e}")
+        print(f"❌ Error saving analysis for PR {pr_id}: {e}")
         db.rollback()  # Undo any partial changes
         
         # Broadcast error status
-        broadcast_analysis_complete(pr_id, "error")
+        broadcast_analysis_complete(pr_id, "error", context["repo_name"], context["pr_number"])
         
-        return {"status": "error", "error": str(e)}
+        return job_ended(context.get("task_id"), {"status": "error", "error": str(e)})
     finally:
+        stage_store.delete(ref)
+        release_job(context)
         db.close()  # Always cleanup database connection
 
 @app.task
-def test_task(message: str = "Hello"):
+def reconcile_stats_task():
+    """Rebuild the /stats counters from the source tables to correct any drift."""
+    db = SessionLocal()
+    try:
+        rows = stats_service.reconcile(db)
+        db.commit()
+        print(f"📊 Reconciled {rows} stat counters")
+        return {"status": "success", "counters": rows}
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Stats reconciliation failed: {e}")
+        return {"status": "error", "error": str(e)}
+    finally:
+        db.close()
+
+@app.task(bind=True)
+def test_task(self, message: str = "Hello"):
     """Simple test task to verify Celery is working"""
-    import time
     print(f"🎯 Test task received: {message}")
     time.sleep(2)  # Simulate some work
     print("✅ Test task completed")
-    return {"status": "success", "message": f"Processed: {message}"}
\ No newline at end of file
+    return job_ended(self.request.id, {"status": "success", "message": f"Processed: {message}"})
\ No newline at end of file
@@ -12,11 +12,97 @@ class Settings:
     
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./pullsense.db")
     
+    # Connection pool (API threads + offload pool share it)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds
+    
+    # SQLite tuning, applied on every new connection
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    
     # Add JWT_SECRET if not already there:
     JWT_SECRET: str = os.getenv("JWT_SECRET", "dev-secret-change-in-production")
     
     # Redis URL for when we add Celery
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))  # per process
+    REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))  # seconds
+    REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", "5"))  # between attempts while unreachable
+    # In-process cache tier in front of Redis (compressed bytes, per process)
+    CACHE_LOCAL_MAX_BYTES = int(os.getenv("CACHE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_COMPRESSION_LEVEL = int(os.getenv("CACHE_COMPRESSION_LEVEL", "6"))  # zlib, 1-9
+    
+    # GitHub REST API root (GitHub Enterprise: https://<host>/api/v3)
+    GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+    GITHUB_MAX_CONNECTIONS = int(os.getenv("GITHUB_MAX_CONNECTIONS", "20"))  # per process (Celery workers)
+    # How long ETag / Last-Modified validators (and the body they vouch
+    # for) are kept for conditional requests
+    GITHUB_VALIDATORS_TTL_SECONDS = int(os.getenv("GITHUB_VALIDATORS_TTL_SECONDS", str(7 * 24 * 3600)))
+    # Diffs are cached per head SHA, so they never go stale - only old
+    GITHUB_DIFF_CACHE_TTL_SECONDS = int(os.getenv("GITHUB_DIFF_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    # Patch text kept per file and per PR when parsing a diff; past that,
+    # files keep their line counts but not their hunks
+    GITHUB_DIFF_MAX_FILE_BYTES = int(os.getenv("GITHUB_DIFF_MAX_FILE_BYTES", str(64 * 1024)))
+    GITHUB_DIFF_MAX_BYTES = int(os.getenv("GITHUB_DIFF_MAX_BYTES", str(1024 * 1024)))
+    # After a push, review only what changed since the last reviewed commit
+    # (compare API) and carry the earlier per-file notes over
+    INCREMENTAL_ANALYSIS = os.getenv("INCREMENTAL_ANALYSIS", "true").lower() == "true"
+    
+    # Who runs analyses: "celery" (staged pipeline tasks) or "async"
+    # (async_worker.py - many analyses in flight per process)
+    ANALYSIS_WORKER = os.getenv("ANALYSIS_WORKER", "celery")
+    ASYNC_WORKER_CONCURRENCY = int(os.getenv("ASYNC_WORKER_CONCURRENCY", "200"))
+    ASYNC_WORKER_BATCH_SIZE = int(os.getenv("ASYNC_WORKER_BATCH_SIZE", "50"))
+    ASYNC_WORKER_BATCH_SECONDS = float(os.getenv("ASYNC_WORKER_BATCH_SECONDS", "0.25"))
+    
+    # Priority classes: manual triggers, then small diffs, then bulk (bots
+    # and large diffs)
+    SMALL_DIFF_LINES = int(os.getenv("SMALL_DIFF_LINES", "300"))
+    BULK_AUTHORS = [
+        a.strip().lower()
+        for a in os.getenv("BULK_AUTHORS", "dependabot[bot],renovate[bot],github-actions[bot]").split(",")
+        if a.strip()
+    ]
+    
+    # Fair share: max analyses running at once per repository
+    REPO_MAX_CONCURRENT_ANALYSES = int(os.getenv("REPO_MAX_CONCURRENT_ANALYSES", "4"))
+    FAIR_SHARE_RETRY_SECONDS = int(os.getenv("FAIR_SHARE_RETRY_SECONDS", "5"))
+    FAIR_SHARE_RETRY_MAX_SECONDS = int(os.getenv("FAIR_SHARE_RETRY_MAX_SECONDS", "120"))
+    FAIR_SHARE_MAX_RETRIES = int(os.getenv("FAIR_SHARE_MAX_RETRIES", "20"))
+    FAIR_SHARE_LEASE_SECONDS = int(os.getenv("FAIR_SHARE_LEASE_SECONDS", "900"))
+    
+    # Duplicate analyses of one commit wait for the first to finish
+    ANALYSIS_LOCK_SECONDS = int(os.getenv("ANALYSIS_LOCK_SECONDS", "900"))
+    ANALYSIS_LOCK_RETRY_SECONDS = int(os.getenv("ANALYSIS_LOCK_RETRY_SECONDS", "5"))
+    
+    # Shared upstream budgets (until response headers report the real ones)
+    # and how long a worker waits for a token before backing off
+    GITHUB_RATE_LIMIT_PER_HOUR = int(os.getenv("GITHUB_RATE_LIMIT_PER_HOUR", "5000"))
+    OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+    RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "10"))
+    RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "2"))
+    RATE_LIMIT_BACKOFF_MAX_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_MAX_SECONDS", "300"))
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "12"))  # per analysis stage
+    
+    # Quiet period before a PR analysis runs; newer pushes inside the
+    # window supersede the queued job
+    ANALYSIS_DEBOUNCE_SECONDS = int(os.getenv("ANALYSIS_DEBOUNCE_SECONDS", "20"))
+    
+    # Outbound frames buffered per WebSocket client; when full, "drop"
+    # discards the oldest pending frame, "disconnect" closes the client
+    WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+    WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop")
+    
+    # How many webhook event summaries to keep (Redis stream / in-memory ring)
+    WEBHOOK_LOG_MAXLEN = int(os.getenv("WEBHOOK_LOG_MAXLEN", "1000"))
+    
+    # Thread pools used to keep blocking DB / broker calls off the event loop
+    DB_OFFLOAD_WORKERS = int(os.getenv("DB_OFFLOAD_WORKERS", "16"))
+    BROKER_OFFLOAD_WORKERS = int(os.getenv("BROKER_OFFLOAD_WORKERS", "8"))
+    # How often each process writes its buffered metrics to Redis
+    METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
     
     # API Settings
     API_TITLE = "PullSense API"
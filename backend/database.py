@@ -1,11 +1,62 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Float, ForeignKey, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Float, ForeignKey, Boolean, LargeBinary
+from sqlalchemy import event, Index
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
-# SQLite for quick start (we'll migrate to PostgreSQL later)
-engine = create_engine("sqlite:///./pullsense.db")
-# Why SQLite? No setup needed - just a file. Perfect for development.
-# The ./ means "current directory"
+from config import settings
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite tuning so API and worker writes don't serialize on one lock."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # WAL: readers don't block the writer and the writer doesn't block readers
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # Safe with WAL - fsync on checkpoint instead of every commit
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    # Wait for the write lock instead of failing with "database is locked"
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    # Serve reads from memory-mapped pages
+    cursor.close()
+
+
+def build_engine(url: str = settings.DATABASE_URL):
+    """Create an engine for `url` - pooled, pre-pinged, and tuned for SQLite if that's the backend."""
+    url_info = make_url(url)
+    
+    if url_info.get_backend_name() == "sqlite":
+        if url_info.database in (None, "", ":memory:"):
+            # In-memory DBs live inside one connection - keep SQLAlchemy's default pool
+            return create_engine(url, connect_args={"check_same_thread": False})
+        
+        engine = create_engine(
+            url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+            },
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_pre_ping=True
+        )
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+        return engine
+    
+    return create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        # Drop connections the server closed (idle timeout, failover) before using them
+        pool_pre_ping=True
+    )
+
+
+engine = build_engine()
+# DATABASE_URL decides the backend: SQLite file for local dev, Postgres in docker-compose
 
 SessionLocal = sessionmaker(bind=engine)
 # SessionLocal is a factory. Each time we call it, we get a new database session
@@ -17,6 +68,8 @@ Base = declarative_base()
 
 class PullRequest(Base):
     __tablename__ = "pull_requests"
+    # One row per GitHub PR, upserted on (repo_name, pr_number) by every webhook.
+    # The individual webhooks go to pull_request_events.
     
     id = Column(Integer, primary_key=True)
     # Every table needs a primary key - unique identifier for each row
@@ -34,15 +87,78 @@ class PullRequest(Base):
     # GitHub username of who created the PR
     
     action = Column(String)
-    # What happened: "opened", "closed", "reopened", "synchronize" (updated)
+    # Latest action: "opened", "closed", "reopened", "synchronize" (updated)
+    
+    state = Column(String)
+    # GitHub's PR state from the latest webhook: "open" or "closed"
     
-    raw_data = Column(JSON)
-    # Store the entire webhook payload - useful for debugging and future features
-    # JSON column type stores Python dicts as JSON in database
+    head_sha = Column(String(40))
+    # Commit at the tip of the PR branch as of the latest webhook
+    
+    payload_hash = Column(String(64), ForeignKey("payload_blobs.hash"))
+    # Latest webhook payload, stored in payload_blobs (compressed, deduplicated)
+    # Only the hash is stored here so list queries never touch the blob
+    
+    payload = relationship("PayloadBlob", lazy="select")
+    # Lazy: only loaded when something actually reads pr.payload
+    
+    analysis_status = Column(String, nullable=False, default="not_analyzed", server_default="not_analyzed")
+    # Status of the latest CodeReview, copied here when a review is saved
+    # so list endpoints can filter on it with an index
     
     created_at = Column(DateTime, default=datetime.utcnow)
-    # When WE received this webhook (not when PR was created)
+    # When WE first saw this PR (not when it was created on GitHub)
     # default= means SQLAlchemy automatically sets this
+    
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    # When the latest webhook for this PR arrived
+    
+    github_updated_at = Column(DateTime)
+    # pull_request.updated_at (UTC) of the webhook title/state/head_sha came
+    # from - an older one arriving late doesn't overwrite them
+    
+    __table_args__ = (
+        Index("ux_pull_requests_repo_pr", "repo_name", "pr_number", unique=True),
+        # The canonical key - webhooks upsert on it
+        Index("ix_pull_requests_created_id", "created_at", "id"),
+        # Newest-first keyset pages: /pull-requests and /dashboard
+        Index("ix_pull_requests_repo_created", "repo_name", "created_at", "id"),
+        Index("ix_pull_requests_author_created", "author", "created_at", "id"),
+        Index("ix_pull_requests_action_created", "action", "created_at", "id"),
+        Index("ix_pull_requests_status_created", "analysis_status", "created_at", "id"),
+        # One per list filter, each ending in the keyset columns so a filtered
+        # page is a single range scan
+    )
+
+class PullRequestEvent(Base):
+    __tablename__ = "pull_request_events"
+    # Append-only: one small row per pull_request webhook
+    
+    id = Column(Integer, primary_key=True)
+    pull_request_id = Column(Integer, ForeignKey("pull_requests.id"), nullable=False)
+    action = Column(String)
+    head_sha = Column(String(40))
+    delivery_id = Column(String)  # X-GitHub-Delivery, for tracing redeliveries
+    payload_hash = Column(String(64), ForeignKey("payload_blobs.hash"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_pull_request_events_pr_created", "pull_request_id", "created_at"),
+    )
+
+class PayloadBlob(Base):
+    __tablename__ = "payload_blobs"
+    
+    hash = Column(String(64), primary_key=True)
+    # sha256 of the canonical JSON - identical content is stored once
+    
+    data = Column(LargeBinary, nullable=False)
+    # zlib-compressed JSON; shared sub-objects are replaced by {"$blob": hash}
+    
+    size = Column(Integer)
+    # Uncompressed size in bytes, handy for spotting huge payloads
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class CodeReview(Base):
     __tablename__ = "code_reviews"
@@ -58,9 +174,37 @@ class CodeReview(Base):
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
     analysis_time_seconds = Column(Float)  # How long analysis took
+    head_sha = Column(String(40))  # Commit that was analyzed
+    analyzer_version = Column(String)  # ai_analyzer.ANALYZER_VERSION at the time
+    stage_timings = Column(JSON)  # Seconds per stage: queue_wait, github_api, llm_call, ...
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    file_findings = Column(JSON(none_as_null=True))  # {filename: notes} from the review's per-file sections
+    base_sha = Column(String(40))  # Incremental review: only base_sha..head_sha was analyzed
     
     # Relationship back to PR
     pull_request = relationship("PullRequest", backref="reviews")
+    
+    __table_args__ = (
+        Index("ix_code_reviews_pr_created", "pull_request_id", "created_at"),
+        # "Latest review for this PR" is an index seek, not a scan + sort
+        Index("ix_code_reviews_pr_sha_version", "pull_request_id", "head_sha", "analyzer_version"),
+        # "Was this commit already reviewed?" (idempotent re-analysis)
+    )
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+    
+    name = Column(String, primary_key=True)
+    # "prs", "events", "reviews", "reviews:<status>"
+    
+    repo_name = Column(String, primary_key=True, default="")
+    # "" = all repositories
+    
+    day = Column(String(10), primary_key=True, default="")
+    # "YYYY-MM-DD" (UTC), "" = all time
+    
+    value = Column(Integer, nullable=False, default=0)
 
 class User(Base):
     __tablename__ = "users"
@@ -74,8 +218,14 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
 
-    
-# Create the actual database tables
-Base.metadata.create_all(bind=engine)
-# This reads all classes that inherit from Base and creates their tables
-# Safe to run multiple times - won't recreate existing tables
\ No newline at end of file
+# Tables are created and altered by migrations.py (run once per deploy),
+# not here - importing this module has no side effects on the database
+
+
+def dialect_insert(db, model):
+    """INSERT construct with on_conflict_* support for the session's backend."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
@@ -1,56 +1,81 @@
-from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect, Query
 from fastapi.middleware.cors import CORSMiddleware  
-from celery_app import analyze_pr_task, test_task
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from celery_app import test_task
 from pydantic import BaseModel
-from datetime import datetime
-from database import SessionLocal, PullRequest
+from datetime import datetime, timezone
+from database import SessionLocal, PullRequest, PullRequestEvent, dialect_insert
 from database import CodeReview
 from sqlalchemy.orm import joinedload
+from sqlalchemy import select, tuple_, text
 from config import settings  
 from services.github_service import github_service
-from typing import List
+from services.offload import offload
+from services.cache_service import cache
+from services.analysis_scheduler import analysis_scheduler
+from services.analysis_dedup import analysis_dedup
+from services.event_log import event_log
+from services.payload_store import payload_store
+from services.stats_service import stats_service
+from services.metrics import metrics
+from services.connection_manager import manager
+from services.task_state import task_state, FINAL_STATES
+from services.redis_client import get_async_redis, close_async_redis, WEBSOCKET_CHANNEL, TASK_CHANNEL
+from typing import Optional
 
 
 import json
 import os
 import asyncio
+import base64
+import time
+import uuid
 
 
-class ConnectionManager:
-    """Manages WebSocket connections for real-time updates."""
-    
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-    
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"📡 WebSocket connected. Total: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        print(f"📡 WebSocket disconnected. Total: {len(self.active_connections)}")
+async def relay_websocket_updates():
+    """
+    Fan Redis pub/sub messages out to this process's WebSocket clients.
     
-    async def broadcast(self, message: dict):
-        """Send message to all connected clients."""
-        if not self.active_connections:
-            return
-        
-        message_str = json.dumps(message)
-        disconnected = []
-        
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_str)
-            except:
-                disconnected.append(connection)
-        
-        # Clean up disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection)
+    Celery workers and other API processes publish to WEBSOCKET_CHANNEL;
+    every API process runs one of these, so a client sees updates no matter
+    which process it is connected to. Task state changes (TASK_CHANNEL)
+    wake this process's /tasks long-poll and SSE waiters. Reconnects if
+    Redis goes away.
+    """
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(WEBSOCKET_CHANNEL, TASK_CHANNEL)
+            print(f"📡 Relaying '{WEBSOCKET_CHANNEL}' to WebSocket clients")
+            async for message in pubsub.listen():
+                if message["channel"] == TASK_CHANNEL.encode():
+                    task_state.notify(message["data"].decode())
+                    continue
+                try:
+                    await manager.broadcast(json.loads(message["data"]))
+                except ValueError:
+                    print(f"⚠️  Dropping malformed update: {message['data']!r}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  WebSocket relay lost Redis ({e}), retrying in 5s")
+            await asyncio.sleep(5)
+        finally:
+            if pubsub is not None:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
 
-manager = ConnectionManager()
+
+async def publish_update(message: dict):
+    """Publish to every API process, or just this one's clients without Redis."""
+    try:
+        await get_async_redis().publish(WEBSOCKET_CHANNEL, json.dumps(message))
+    except Exception as e:
+        print(f"⚠️  Redis publish failed ({e}), broadcasting locally")
+        await manager.broadcast(message)
 
 app = FastAPI(title="PullSense API")
 
@@ -69,22 +94,90 @@ app.add_middleware(
 )
 
 
-# In-memory storage for now (we'll add database later)
-webhooks_received = []
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Time every request into http_request_seconds, labelled by route template."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # Buffered in process (no I/O), so it stays off the broker pool
+    metrics.observe("http_request_seconds", time.perf_counter() - start,
+                    method=request.method, route=getattr(route, "path", "unmatched"), status=response.status_code)
+    return response
+
+
+@app.on_event("startup")
+async def start_websocket_relay():
+    app.state.websocket_relay = asyncio.create_task(relay_websocket_updates())
+
+
+@app.on_event("shutdown")
+async def stop_websocket_relay():
+    relay = getattr(app.state, "websocket_relay", None)
+    if relay is not None:
+        relay.cancel()
+        try:
+            await relay
+        except asyncio.CancelledError:
+            pass
+    await close_async_redis()
+
+
+@app.on_event("shutdown")
+def shutdown_offload():
+    offload.shutdown()
+
 
 @app.get("/")
 def root():
     return {
         "app": "PullSense",
         "status": "running",
-        "webhooks_received": len(webhooks_received)
+        "webhooks_received": event_log.total()
+    }
+
+def database_ready() -> bool:
+    """Blocking - call through `offload.run_db`."""
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return True
+    except Exception as e:
+        print(f"❌ Database not ready: {e}")
+        return False
+    finally:
+        db.close()
+
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 200 once the database answers and this process's
+    services are on Redis (not their in-process fallbacks), 503 otherwise.
+    
+    Services no longer connect at import time, so this (not startup) is
+    where a missing dependency shows up.
+    """
+    checks = {
+        "database": await offload.run_db(database_ready),
+        "redis": await offload.run_broker(cache.ping)
     }
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "unavailable", "checks": checks}
+    )
 
 @app.get("/webhooks")
-def list_webhooks():
+def list_webhooks(
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """Recent webhook event summaries, newest first. Pass `next_cursor` back as `cursor` to page."""
+    events, next_cursor = event_log.page(limit=limit, before=cursor)
     return {
-        "count": len(webhooks_received),
-        "webhooks": webhooks_received[-10:]  # Last 10
+        "count": event_log.total(),
+        "webhooks": events,
+        "next_cursor": next_cursor
     }
 
 if __name__ == "__main__":
@@ -92,6 +185,99 @@ if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
 
 
+def github_time(value: Optional[str]) -> Optional[datetime]:
+    """GitHub's ISO 8601 timestamps ("2024-01-15T10:30:00Z") as naive UTC, or None."""
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
+    except (AttributeError, ValueError):
+        return None
+
+
+def save_pull_request(payload: dict, delivery_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Upsert the canonical PR for a pull_request webhook and append its event.
+    Blocking - call through `offload.run_db`.
+    
+    Webhooks can be redelivered or arrive out of order: one whose
+    pull_request.updated_at is older than the row's keeps its event row
+    but leaves title / action / state / head_sha alone ("stale": True).
+    
+    Returns a plain dict snapshot so nothing touches the session after close,
+    or None if the payload doesn't identify a PR.
+    """
+    pr = payload.get("pull_request", {})
+    repo_name = payload.get("repository", {}).get("full_name")
+    pr_number = pr.get("number")
+    head_sha = pr.get("head", {}).get("sha")
+    github_updated_at = github_time(pr.get("updated_at"))
+    if not repo_name or pr_number is None:
+        return None
+    
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        payload_hash = payload_store.put(db, payload)
+        
+        # Insert-if-missing on the unique (repo_name, pr_number) key, then lock
+        # the row - concurrent webhooks for one PR serialize here instead of
+        # creating duplicates
+        inserted = db.execute(
+            dialect_insert(db, PullRequest)
+            .values(
+                repo_name=repo_name,
+                pr_number=pr_number,
+                author=pr.get("user", {}).get("login"),
+                created_at=now
+            )
+            .on_conflict_do_nothing(index_elements=["repo_name", "pr_number"])
+        )
+        created = inserted.rowcount == 1
+        
+        db_pr = db.query(PullRequest)\
+            .filter_by(repo_name=repo_name, pr_number=pr_number)\
+            .with_for_update()\
+            .one()
+        stale = bool(github_updated_at and db_pr.github_updated_at and github_updated_at < db_pr.github_updated_at)
+        if stale:
+            print(f"⏪ PR #{pr_number}: {payload.get('action')} webhook is older than the stored state, keeping it")
+        else:
+            db_pr.title = pr.get("title")
+            db_pr.action = payload.get("action")
+            db_pr.state = pr.get("state")
+            db_pr.head_sha = head_sha or db_pr.head_sha
+            db_pr.payload_hash = payload_hash
+            db_pr.github_updated_at = github_updated_at or db_pr.github_updated_at
+            db_pr.updated_at = now
+        
+        db.add(PullRequestEvent(
+            pull_request_id=db_pr.id,
+            action=payload.get("action"),
+            head_sha=head_sha,
+            delivery_id=delivery_id,
+            payload_hash=payload_hash,
+            created_at=now
+        ))
+        
+        if created:
+            stats_service.increment(db, "prs", repo_name)
+        stats_service.increment(db, "events", repo_name)
+        db.commit()
+        
+        print(f"💾 {'Saved' if created else 'Updated'} PR #{pr_number} in database")
+        
+        return {
+            "id": db_pr.id,
+            "pr_number": db_pr.pr_number,
+            "title": db_pr.title,
+            "head_sha": db_pr.head_sha,
+            "payload_hash": payload_hash,
+            "created": created,
+            "stale": stale
+        }
+    finally:
+        db.close()
+
+
 @app.post("/webhook/github")
 async def github_webhook(request: Request):
     event_type = request.headers.get("X-GitHub-Event", "unknown")
@@ -99,64 +285,152 @@ async def github_webhook(request: Request):
     
     print(f"\n🎯 Received {event_type} event")
     
+    db_pr = task_id = None
     if event_type == "pull_request":
+        # DB write and broker round trip both block - keep them off the loop
+        db_pr = await offload.run_db(
+            save_pull_request,
+            payload,
+            delivery_id=request.headers.get("X-GitHub-Delivery")
+        )
+        
         pr = payload.get("pull_request", {})
-        repo = payload.get("repository", {})
+        repo_name = payload.get("repository", {}).get("full_name")
         
-        db = SessionLocal()
-        try:
-            db_pr = PullRequest(
-                repo_name=repo.get("full_name"),
-                pr_number=pr.get("number"),
-                title=pr.get("title"),
-                author=pr.get("user", {}).get("login"),
-                action=payload.get("action"),
-                raw_data=payload
+        # A stale event was superseded by a newer one - nothing to schedule or cancel
+        if not db_pr or db_pr["stale"]:
+            pass
+        elif payload.get("action") in ["opened", "synchronize"]:
+            print(f"🤖 Queuing AI analysis for PR {db_pr['id']}")
+            task_id = await offload.run_broker(
+                analysis_scheduler.schedule,
+                db_pr["id"],
+                repo_name,
+                pr.get("number"),
+                pr.get("head", {}).get("sha"),
+                priority_class=analysis_scheduler.classify(payload)
             )
-            db.add(db_pr)
-            db.commit()
-            db.refresh(db_pr)
-            
-            print(f"💾 Saved PR #{pr.get('number')} to database")
-            
-            if payload.get("action") in ["opened", "synchronize"]:
-                print(f"🤖 Queuing AI analysis for PR {db_pr.id}")
-                analyze_pr_task.delay(db_pr.id)
-            
-        finally:
-            db.close()
+        elif payload.get("action") == "closed":
+            await offload.run_broker(analysis_scheduler.cancel, repo_name, pr.get("number"))
     
-    webhook_data = {
-        "timestamp": datetime.now().isoformat(),
-        "event_type": event_type,
-        "payload": payload
-    }
-    webhooks_received.append(webhook_data)
+    summary = event_log.summarize(
+        event_type,
+        payload,
+        delivery_id=request.headers.get("X-GitHub-Delivery"),
+        pr_id=db_pr["id"] if db_pr else None,
+        payload_hash=db_pr["payload_hash"] if db_pr else None
+    )
+    await offload.run_broker(event_log.append, summary)
     
-    if event_type == "pull_request" and payload.get("action") == "opened":
-        await manager.broadcast({
+    if db_pr and payload.get("action") == "opened":
+        await publish_update({
             "type": "pr_created",
             "data": {
-                "pr_id": db_pr.id,
-                "pr_number": db_pr.pr_number,
-                "title": db_pr.title,
+                "pr_id": db_pr["id"],
+                "repo": repo_name,
+                "pr_number": db_pr["pr_number"],
+                "title": db_pr["title"],
                 "status": "pending"
             }
-    })
+        })
+    
+    return {"status": "received", "event": event_type, "task_id": task_id}
+
+
+def latest_review_id(pr_id_column):
+    """
+    Correlated subquery: id of the newest CodeReview for each PR row.
+    
+    Resolves with one seek on ix_code_reviews_pr_created per PR, so joining
+    it replaces the old one-query-per-PR loop.
+    """
+    return (
+        select(CodeReview.id)
+        .where(CodeReview.pull_request_id == pr_id_column)
+        .order_by(CodeReview.created_at.desc(), CodeReview.id.desc())
+        .limit(1)
+        .correlate_except(CodeReview)
+        .scalar_subquery()
+    )
+
+
+def encode_cursor(created_at: datetime, pr_id: int) -> str:
+    """Opaque keyset cursor for the last row of a page."""
+    raw = json.dumps([created_at.isoformat(), pr_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, pr_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(pr_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def filter_prs(query, cursor: Optional[str] = None, repo: Optional[str] = None,
+               author: Optional[str] = None, action: Optional[str] = None,
+               status: Optional[str] = None):
+    """
+    Apply list filters and the (created_at, id) keyset to a PullRequest query, newest first.
+    
+    Every filter has a matching (column, created_at, id) index, and the
+    keyset predicate turns "page N" into a range seek - page 1000 costs
+    the same as page 1.
+    """
+    if repo:
+        query = query.filter(PullRequest.repo_name == repo)
+    if author:
+        query = query.filter(PullRequest.author == author)
+    if action:
+        query = query.filter(PullRequest.action == action)
+    if status:
+        query = query.filter(PullRequest.analysis_status == status)
+    if cursor:
+        query = query.filter(tuple_(PullRequest.created_at, PullRequest.id) < decode_cursor(cursor))
     
-    return {"status": "received", "event": event_type}
+    return query.order_by(PullRequest.created_at.desc(), PullRequest.id.desc())
+
+
+def split_page(rows, limit: int):
+    """Rows were fetched with limit + 1 - return (page, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last.created_at, last.id)
 
 
 @app.get("/pull-requests")
-def get_pull_requests():
-    """Get all saved pull requests from database"""
+def get_pull_requests(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    repo: Optional[str] = None,
+    author: Optional[str] = None,
+    action: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """Page through saved pull requests, newest first. Pass `next_cursor` back as `cursor`."""
     db = SessionLocal()
     try:
-        #Query all PRs, ordered by newest first
-        prs = db.query(PullRequest)\
-            .order_by(PullRequest.created_at.desc())\
-            .limit(20)\
-            .all()
+        #Query one page of PRs, newest first
+        query = db.query(
+            PullRequest.id,
+            PullRequest.repo_name,
+            PullRequest.pr_number,
+            PullRequest.title,
+            PullRequest.author,
+            PullRequest.action,
+            PullRequest.analysis_status,
+            PullRequest.state,
+            PullRequest.head_sha,
+            PullRequest.created_at,
+            PullRequest.updated_at
+        )
+        prs, next_cursor = split_page(
+            filter_prs(query, cursor, repo, author, action, status).limit(limit + 1).all(),
+            limit
+        )
 
        # Convert to JSON-friendly format
         return {
@@ -169,10 +443,15 @@ def get_pull_requests():
                     "title": pr.title,
                     "author": pr.author,
                     "action": pr.action,
-                    "created": pr.created_at.isoformat()
+                    "analysis_status": pr.analysis_status,
+                    "state": pr.state,
+                    "head_sha": pr.head_sha,
+                    "created": pr.created_at.isoformat(),
+                    "updated": pr.updated_at.isoformat() if pr.updated_at else None
                 }
                 for pr in prs
-            ]
+            ],
+            "next_cursor": next_cursor
         }
     finally:
         db.close()
@@ -182,18 +461,33 @@ def get_pr_analysis(pr_id: int):
     """Get the latest AI analysis for a pull request"""
     db = SessionLocal()
     try:
-        # Get PR with its reviews
-        pr = db.query(PullRequest).filter_by(id=pr_id).first()
-        if not pr:
-            raise HTTPException(status_code=404, detail="Pull request not found")
-        
-        # Get the latest review
-        review = db.query(CodeReview)\
-            .filter_by(pull_request_id=pr_id)\
-            .order_by(CodeReview.created_at.desc())\
+        # PR and its latest review in one round trip
+        row = db.query(
+            PullRequest.id,
+            PullRequest.pr_number,
+            PullRequest.title,
+            PullRequest.author,
+            PullRequest.action,
+            CodeReview.id.label("review_id"),
+            CodeReview.analysis_status,
+            CodeReview.analysis_text,
+            CodeReview.model_used,
+            CodeReview.created_at.label("review_created_at"),
+            CodeReview.analysis_time_seconds,
+            CodeReview.head_sha,
+            CodeReview.base_sha,
+            CodeReview.stage_timings,
+            CodeReview.prompt_tokens,
+            CodeReview.completion_tokens
+        )\
+            .outerjoin(CodeReview, CodeReview.id == latest_review_id(PullRequest.id))\
+            .filter(PullRequest.id == pr_id)\
             .first()
         
-        if not review:
+        if not row:
+            raise HTTPException(status_code=404, detail="Pull request not found")
+        
+        if row.review_id is None:
             return {
                 "status": "pending",
                 "message": "No analysis found. Trigger analysis with POST /analyze/{pr_id}"
@@ -201,43 +495,99 @@ def get_pr_analysis(pr_id: int):
         
         return {
             "pull_request": {
-                "id": pr.id,
-                "number": pr.pr_number,
-                "title": pr.title,
-                "author": pr.author,
-                "action": pr.action
+                "id": row.id,
+                "number": row.pr_number,
+                "title": row.title,
+                "author": row.author,
+                "action": row.action
             },
             "analysis": {
-                "id": review.id,
-                "status": review.analysis_status,
-                "text": review.analysis_text,
-                "model": review.model_used,
-                "created_at": review.created_at.isoformat(),
-                "analysis_time": review.analysis_time_seconds
+                "id": row.review_id,
+                "status": row.analysis_status,
+                "text": row.analysis_text,
+                "model": row.model_used,
+                "created_at": row.review_created_at.isoformat(),
+                "analysis_time": row.analysis_time_seconds,
+                "head_sha": row.head_sha,
+                "base_sha": row.base_sha,  # set when only base_sha..head_sha was re-analyzed
+                "stage_timings": row.stage_timings,
+                "tokens": {"prompt": row.prompt_tokens, "completion": row.completion_tokens}
             }
         }
     finally:
         db.close()
 
-@app.get("/stats")
-def get_stats():
-    """Get statistics about the system"""
+@app.get("/pull-requests/{pr_id}/events")
+def get_pr_events(pr_id: int, limit: int = Query(50, ge=1, le=200)):
+    """Webhook history for one PR, newest first."""
     db = SessionLocal()
     try:
-        total_prs = db.query(PullRequest).count()
-        total_reviews = db.query(CodeReview).count()
+        if db.query(PullRequest.id).filter_by(id=pr_id).first() is None:
+            raise HTTPException(status_code=404, detail="Pull request not found")
         
-        # Get review status breakdown
-        from sqlalchemy import func
-        status_counts = db.query(
-            CodeReview.analysis_status,
-            func.count(CodeReview.id)
-        ).group_by(CodeReview.analysis_status).all()
+        events = db.query(
+            PullRequestEvent.id,
+            PullRequestEvent.action,
+            PullRequestEvent.head_sha,
+            PullRequestEvent.delivery_id,
+            PullRequestEvent.created_at
+        )\
+            .filter(PullRequestEvent.pull_request_id == pr_id)\
+            .order_by(PullRequestEvent.created_at.desc(), PullRequestEvent.id.desc())\
+            .limit(limit)\
+            .all()
+        
+        return {
+            "pr_id": pr_id,
+            "events": [
+                {
+                    "id": event.id,
+                    "action": event.action,
+                    "head_sha": event.head_sha,
+                    "delivery_id": event.delivery_id,
+                    "created_at": event.created_at.isoformat()
+                }
+                for event in events
+            ]
+        }
+    finally:
+        db.close()
+
+
+@app.get("/stats")
+def get_stats(repo: Optional[str] = None, day: Optional[str] = None):
+    """
+    Get statistics about the system.
+    
+    Reads pre-aggregated counters (one indexed query) instead of counting
+    tables. Narrow with `repo` and/or `day` (YYYY-MM-DD, UTC).
+    """
+    db = SessionLocal()
+    try:
+        counters = stats_service.snapshot(db, repo_name=repo or "", day=day or "")
         
         return {
-            "total_prs": total_prs,
-            "total_reviews": total_reviews,
-            "reviews_by_status": dict(status_counts),
+            "total_prs": counters.get("prs", 0),
+            "total_reviews": counters.get("reviews", 0),
+            "reviews_by_status": {
+                name.split(":", 1)[1]: value
+                for name, value in counters.items()
+                if name.startswith("reviews:")
+            },
+            # How long jobs sat in the queue past their due time, per priority class
+            "queue_wait_seconds": {
+                series.split("=", 1)[-1]: summary
+                for series, summary in metrics.summary("queue_wait_seconds").items()
+            },
+            # Where analysis time goes (full histograms at /metrics)
+            "stage_seconds": {
+                series.split("=", 1)[-1]: summary
+                for series, summary in metrics.summary("stage_seconds").items()
+            },
+            # Per tier (local LRU, Redis) and overall
+            "cache_hit_ratio": cache_hit_ratios(),
+            # Share of GitHub requests answered 304 from a stored copy, per endpoint
+            "github_not_modified_ratio": github_not_modified_ratio(),
             "celery_status": "Check worker terminal",
             "ai_enabled": bool(settings.OPENAI_API_KEY)
         }
@@ -245,21 +595,130 @@ def get_stats():
         db.close()
 
 
+def cache_hit_ratios() -> dict:
+    """Hit ratio per cache tier, plus overall (every lookup tries the local tier first)."""
+    lookups = {}
+    for series, value in metrics.counter("cache_requests_total").items():
+        labels = dict(pair.split("=", 1) for pair in series.split(","))
+        counts = lookups.setdefault(labels.get("tier", "redis"), {"hit": 0, "miss": 0})
+        if labels.get("result") in counts:
+            counts[labels["result"]] += value
+    ratios = {
+        tier: round(counts["hit"] / (counts["hit"] + counts["miss"]), 3)
+        for tier, counts in lookups.items() if counts["hit"] + counts["miss"]
+    }
+    local = lookups.get("local")
+    if local and local["hit"] + local["miss"]:
+        hits = local["hit"] + lookups.get("redis", {}).get("hit", 0)
+        ratios["overall"] = round(hits / (local["hit"] + local["miss"]), 3)
+    return ratios
+
+
+def github_not_modified_ratio() -> dict:
+    requests = {}
+    for series, value in metrics.counter("github_requests_total").items():
+        labels = dict(pair.split("=", 1) for pair in series.split(","))
+        counts = requests.setdefault(labels.get("endpoint"), {})
+        counts[labels.get("result")] = counts.get(labels.get("result"), 0) + value
+    return {
+        endpoint: round(counts.get("not_modified", 0) / sum(counts.values()), 3)
+        for endpoint, counts in requests.items() if sum(counts.values())
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: stage, queue-wait, HTTP and token histograms plus cache counters"""
+    # Reads (and flushes) Redis; the default executor, not the broker pool
+    body = await asyncio.to_thread(metrics.prometheus)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/daily")
+def get_daily_stats(
+    name: str = "prs",
+    repo: Optional[str] = None,
+    days: int = Query(30, ge=1, le=365)
+):
+    """Per-day series for one counter (prs, reviews, reviews:<status>)."""
+    db = SessionLocal()
+    try:
+        return {
+            "name": name,
+            "repo": repo,
+            "days": stats_service.daily(db, name, repo_name=repo or "", days=days)
+        }
+    finally:
+        db.close()
+
+
 @app.post("/test/celery")
 def test_celery():
     """Test endpoint to verify Celery is working"""
-    # .delay() sends the task to background queue
-    task = test_task.delay("Testing Celery!")
+    # .apply_async() sends the task to background queue
+    task_id = str(uuid.uuid4())
+    task_state.set(task_id, "queued")
+    test_task.apply_async(args=["Testing Celery!"], task_id=task_id)
     
     return {
         "message": "Test task queued",
-        "task_id": task.id,
+        "task_id": task_id,
         "check_worker_terminal": "You should see output there!"
     }
 
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    """State of a queued job: queued, fetching, analyzing, done or failed, with timestamps"""
+    task = await offload.run_broker(task_state.get, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@app.get("/tasks/{task_id}/wait")
+async def wait_for_task(
+    task_id: str,
+    version: int = Query(0, ge=0),
+    timeout: float = Query(30, gt=0, le=60)
+):
+    """
+    Long-poll: returns as soon as the task's version is past `version` (or
+    it is done/failed), else its current state after `timeout` seconds.
+    Pass the returned `version` back to wait for the next change.
+    """
+    task = await task_state.wait(task_id, version, timeout)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@app.get("/tasks/{task_id}/events")
+async def task_events(task_id: str):
+    """Server-sent events: one `data:` frame per state change, closed once the task is done or failed"""
+    if await offload.run_broker(task_state.get, task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    async def stream():
+        version = 0
+        while True:
+            task = await task_state.wait(task_id, version, timeout=15)
+            if task is None:
+                return
+            if task["version"] <= version:
+                yield ": keep-alive\n\n"
+                continue
+            version = task["version"]
+            yield f"id: {version}\ndata: {json.dumps(task)}\n\n"
+            if task["state"] in FINAL_STATES:
+                return
+    
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
 @app.post("/analyze/{pr_id}")
-def trigger_analysis(pr_id: int):
-    """Manually trigger analysis for a specific PR"""
+def trigger_analysis(pr_id: int, force: bool = False):
+    """Manually trigger analysis for a specific PR (force=true re-analyzes an already reviewed commit)"""
     # Check if PR exists
     db = SessionLocal()
     try:
@@ -267,51 +726,83 @@ def trigger_analysis(pr_id: int):
         if not pr:
             raise HTTPException(status_code=404, detail="PR not found")
         
+        # This commit already has a review from the current analyzer
+        review = None if force else analysis_dedup.find_review(db, pr_id, pr.head_sha)
+        if review:
+            return {
+                "message": f"PR #{pr.pr_number} was already analyzed at this commit",
+                "pr_title": pr.title,
+                "review_id": review.id,
+                "reused": True
+            }
+        
         # Queue the analysis
-        task = analyze_pr_task.delay(pr_id)
+        # Interactive requests jump ahead of webhook-driven work
+        task_id = analysis_scheduler.dispatch(pr_id, priority_class="manual", force=force)
         
         return {
             "message": f"Analysis queued for PR #{pr.pr_number}",
             "pr_title": pr.title,
-            "task_id": task.id
+            "task_id": task_id
         }
     finally:
         db.close()
         
 @app.get("/dashboard")
-def get_dashboard():
+def get_dashboard(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    repo: Optional[str] = None,
+    author: Optional[str] = None,
+    action: Optional[str] = None,
+    status: Optional[str] = None
+):
     """Get overview of all PRs and their analysis status"""
     db = SessionLocal()
     try:
-        # Get recent PRs
-        prs = db.query(PullRequest)\
-            .order_by(PullRequest.created_at.desc())\
-            .limit(20)\
+        # One page of PRs, then join each one's latest review - one query total
+        page = db.query(
+            PullRequest.id,
+            PullRequest.pr_number,
+            PullRequest.title,
+            PullRequest.author,
+            PullRequest.repo_name,
+            PullRequest.created_at
+        )
+        recent = filter_prs(page, cursor, repo, author, action, status)\
+            .limit(limit + 1)\
+            .subquery()
+        
+        rows = db.query(
+            recent,
+            CodeReview.analysis_status,
+            CodeReview.created_at.label("analyzed_at")
+        )\
+            .outerjoin(CodeReview, CodeReview.id == latest_review_id(recent.c.id))\
+            .order_by(recent.c.created_at.desc(), recent.c.id.desc())\
             .all()
         
-        dashboard_data = []
-        for pr in prs:
-            # Check if PR has been analyzed
-            review = db.query(CodeReview)\
-                .filter_by(pull_request_id=pr.id)\
-                .order_by(CodeReview.created_at.desc())\
-                .first()
-            
-            dashboard_data.append({
-                "pr_id": pr.id,
-                "pr_number": pr.pr_number,
-                "title": pr.title,
-                "author": pr.author,
-                "repo": pr.repo_name,
-                "created_at": pr.created_at.isoformat(),
-                "analysis_status": review.analysis_status if review else "not_analyzed",
-                "analyzed_at": review.created_at.isoformat() if review else None
-            })
+        rows, next_cursor = split_page(rows, limit)
+        
+        dashboard_data = [
+            {
+                "pr_id": row.id,
+                "pr_number": row.pr_number,
+                "title": row.title,
+                "author": row.author,
+                "repo": row.repo_name,
+                "created_at": row.created_at.isoformat(),
+                "analysis_status": row.analysis_status or "not_analyzed",
+                "analyzed_at": row.analyzed_at.isoformat() if row.analyzed_at else None
+            }
+            for row in rows
+        ]
         
         return {
-            "total_prs": len(prs),
+            "total_prs": len(rows),
             "analyzed": sum(1 for item in dashboard_data if item["analysis_status"] != "not_analyzed"),
-            "pull_requests": dashboard_data
+            "pull_requests": dashboard_data,
+            "next_cursor": next_cursor
         }
     finally:
         db.close()
@@ -319,19 +810,43 @@ def get_dashboard():
         
 @app.get("/github/rate-limit")
 def get_github_rate_limit():
-    """Check GitHub API rate limit status"""
+    """GitHub API budget shared by all workers (from recent response headers, no API call)"""
     return github_service.get_rate_limit()
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    """
+    Live dashboard updates.
+    
+    Clients receive every update ("all") until they narrow it down:
+    
+        {"action": "subscribe", "topics": ["repo:octo/repo", "pr:42"]}
+        {"action": "unsubscribe", "topics": ["all"]}
+    """
     await manager.connect(websocket)
     try:
         while True:
-            # Keep connection alive
             data = await websocket.receive_text()
-            # Echo back or handle client messages
-            await websocket.send_text(f"Message received: {data}")
+            try:
+                command = json.loads(data)
+            except ValueError:
+                command = None
+            
+            if isinstance(command, dict) and command.get("action") in ("subscribe", "unsubscribe"):
+                topics = [t for t in command.get("topics", []) if isinstance(t, str)]
+                if command["action"] == "subscribe":
+                    manager.subscribe(websocket, topics)
+                else:
+                    manager.unsubscribe(websocket, topics)
+                client = manager.clients.get(websocket)
+                manager.send(websocket, {
+                    "type": "subscriptions",
+                    "topics": sorted(client.topics) if client else []
+                })
+            else:
+                # Echo back anything else
+                manager.send(websocket, {"type": "echo", "message": data})
     except WebSocketDisconnect:
         manager.disconnect(websocket)
         
@@ -0,0 +1,285 @@
+"""
+Versioned schema migrations.
+
+Run once per deploy, before starting the API or the Celery workers:
+
+    python migrations.py            # upgrade to the latest version
+    python migrations.py --status   # show applied / pending versions
+
+Each migration runs in its own transaction and is recorded in
+`schema_migrations`, so re-running is a no-op. Steps are written to be
+safe on both fresh and existing databases (checkfirst / inspector
+guards), because version 1 creates any missing tables from the models.
+"""
+import sys
+import argparse
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, inspect, text, select, func
+from sqlalchemy.orm import Session
+from database import engine as default_engine, Base, PullRequest, CodeReview
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = []
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime)
+)
+
+
+def migration(version: int, description: str):
+    """Register a migration step. Versions must be unique and increasing."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def _columns(conn, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _create_indexes(conn, *names: str):
+    """Create model-declared indexes by name, skipping ones that already exist."""
+    indexes = {
+        index.name: index
+        for table in Base.metadata.tables.values()
+        for index in table.indexes
+    }
+    for name in names:
+        indexes[name].create(bind=conn, checkfirst=True)
+
+
+@migration(1, "baseline tables")
+def _baseline(conn):
+    Base.metadata.create_all(bind=conn)
+
+
+@migration(2, "payload store: pull_requests.payload_hash + move raw_data")
+def _payload_store(conn):
+    from services.payload_store import payload_store
+
+    if "payload_hash" not in _columns(conn, "pull_requests"):
+        conn.execute(text("ALTER TABLE pull_requests ADD COLUMN payload_hash VARCHAR(64)"))
+
+    db = Session(bind=conn)
+    moved = payload_store.backfill_raw_data(db)
+    db.flush()
+    if moved:
+        print(f"📦 Moved {moved} payloads into payload_blobs")
+
+
+@migration(3, "indexes for PR lists and latest-review lookups")
+def _hot_path_indexes(conn):
+    # The pull_requests indexes were later replaced (migrations 4 and 6)
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_pull_requests_repo_pr ON pull_requests (repo_name, pr_number)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_pull_requests_created_at ON pull_requests (created_at)"
+    ))
+    _create_indexes(conn, "ix_code_reviews_pr_created")
+
+
+@migration(4, "keyset pagination: pull_requests.analysis_status + filter indexes")
+def _keyset_pagination(conn):
+    if "analysis_status" not in _columns(conn, "pull_requests"):
+        conn.execute(text(
+            "ALTER TABLE pull_requests ADD COLUMN analysis_status VARCHAR "
+            "NOT NULL DEFAULT 'not_analyzed'"
+        ))
+
+    # Backfill from each PR's latest review
+    conn.execute(text("""
+        UPDATE pull_requests SET analysis_status = COALESCE((
+            SELECT analysis_status FROM code_reviews
+            WHERE code_reviews.pull_request_id = pull_requests.id
+            ORDER BY created_at DESC, id DESC
+            LIMIT 1
+        ), 'not_analyzed')
+    """))
+
+    # (created_at, id) supersedes the single-column index
+    conn.execute(text("DROP INDEX IF EXISTS ix_pull_requests_created_at"))
+    _create_indexes(
+        conn,
+        "ix_pull_requests_created_id",
+        "ix_pull_requests_repo_created",
+        "ix_pull_requests_author_created",
+        "ix_pull_requests_action_created",
+        "ix_pull_requests_status_created"
+    )
+
+
+@migration(5, "stat_counters rollup table")
+def _stat_counters(conn):
+    from database import StatCounter
+    from services.stats_service import stats_service
+
+    StatCounter.__table__.create(bind=conn, checkfirst=True)
+
+    db = Session(bind=conn)
+    stats_service.reconcile(db)
+    db.flush()
+
+
+@migration(6, "canonical pull_requests + pull_request_events")
+def _canonical_pull_requests(conn):
+    from database import PullRequestEvent
+    from services.payload_store import payload_store
+    from services.stats_service import stats_service
+
+    for table, column, ddl in [
+        ("pull_requests", "state", "VARCHAR"),
+        ("pull_requests", "head_sha", "VARCHAR(40)"),
+        ("pull_requests", "updated_at", "TIMESTAMP"),
+        ("code_reviews", "head_sha", "VARCHAR(40)"),
+    ]:
+        if column not in _columns(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    PullRequestEvent.__table__.create(bind=conn, checkfirst=True)
+
+    db = Session(bind=conn)
+    prs = PullRequest.__table__
+    reviews = CodeReview.__table__
+    rows = conn.execute(select(
+        prs.c.id, prs.c.repo_name, prs.c.pr_number, prs.c.title,
+        prs.c.action, prs.c.payload_hash, prs.c.created_at
+    ).order_by(prs.c.id)).fetchall()
+
+    groups = {}
+    for row in rows:
+        key = (row.repo_name, row.pr_number) if row.repo_name and row.pr_number is not None else ("row", row.id)
+        groups.setdefault(key, []).append(row)
+
+    # Every old row becomes an event on the earliest row for its PR, which
+    # becomes the canonical PR and takes the latest row's fields
+    for group in groups.values():
+        canonical, latest = group[0], group[-1]
+        payload = payload_store.get(db, latest.payload_hash) or {}
+        pr_payload = payload.get("pull_request", {})
+
+        conn.execute(PullRequestEvent.__table__.insert(), [
+            {
+                "pull_request_id": canonical.id,
+                "action": row.action,
+                "payload_hash": row.payload_hash,
+                "created_at": row.created_at
+            }
+            for row in group
+        ])
+
+        duplicate_ids = [row.id for row in group[1:]]
+        if duplicate_ids:
+            conn.execute(
+                reviews.update()
+                .where(reviews.c.pull_request_id.in_(duplicate_ids))
+                .values(pull_request_id=canonical.id)
+            )
+            conn.execute(prs.delete().where(prs.c.id.in_(duplicate_ids)))
+
+        latest_status = select(reviews.c.analysis_status)\
+            .where(reviews.c.pull_request_id == canonical.id)\
+            .order_by(reviews.c.created_at.desc(), reviews.c.id.desc())\
+            .limit(1)\
+            .scalar_subquery()
+        conn.execute(prs.update().where(prs.c.id == canonical.id).values(
+            title=latest.title,
+            action=latest.action,
+            payload_hash=latest.payload_hash,
+            state=pr_payload.get("state"),
+            head_sha=(pr_payload.get("head") or {}).get("sha"),
+            updated_at=latest.created_at,
+            analysis_status=func.coalesce(latest_status, "not_analyzed")
+        ))
+
+    conn.execute(text("DROP INDEX IF EXISTS ix_pull_requests_repo_pr"))
+    _create_indexes(conn, "ux_pull_requests_repo_pr", "ix_pull_request_events_pr_created")
+
+    stats_service.reconcile(db)
+    db.flush()
+
+
+@migration(7, "idempotent analyses: code_reviews.analyzer_version")
+def _analyzer_version(conn):
+    if "analyzer_version" not in _columns(conn, "code_reviews"):
+        conn.execute(text("ALTER TABLE code_reviews ADD COLUMN analyzer_version VARCHAR"))
+    # Existing reviews keep a NULL version, so they are never reused
+    _create_indexes(conn, "ix_code_reviews_pr_sha_version")
+
+
+@migration(8, "per-stage timings and token counts on code_reviews")
+def _review_timings(conn):
+    existing = _columns(conn, "code_reviews")
+    for name, ddl in [("stage_timings", "JSON"), ("prompt_tokens", "INTEGER"), ("completion_tokens", "INTEGER")]:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE code_reviews ADD COLUMN {name} {ddl}"))
+
+
+@migration(9, "incremental re-analysis: code_reviews.file_findings, base_sha")
+def _incremental_reviews(conn):
+    existing = _columns(conn, "code_reviews")
+    for name, ddl in [("file_findings", "JSON"), ("base_sha", "VARCHAR(40)")]:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE code_reviews ADD COLUMN {name} {ddl}"))
+
+
+@migration(10, "out-of-order webhooks: pull_requests.github_updated_at")
+def _github_updated_at(conn):
+    if "github_updated_at" not in _columns(conn, "pull_requests"):
+        conn.execute(text("ALTER TABLE pull_requests ADD COLUMN github_updated_at TIMESTAMP"))
+
+
+def applied_versions(engine=default_engine) -> set:
+    schema_migrations.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(schema_migrations.select())}
+
+
+def upgrade(engine=default_engine) -> List[int]:
+    """Apply all pending migrations in order. Returns the versions applied."""
+    done = applied_versions(engine)
+    applied = []
+
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                # Two deploys racing: the second waits, then sees the version recorded
+                conn.execute(text("SELECT pg_advisory_xact_lock(4242)"))
+                if conn.execute(
+                    schema_migrations.select().where(schema_migrations.c.version == version)
+                ).first():
+                    continue
+
+            print(f"🔧 Applying migration {version}: {description}")
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+        applied.append(version)
+
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PullSense schema migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        done = applied_versions()
+        for version, description, _ in MIGRATIONS:
+            print(f"{'✅' if version in done else '⏳'} {version:04d} {description}")
+        sys.exit(0)
+
+    applied = upgrade()
+    print(f"✅ Database up to date ({len(applied)} migration(s) applied)")
@@ -1,45 +1,180 @@
-import openai
+import asyncio
 import json
 from typing import Dict, Optional
 from config import settings
+from services.rate_limiter import rate_limiter, RateLimited
+from services.metrics import metrics
+
+# Part of every review's idempotency key: bump it when the model or prompt
+# changes, so commits already reviewed get a fresh analysis
+ANALYZER_VERSION = "gpt-3.5-turbo:3"
+
+# How much of the diff goes into the prompt: patch characters overall and
+# per file, and how many further files are listed by name only
+PROMPT_DIFF_CHARS = 7500
+PROMPT_FILE_CHARS = 1500
+PROMPT_OTHER_FILES = 40
+# Reviewed last: lockfiles, minified / generated output, vendored code
+LOW_SIGNAL_SUFFIXES = (".lock", "package-lock.json", ".min.js", ".min.css", ".map", ".snap", ".svg")
+LOW_SIGNAL_DIRS = ("vendor/", "node_modules/", "dist/", "__generated__/")
 
 class CodeAnalyzer:
     """Handles AI analysis of pull requests"""
     
     def __init__(self):
-        # Only initialize if we have an API key
-        if settings.OPENAI_API_KEY:
-            self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Clients are built on first use: importing openai alone costs about
+        # half a second of API / worker startup
+        self._client = None
+        self._async_client = None
+    
+    @property
+    def client(self):
+        """openai.OpenAI, or None without an API key (mock analysis)."""
+        if self._client is None and settings.OPENAI_API_KEY:
+            import openai
+            self._client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
             print("✅ OpenAI client initialized")
-        else:
-            self.client = None
-            print("⚠️  No OpenAI API key - using mock analysis")
+        return self._client
     
     def analyze_pr(self, pr_data: dict) -> dict:
         """
         Analyze a PR with real code diff if available.
+        
+        Raises RateLimited when OpenAI's shared request budget is exhausted,
+        so the caller can retry later instead of saving a fallback review.
         """
         if not self.client:
             return self._mock_analysis(pr_data)
+        import openai  # already loaded by `client`
         
         try:
-            # Build enhanced prompt with code diff
-            diff_section = ""
-            if pr_data.get("diff_data") and pr_data["diff_data"].get("files"):
-                diff_section = "\n\nCode Changes:\n"
-                for file in pr_data["diff_data"]["files"][:5]:  # First 5 files
-                    diff_section += f"\n--- File: {file['filename']} ---\n"
-                    diff_section += f"Status: {file['status']} "
-                    diff_section += f"(+{file['additions']} -{file['deletions']})\n"
-                    
-                    if file.get('patch'):
-                        # Limit patch size to prevent token overflow
-                        patch = file['patch']
-                        if len(patch) > 1500:
-                            patch = patch[:1500] + "\n... (truncated)"
-                        diff_section += f"```diff\n{patch}\n```\n"
+            with metrics.stage("prompt_build"):
+                messages, used_real_diff = self._build_messages(pr_data)
+            
+            # Call OpenAI with enhanced prompt
+            with metrics.stage("rate_limit_wait"):
+                rate_limiter.acquire("openai")
+            with metrics.stage("llm_call"):
+                raw = self.client.chat.completions.with_raw_response.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=800,  # Increased for more detailed analysis
+                    temperature=0.7
+                )
+            rate_limiter.observe("openai", raw.headers)
+            return self._completed(raw.parse(), used_real_diff)
             
-            prompt = f"""
+        except (RateLimited, openai.RateLimitError) as e:
+            return self._rate_limited(pr_data, e)
+        except Exception as e:
+            return self._failed(pr_data, e)
+    
+    async def analyze_pr_async(self, pr_data: dict) -> dict:
+        """
+        Same as analyze_pr, on openai.AsyncOpenAI.
+        
+        Used by async_worker.py so one process can keep hundreds of
+        completions in flight instead of blocking a process per request.
+        """
+        if not self.client:
+            return self._mock_analysis(pr_data)
+        import openai  # already loaded by `client`
+        
+        try:
+            with metrics.stage("prompt_build"):
+                messages, used_real_diff = self._build_messages(pr_data)
+            with metrics.stage("rate_limit_wait"):
+                await rate_limiter.acquire_async("openai")
+            with metrics.stage("llm_call"):
+                raw = await self.async_client.chat.completions.with_raw_response.create(
+                    model="gpt-3.5-turbo",
+                    messages=messages,
+                    max_tokens=800,
+                    temperature=0.7
+                )
+            await asyncio.to_thread(rate_limiter.observe, "openai", raw.headers)
+            return self._completed(raw.parse(), used_real_diff)
+            
+        except (RateLimited, openai.RateLimitError) as e:
+            return self._rate_limited(pr_data, e)
+        except Exception as e:
+            return self._failed(pr_data, e)
+    
+    @property
+    def async_client(self):
+        # openai.AsyncOpenAI, created on first use with a connection pool
+        # sized for the worker
+        if self._async_client is None:
+            import httpx
+            import openai
+            limit = settings.ASYNC_WORKER_CONCURRENCY
+            self._async_client = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+                    timeout=httpx.Timeout(600.0, connect=5.0)
+                )
+            )
+        return self._async_client
+    
+    @staticmethod
+    def _select_files(files: list) -> set:
+        """
+        ids of the files whose patches go in the prompt: reviewable code
+        before lockfiles and generated output, larger changes first, until
+        the prompt's diff budget is spent.
+        """
+        candidates = sorted(
+            (f for f in files if f.get("patch")),
+            key=lambda f: (f["filename"].endswith(LOW_SIGNAL_SUFFIXES) or
+                           any(part in f["filename"] for part in LOW_SIGNAL_DIRS), -f["changes"])
+        )
+        shown, budget = set(), PROMPT_DIFF_CHARS
+        for file in candidates:
+            cost = min(len(file["patch"]), PROMPT_FILE_CHARS)
+            if cost > budget:
+                continue
+            shown.add(id(file))
+            budget -= cost
+        return shown
+    
+    def _build_messages(self, pr_data: dict):
+        """Chat messages for a PR, plus whether real diff content was included."""
+        # Build enhanced prompt with code diff
+        diff_section = ""
+        if pr_data.get("diff_data") and pr_data["diff_data"].get("files"):
+            files = pr_data["diff_data"]["files"]
+            shown = self._select_files(files)
+            diff_section = "\n\nCode Changes:\n"
+            for file in files:
+                if id(file) not in shown:
+                    continue
+                diff_section += f"\n--- File: {file['filename']} ---\n"
+                diff_section += f"Status: {file['status']} "
+                diff_section += f"(+{file['additions']} -{file['deletions']})\n"
+                
+                # Limit patch size to prevent token overflow
+                patch = file['patch']
+                if len(patch) > PROMPT_FILE_CHARS or file.get("truncated"):
+                    patch = patch[:PROMPT_FILE_CHARS] + "\n... (truncated)"
+                diff_section += f"```diff\n{patch}\n```\n"
+            
+            # Everything else by name, so the review knows the full scope
+            others = [f for f in files if id(f) not in shown]
+            if others:
+                diff_section += f"\nOther changed files ({len(others)}):\n"
+                for file in others[:PROMPT_OTHER_FILES]:
+                    diff_section += f"- {file['filename']} ({file['status']}, +{file['additions']} -{file['deletions']})\n"
+                if len(others) > PROMPT_OTHER_FILES:
+                    diff_section += f"- ... and {len(others) - PROMPT_OTHER_FILES} more\n"
+        
+        diff_data = pr_data.get('diff_data') or {}
+        if diff_data.get("base_sha") and diff_section:
+            # Incremental: the earlier review still stands for everything else
+            diff_section = (f"\n\nThis PR was reviewed at commit {diff_data['base_sha'][:7]}. Below are only "
+                            f"the changes pushed since then ({len(diff_data['files'])} files); review those."
+                            + diff_section)
+        prompt = f"""
             Analyze this pull request:
             
             Title: {pr_data.get('title', 'No title')}
@@ -47,9 +182,9 @@ class CodeAnalyzer:
             Author: {pr_data.get('author', 'Unknown')}
             
             Stats:
-            - Files changed: {pr_data.get('diff_data', {}).get('changed_files', 0)}
-            - Additions: {pr_data.get('diff_data', {}).get('additions', 0)}
-            - Deletions: {pr_data.get('diff_data', {}).get('deletions', 0)}
+            - Files changed: {diff_data.get('changed_files', 0)}
+            - Additions: {diff_data.get('additions', 0)}
+            - Deletions: {diff_data.get('deletions', 0)}
             
             {diff_section}
             
@@ -62,42 +197,54 @@ class CodeAnalyzer:
             6. Specific suggestions for improvement
             
             Be specific and reference actual code when possible. Focus on actionable feedback.
+            End with a section per file you have specific feedback on, each headed
+            "### File: <path>", so the notes can be matched to files later.
             """
-            
-            # Call OpenAI with enhanced prompt
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are an expert code reviewer. Provide specific, actionable feedback on the code changes."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                max_tokens=800,  # Increased for more detailed analysis
-                temperature=0.7
-            )
-            
-            analysis = response.choices[0].message.content
-            
-            return {
-                "status": "completed",
-                "analysis": analysis,
-                "model": "gpt-3.5-turbo",
-                "used_real_diff": bool(diff_section)
-            }
-            
-        except Exception as e:
-            print(f"❌ OpenAI error: {e}")
-            return {
-                "status": "error",
-                "error": str(e),
-                "analysis": self._mock_analysis(pr_data)["analysis"],
-                "model": "mock (fallback due to error)"
+        
+        messages = [
+            {
+                "role": "system", 
+                "content": "You are an expert code reviewer. Provide specific, actionable feedback on the code changes."
+            },
+            {
+                "role": "user", 
+                "content": prompt
             }
+        ]
+        return messages, bool(diff_section)
+    
+    @staticmethod
+    def _completed(response, used_real_diff: bool) -> dict:
+        usage = {}
+        if response.usage:
+            usage = {"prompt_tokens": response.usage.prompt_tokens,
+                     "completion_tokens": response.usage.completion_tokens}
+            metrics.observe("llm_tokens", usage["prompt_tokens"], kind="prompt")
+            metrics.observe("llm_tokens", usage["completion_tokens"], kind="completion")
+        return {
+            "status": "completed",
+            "analysis": response.choices[0].message.content,
+            "model": "gpt-3.5-turbo",
+            "used_real_diff": used_real_diff,
+            "usage": usage
+        }
+    
+    def _rate_limited(self, pr_data: dict, error: Exception) -> dict:
+        if isinstance(error, RateLimited):
+            raise error
+        if error.code == "insufficient_quota":
+            # Out of credit, not throttled - retrying won't help
+            return self._failed(pr_data, error)
+        raise rate_limiter.exceeded("openai", error.response.headers) from error
+    
+    def _failed(self, pr_data: dict, error: Exception) -> dict:
+        print(f"❌ OpenAI error: {error}")
+        return {
+            "status": "error",
+            "error": str(error),
+            "analysis": self._mock_analysis(pr_data)["analysis"],
+            "model": "mock (fallback due to error)"
+        }
     
     def _mock_analysis(self, pr_data: dict) -> dict:
         """Mock analysis when no API key is available"""
@@ -0,0 +1,75 @@
+from functools import cached_property
+from typing import Optional
+from sqlalchemy.orm import Session
+from config import settings
+from database import CodeReview
+from services.cache_service import SharedRedis
+from services.ai_analyzer import ANALYZER_VERSION
+
+# Delete the lock only if we still own it
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class AnalysisDedup:
+    """
+    Makes analyses idempotent per (repo, pr, head SHA, analyzer version).
+    
+    A finished review for the same key is reused instead of calling GitHub
+    and OpenAI again. Concurrent duplicates (a manual trigger racing a
+    webhook, redelivered events) are collapsed by a Redis lock: the second
+    job waits for the first and then picks up its stored review.
+    """
+    
+    redis_client = SharedRedis()
+    
+    def __init__(self):
+        self.lock_seconds = settings.ANALYSIS_LOCK_SECONDS
+    
+    @cached_property
+    def _release(self):
+        return self.redis_client.register_script(RELEASE_SCRIPT)
+    
+    def _key(self, repo_name: str, pr_number: int, head_sha: str) -> str:
+        return f"pullsense:analysis_lock:{repo_name}:{pr_number}:{head_sha}:{ANALYZER_VERSION}"
+    
+    def find_review(self, db: Session, pr_id: int, head_sha: Optional[str]) -> Optional[CodeReview]:
+        """The newest completed review of this exact commit by this analyzer version."""
+        if not head_sha:
+            return None
+        return db.query(CodeReview)\
+            .filter_by(
+                pull_request_id=pr_id,
+                head_sha=head_sha,
+                analyzer_version=ANALYZER_VERSION,
+                analysis_status="completed"
+            )\
+            .order_by(CodeReview.created_at.desc(), CodeReview.id.desc())\
+            .first()
+    
+    def acquire(self, repo_name: str, pr_number: int, head_sha: Optional[str], token: str) -> bool:
+        """Claim the key for this job. False if another job is already analyzing it."""
+        if not self.redis_client or not head_sha:
+            return True
+        try:
+            return bool(self.redis_client.set(
+                self._key(repo_name, pr_number, head_sha), token, nx=True, ex=self.lock_seconds
+            ))
+        except Exception as e:
+            print(f"Analysis lock error: {e}")
+            return True
+    
+    def release(self, repo_name: str, pr_number: int, head_sha: Optional[str], token: Optional[str]):
+        if not self.redis_client or not head_sha or not token:
+            return
+        try:
+            self._release(keys=[self._key(repo_name, pr_number, head_sha)], args=[token])
+        except Exception as e:
+            print(f"Analysis lock error: {e}")
+
+# Singleton instance
+analysis_dedup = AnalysisDedup()
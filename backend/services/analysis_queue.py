@@ -0,0 +1,93 @@
+import json
+import time
+import uuid
+from functools import cached_property
+from typing import List, Dict, Optional
+from services.cache_service import SharedRedis
+
+# Pop up to ARGV[2] due jobs (score <= ARGV[1]), draining the KEYS in order
+# so higher priority classes are always served first
+CLAIM_SCRIPT = """
+local jobs = {}
+for _, key in ipairs(KEYS) do
+    local want = tonumber(ARGV[2]) - #jobs
+    if want <= 0 then break end
+    local due = redis.call('ZRANGEBYSCORE', key, '-inf', ARGV[1], 'LIMIT', 0, want)
+    if #due > 0 then
+        redis.call('ZREM', key, unpack(due))
+        for _, job in ipairs(due) do table.insert(jobs, job) end
+    end
+end
+return jobs
+"""
+
+# Highest priority first
+PRIORITY_CLASSES = ("manual", "small", "bulk")
+
+
+class AnalysisQueue:
+    """
+    Redis job queue for async_worker.py (ANALYSIS_WORKER=async).
+    
+    One sorted set per priority class, scored by due time, so the
+    scheduler's debounce delay works the same way Celery's countdown does
+    and manual requests are claimed before small and bulk ones. Claiming is
+    a single Lua call, so several async workers can share the queue.
+    """
+    
+    KEY = "pullsense:analysis:due"
+    redis_client = SharedRedis()
+    
+    @cached_property
+    def _claim(self):
+        return self.redis_client.register_script(CLAIM_SCRIPT)
+    
+    def _key(self, priority_class: str) -> str:
+        return f"{self.KEY}:{priority_class}"
+    
+    def push(self, pr_id: int, generation: Optional[int] = None, delay: float = 0,
+             job_id: Optional[str] = None, priority_class: str = "small",
+             due_at: Optional[float] = None, force: bool = False, attempt: int = 0,
+             fair_share_waits: int = 0) -> str:
+        """
+        Queue an analysis to run after `delay` seconds. Returns the job id.
+        
+        `due_at` is kept when a job is requeued (fair share), so its queue
+        wait is measured from when it first became due. `force` re-analyzes
+        even if the PR's head commit already has a review; `attempt` counts
+        rate-limit retries and `fair_share_waits` fair-share retries, for backoff.
+        """
+        if not self.redis_client:
+            raise RuntimeError("The async analysis queue needs Redis")
+        if priority_class not in PRIORITY_CLASSES:
+            priority_class = "small"
+        
+        run_at = time.time() + delay
+        job_id = job_id or str(uuid.uuid4())
+        job = json.dumps({
+            "id": job_id,
+            "pr_id": pr_id,
+            "generation": generation,
+            "priority_class": priority_class,
+            "due_at": due_at or run_at,
+            "force": force,
+            "attempt": attempt,
+            "fair_share_waits": fair_share_waits
+        })
+        self.redis_client.zadd(self._key(priority_class), {job: run_at})
+        return job_id
+    
+    def claim(self, limit: int) -> List[Dict]:
+        """Take up to `limit` due jobs off the queue, highest priority first."""
+        if not self.redis_client or limit <= 0:
+            return []
+        jobs = self._claim(keys=[self._key(c) for c in PRIORITY_CLASSES], args=[time.time(), limit])
+        return [json.loads(job) for job in jobs]
+    
+    def depth(self) -> Dict[str, int]:
+        if not self.redis_client:
+            return {c: 0 for c in PRIORITY_CLASSES}
+        return {c: self.redis_client.zcard(self._key(c)) for c in PRIORITY_CLASSES}
+
+# Singleton instance
+analysis_queue = AnalysisQueue()
@@ -0,0 +1,190 @@
+import time
+import uuid
+from functools import cached_property
+from typing import Optional, Dict, Any
+from config import settings
+from services.cache_service import SharedRedis
+from services.task_state import task_state
+
+# Atomically bump the PR's generation and swap in the new task id.
+# Returns [generation, previous_task_id, duplicate]; a redelivered event for
+# the head SHA that already has a pending job keeps that job (duplicate = 1).
+SCHEDULE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'generation', 'task_id', 'head_sha')
+if ARGV[2] ~= '' and state[2] and state[3] == ARGV[2] then
+    return {tonumber(state[1]), state[2], 1}
+end
+local generation = redis.call('HINCRBY', KEYS[1], 'generation', 1)
+redis.call('HSET', KEYS[1], 'task_id', ARGV[1], 'head_sha', ARGV[2], 'pr_id', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {generation, state[2], 0}
+"""
+
+# Bump the generation without scheduling anything (PR closed).
+CANCEL_SCRIPT = """
+local previous = redis.call('HGET', KEYS[1], 'task_id')
+redis.call('HINCRBY', KEYS[1], 'generation', 1)
+redis.call('HDEL', KEYS[1], 'task_id', 'head_sha', 'pr_id')
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return previous
+"""
+
+# Clear the task id only if the finishing task is still the current one.
+FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'generation') == ARGV[1] then
+    redis.call('HDEL', KEYS[1], 'task_id')
+end
+return 1
+"""
+
+STATE_TTL_SECONDS = 86400
+
+# Celery message priority per class (Redis transport: 0 is served first)
+PRIORITIES = {"manual": 0, "small": 3, "bulk": 6}
+
+
+class AnalysisScheduler:
+    """
+    Debounces analysis jobs per (repo, pr_number).
+    
+    Every opened/synchronize event bumps a generation counter in Redis and
+    queues a delayed analyze_pr_task carrying that generation. Older queued
+    jobs are revoked, and a job that is already running checks the
+    generation before each expensive step, so only the latest head SHA
+    ends up as a CodeReview. State lives in Redis so every API process
+    sees the same generation.
+    """
+    
+    redis_client = SharedRedis()
+    
+    def __init__(self):
+        self.debounce_seconds = settings.ANALYSIS_DEBOUNCE_SECONDS
+    
+    @cached_property
+    def _schedule(self):
+        return self.redis_client.register_script(SCHEDULE_SCRIPT)
+    
+    @cached_property
+    def _cancel(self):
+        return self.redis_client.register_script(CANCEL_SCRIPT)
+    
+    @cached_property
+    def _finish(self):
+        return self.redis_client.register_script(FINISH_SCRIPT)
+    
+    def _key(self, repo_name: str, pr_number: int) -> str:
+        return f"pullsense:analysis:{repo_name}:{pr_number}"
+    
+    @staticmethod
+    def classify(payload: Dict[str, Any]) -> str:
+        """Priority class for a webhook-triggered analysis: "small" or "bulk"."""
+        pr = payload.get("pull_request", {})
+        author = ((pr.get("user") or {}).get("login") or "").lower()
+        if author in settings.BULK_AUTHORS or author.endswith("[bot]"):
+            return "bulk"
+        
+        lines = (pr.get("additions") or 0) + (pr.get("deletions") or 0)
+        return "bulk" if lines > settings.SMALL_DIFF_LINES else "small"
+    
+    def schedule(self, pr_id: int, repo_name: str, pr_number: int,
+                 head_sha: Optional[str] = None, priority_class: str = "small") -> str:
+        """Queue a debounced analysis, superseding any pending one. Blocking."""
+        if not self.redis_client:
+            # No shared state - fall back to queuing every event
+            return self.dispatch(pr_id, priority_class=priority_class)
+        
+        task_id = str(uuid.uuid4())
+        generation, previous, duplicate = self._schedule(
+            keys=[self._key(repo_name, pr_number)],
+            args=[task_id, head_sha or "", pr_id, STATE_TTL_SECONDS]
+        )
+        if duplicate:
+            print(f"🔁 {repo_name}#{pr_number} @ {head_sha[:7]} already scheduled, keeping that job")
+            return previous.decode()
+        if previous:
+            self._revoke(previous.decode())
+        
+        self.dispatch(pr_id, generation, delay=self.debounce_seconds, task_id=task_id,
+                      priority_class=priority_class)
+        print(f"⏳ Scheduled {priority_class} analysis for {repo_name}#{pr_number} "
+              f"(generation {generation}, head {(head_sha or '?')[:7]})")
+        return task_id
+    
+    def dispatch(self, pr_id: int, generation: Optional[int] = None, delay: float = 0,
+                 task_id: Optional[str] = None, priority_class: str = "small", force: bool = False) -> str:
+        """Hand a job to the configured analysis worker (Celery or async_worker.py). Blocking."""
+        # Record "queued" before sending: a fast (or eager) worker may move it on first
+        task_id = task_id or str(uuid.uuid4())
+        task_state.set(task_id, "queued", pr_id=pr_id, priority_class=priority_class)
+        
+        if settings.ANALYSIS_WORKER == "async":
+            from services.analysis_queue import analysis_queue
+            return analysis_queue.push(pr_id, generation, delay=delay, job_id=task_id,
+                                       priority_class=priority_class, force=force)
+        
+        from celery_app import analyze_pr_task
+        kwargs = {"priority_class": priority_class, "due_at": time.time() + delay}
+        if generation is not None:
+            kwargs["generation"] = generation
+        if force:
+            kwargs["force"] = True
+        return analyze_pr_task.apply_async(
+            args=[pr_id],
+            kwargs=kwargs,
+            task_id=task_id,
+            countdown=delay or None,
+            priority=PRIORITIES.get(priority_class, PRIORITIES["small"])
+        ).id
+    
+    def cancel(self, repo_name: str, pr_number: int):
+        """Drop pending work for a PR, e.g. when it is closed. Blocking."""
+        if not self.redis_client:
+            return
+        
+        previous = self._cancel(
+            keys=[self._key(repo_name, pr_number)],
+            args=[STATE_TTL_SECONDS]
+        )
+        if previous:
+            self._revoke(previous.decode())
+            print(f"🛑 Cancelled pending analysis for {repo_name}#{pr_number}")
+    
+    def is_current(self, repo_name: str, pr_number: int, generation: Optional[int]) -> bool:
+        """False once a newer event (or a close) has superseded this job."""
+        if generation is None or not self.redis_client:
+            return True
+        
+        try:
+            current = self.redis_client.hget(self._key(repo_name, pr_number), "generation")
+        except Exception as e:
+            print(f"Scheduler check error: {e}")
+            return True
+        return current is not None and int(current) == int(generation)
+    
+    def finish(self, repo_name: str, pr_number: int, generation: Optional[int]):
+        """Mark the current job as done so later events don't try to revoke it."""
+        if generation is None or not self.redis_client:
+            return
+        
+        try:
+            self._finish(keys=[self._key(repo_name, pr_number)], args=[generation])
+        except Exception as e:
+            print(f"Scheduler finish error: {e}")
+    
+    def _revoke(self, task_id: str):
+        from celery_app import app as celery
+        
+        task_state.set(task_id, "done", outcome="superseded")
+        if settings.ANALYSIS_WORKER == "async":
+            # Nothing to revoke - the async worker skips stale generations
+            return
+        
+        try:
+            # Queued/countdown jobs are dropped by the worker; a job that's
+            # already running notices via is_current() and stops early
+            celery.control.revoke(task_id)
+        except Exception as e:
+            print(f"Revoke error for {task_id}: {e}")
+
+# Singleton instance
+analysis_scheduler = AnalysisScheduler()
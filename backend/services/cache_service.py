@@ -1,49 +1,197 @@
-import redis
 import json
-from typing import Optional, Any
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional, Any, Tuple
+import msgpack
 from config import settings
+from services.redis_client import get_redis
+
+# First byte of every stored value: how the rest is encoded
+PLAIN, COMPRESSED = b"m", b"z"
+# msgpack smaller than this isn't worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+
+def encode(value: Any) -> bytes:
+    """msgpack behind a one-byte marker (the local tier's form)."""
+    return PLAIN + msgpack.packb(value, use_bin_type=True)
+
+
+def compress(data: bytes) -> bytes:
+    """encode() output as stored in Redis: zlib-compressed past COMPRESS_MIN_BYTES."""
+    if data[:1] != PLAIN or len(data) < COMPRESS_MIN_BYTES:
+        return data
+    return COMPRESSED + zlib.compress(data[1:], settings.CACHE_COMPRESSION_LEVEL)
+
+
+def decompress(data: bytes) -> bytes:
+    return PLAIN + zlib.decompress(data[1:]) if data[:1] == COMPRESSED else data
+
+
+def decode(data: bytes) -> Any:
+    data = decompress(data)
+    if data[:1] != PLAIN:
+        return json.loads(data)  # written before the binary format
+    return msgpack.unpackb(data[1:], raw=False, strict_map_key=False)
+
+
+class LocalLRU:
+    """
+    In-process tier in front of Redis: encoded values, least recently used
+    evicted once their total size passes `max_bytes`, each dropped when the
+    TTL it was stored with runs out.
+    """
+    
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def set(self, key: str, data: bytes, expire: float):
+        with self._lock:
+            self._remove(key)
+            if len(data) > self.max_bytes // 4:
+                return  # one huge value shouldn't flush the whole tier
+            self._entries[key] = (time.monotonic() + expire, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+    
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
 
 class CacheService:
-    """Simple Redis cache for storing analysis results."""
+    """
+    Two-tier cache: a size-bounded LRU in each process in front of Redis.
+    
+    Values are msgpack (see encode): zlib-compressed in Redis, so a hit
+    moves a fraction of the bytes, and uncompressed in the local tier,
+    where decompressing would cost more than the msgpack decode itself. A
+    local hit costs no round trip; a Redis hit is copied into the local
+    tier for the rest of its TTL. The
+    local tier isn't invalidated by other processes, so keys whose content
+    can change should carry what identifies that content (a head SHA, an
+    ETag) rather than rely on a short TTL. Lookups are counted per tier in
+    cache_requests_total{cache,tier,result}, buffered in process by
+    metrics and flushed in the background, so counting adds no I/O.
+    
+    Also decides whether Redis is there at all: the first use of
+    `redis_client` connects (bounded by REDIS_CONNECT_TIMEOUT) and every
+    service falls back to in-process state while that fails. A failed
+    attempt is retried on use after REDIS_RETRY_SECONDS, so a process
+    that started during a Redis blip rejoins the shared state instead of
+    staying degraded. Nothing connects at import time, so a missing Redis
+    doesn't hold up startup - the /ready probe is what reports it.
+    """
     
-    def __init__(self):
+    def __init__(self, local_max_bytes: int = None):
+        self._redis_client = None
+        self._resolved = False  # connected - never re-checked
+        self._retry_at = 0.0  # monotonic time of the next attempt while unreachable
+        self._lock = threading.Lock()
+        self.local = LocalLRU(local_max_bytes if local_max_bytes is not None else settings.CACHE_LOCAL_MAX_BYTES)
+    
+    @property
+    def redis_client(self):
+        """The shared Redis client, or None while Redis is unreachable."""
+        if self._resolved or time.monotonic() < self._retry_at:
+            return self._redis_client
+        # One thread connects; the others carry on with the fallbacks meanwhile
+        if not self._lock.acquire(blocking=False):
+            return self._redis_client
         try:
-            self.redis_client = redis.from_url(settings.REDIS_URL)
-            self.redis_client.ping()
-            print("✅ Redis cache connected")
-        except Exception as e:
-            print(f"⚠️  Redis cache not available: {e}")
-            self.redis_client = None
+            if not self._resolved and time.monotonic() >= self._retry_at:
+                try:
+                    client = get_redis()
+                    client.ping()
+                    self._redis_client = client
+                    self._resolved = True
+                    print("✅ Redis cache connected")
+                except Exception as e:
+                    self._retry_at = time.monotonic() + settings.REDIS_RETRY_SECONDS
+                    print(f"⚠️  Redis cache not available, retrying in {settings.REDIS_RETRY_SECONDS:g}s: {e}")
+        finally:
+            self._lock.release()
+        return self._redis_client
+    
+    def ping(self) -> bool:
+        """
+        Readiness check: True only if the services are using Redis and it
+        answers now. A process still on its in-process fallbacks isn't
+        ready - its debounce, task state and limits disagree with every
+        other process's.
+        """
+        client = self.redis_client
+        if client is None:
+            return False
+        try:
+            return bool(client.ping())
+        except Exception:
+            return False
     
     def get(self, key: str) -> Optional[Any]:
-        """Get value from cache."""
-        if not self.redis_client:
-            return None
+        """Get value from cache: this process's tier, then Redis."""
+        data = self.local.get(key)
+        self._count(key, "local", data is not None)
+        if data is None and self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.get(f"pullsense:{key}")
+                pipe.pttl(f"pullsense:{key}")
+                data, ttl_ms = pipe.execute()
+                if data is not None:
+                    data = decompress(data)
+                    if ttl_ms > 0:
+                        self.local.set(key, data, ttl_ms / 1000)
+            except Exception as e:
+                print(f"Cache get error: {e}")
+            self._count(key, "redis", data is not None)
         
+        if data is None:
+            return None
         try:
-            value = self.redis_client.get(f"pullsense:{key}")
-            if value:
-                return json.loads(value)
+            return decode(data)
         except Exception as e:
-            print(f"Cache get error: {e}")
-        return None
+            print(f"Cache decode error: {e}")
+            return None
     
     def set(self, key: str, value: Any, expire: int = 3600):
         """Set value in cache with expiration (default 1 hour)."""
+        data = encode(value)
+        self.local.set(key, data, expire)
         if not self.redis_client:
             return
         
         try:
-            self.redis_client.setex(
-                f"pullsense:{key}",
-                expire,
-                json.dumps(value)
-            )
+            self.redis_client.setex(f"pullsense:{key}", expire, compress(data))
         except Exception as e:
             print(f"Cache set error: {e}")
     
     def delete(self, key: str):
-        """Delete value from cache."""
+        """Delete value from cache (other processes' local tiers keep theirs until it expires)."""
+        self.local.delete(key)
         if not self.redis_client:
             return
         
@@ -51,6 +199,24 @@ class CacheService:
             self.redis_client.delete(f"pullsense:{key}")
         except Exception as e:
             print(f"Cache delete error: {e}")
+    
+    @staticmethod
+    def _count(key: str, tier: str, hit: bool):
+        from services.metrics import metrics  # metrics itself builds on this module
+        metrics.incr("cache_requests_total", cache=key.split(":", 1)[0], tier=tier, result="hit" if hit else "miss")
+
+class SharedRedis:
+    """
+    Class attribute for services: reads as `cache.redis_client`, resolved
+    on first use rather than when the service singleton is built.
+    Assigning `redis_client` on an instance still overrides it (tests use
+    None to exercise the in-process fallbacks).
+    """
+    
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return cache.redis_client
 
 # Singleton instance
 cache = CacheService()
\ No newline at end of file
@@ -0,0 +1,165 @@
+import asyncio
+import json
+from typing import Dict, Set, Iterable, Optional
+from fastapi import WebSocket
+from config import settings
+
+# Every client starts on "all"; narrower topics are "repo:<owner/name>" and "pr:<pr_id>"
+DEFAULT_TOPIC = "all"
+
+
+def topics_for(message: dict) -> Set[str]:
+    """Topics a dashboard message is published under."""
+    data = message.get("data") or {}
+    topics = {DEFAULT_TOPIC}
+    if data.get("repo"):
+        topics.add(f"repo:{data['repo']}")
+    if data.get("pr_id") is not None:
+        topics.add(f"pr:{data['pr_id']}")
+    return topics
+
+
+class Client:
+    """One WebSocket plus its bounded outbound queue and writer task."""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.topics: Set[str] = set()
+        self.dropped = 0
+        self.writer: Optional[asyncio.Task] = None
+
+
+class ConnectionManager:
+    """
+    Manages WebSocket connections for real-time updates.
+
+    `broadcast` never awaits a socket: it serializes once and drops the
+    frame into the queue of each client subscribed to one of the message's
+    topics. A per-client writer task drains the queue, so a slow client
+    only backs up its own queue. When a queue is full the slow-client
+    policy applies: "drop" discards that client's oldest pending frame,
+    "disconnect" closes the client.
+    """
+
+    def __init__(self, queue_size: int = None, slow_client_policy: str = None):
+        self.queue_size = queue_size or settings.WS_QUEUE_SIZE
+        self.slow_client_policy = slow_client_policy or settings.WS_SLOW_CLIENT_POLICY
+        self.clients: Dict[WebSocket, Client] = {}
+        self.subscriptions: Dict[str, Set[Client]] = {}
+        self.dropped = 0
+        self.slow_disconnects = 0
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket, accept: bool = True) -> Client:
+        if accept:
+            await websocket.accept()
+        client = Client(websocket, self.queue_size)
+        self.clients[websocket] = client
+        self.subscribe(websocket, [DEFAULT_TOPIC])
+        client.writer = asyncio.create_task(self._write(client))
+        print(f"📡 WebSocket connected. Total: {len(self.clients)}")
+        return client
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        self.unsubscribe(websocket, list(client.topics))
+        del self.clients[websocket]
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        print(f"📡 WebSocket disconnected. Total: {len(self.clients)}")
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        for topic in topics:
+            client.topics.add(topic)
+            self.subscriptions.setdefault(topic, set()).add(client)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]):
+        client = self.clients.get(websocket)
+        for topic in topics:
+            subscribers = self.subscriptions.get(topic)
+            if client is not None:
+                client.topics.discard(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(client)
+            if not subscribers:
+                del self.subscriptions[topic]
+
+    def send(self, websocket: WebSocket, message: dict):
+        """Queue a message for a single client (acks, replies)."""
+        client = self.clients.get(websocket)
+        if client is not None:
+            self._enqueue(client, json.dumps(message))
+
+    async def broadcast(self, message: dict):
+        """Queue message for every client subscribed to one of its topics."""
+        if not self.clients:
+            return
+
+        targets = set()
+        for topic in topics_for(message):
+            targets |= self.subscriptions.get(topic, set())
+        if not targets:
+            return
+
+        message_str = json.dumps(message)
+        for client in targets:
+            self._enqueue(client, message_str)
+
+    def _enqueue(self, client: Client, message_str: str):
+        try:
+            client.queue.put_nowait(message_str)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.slow_client_policy == "disconnect":
+            self.slow_disconnects += 1
+            print(f"🐢 Disconnecting slow WebSocket client ({client.queue.qsize()} frames behind)")
+            self.disconnect(client.websocket)
+            asyncio.ensure_future(self._close(client.websocket))
+            return
+
+        # Keep the newest state: drop the oldest pending frame
+        client.queue.get_nowait()
+        client.queue.put_nowait(message_str)
+        client.dropped += 1
+        self.dropped += 1
+
+    async def _write(self, client: Client):
+        try:
+            while True:
+                message_str = await client.queue.get()
+                await client.websocket.send_text(message_str)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Clean up disconnected clients
+            self.disconnect(client.websocket)
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.clients),
+            "topics": len(self.subscriptions),
+            "dropped_messages": self.dropped,
+            "slow_disconnects": self.slow_disconnects
+        }
+
+# Singleton instance
+manager = ConnectionManager()
@@ -0,0 +1,116 @@
+import re
+from typing import Optional, Dict, List, AsyncIterator, Iterable
+
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@")
+DIFF_HEADER = re.compile(r"^diff --git a/(.*) b/(.*)$")
+
+
+def _path(line: str) -> Optional[str]:
+    """Path from a `--- a/x` / `+++ b/x` line (None for /dev/null)."""
+    path = line[4:].rstrip("\t")
+    if path == "/dev/null":
+        return None
+    if path.startswith('"') and path.endswith('"'):
+        path = path[1:-1]
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+class DiffParser:
+    """
+    Incremental parser for `git diff` output (GitHub's .diff media type).
+
+    Feed it lines as they arrive; each time a file's section ends, feed()
+    returns that file in the same shape as the pull request files API
+    (filename, status, additions, deletions, changes, patch). Only hunk
+    text is buffered, and only up to `max_file_bytes` per file and
+    `max_total_bytes` for the whole diff - past either, the file keeps its
+    counts but loses (or truncates) its patch. Memory stays bounded however
+    many files the PR touches, while every file still shows up.
+    """
+
+    def __init__(self, max_file_bytes: int, max_total_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self.budget = max_total_bytes
+        self._file: Optional[Dict] = None
+        self._in_hunks = False
+        self._hunks: List[str] = []
+        self._size = 0
+
+    def feed(self, line: str) -> Optional[Dict]:
+        """Consume one line (without its newline). Returns a file once its section is complete."""
+        header = DIFF_HEADER.match(line)
+        if header:
+            finished = self._finish()
+            self._file = {"filename": header.group(2), "status": "modified",
+                          "additions": 0, "deletions": 0, "changes": 0}
+            return finished
+
+        file = self._file
+        if file is None:
+            return None
+
+        if self._in_hunks or HUNK_HEADER.match(line):
+            self._in_hunks = True
+            if line.startswith("+"):
+                file["additions"] += 1
+            elif line.startswith("-"):
+                file["deletions"] += 1
+            self._keep(line)
+        elif line.startswith("new file mode"):
+            file["status"] = "added"
+        elif line.startswith("deleted file mode"):
+            file["status"] = "removed"
+        elif line.startswith("rename from "):
+            file["status"] = "renamed"
+            file["previous_filename"] = line[len("rename from "):]
+        elif line.startswith("rename to "):
+            file["filename"] = line[len("rename to "):]
+        elif line.startswith("Binary files ") or line == "GIT binary patch":
+            file["binary"] = True
+        elif line.startswith("+++ "):
+            file["filename"] = _path(line) or file["filename"]
+        return None
+
+    def close(self) -> Optional[Dict]:
+        """End of input: the last file, if any."""
+        return self._finish()
+
+    def _keep(self, line: str):
+        if self._file.get("truncated"):
+            return
+        size = len(line) + 1
+        if self._size + size > self.max_file_bytes or size > self.budget:
+            self._file["truncated"] = True
+            return
+        self._hunks.append(line)
+        self._size += size
+        self.budget -= size
+
+    def _finish(self) -> Optional[Dict]:
+        file = self._file
+        if file is None:
+            return None
+        file["changes"] = file["additions"] + file["deletions"]
+        file["patch"] = "\n".join(self._hunks) if self._hunks else None
+        self._file, self._in_hunks, self._hunks, self._size = None, False, [], 0
+        return file
+
+
+def parse(lines: Iterable[str], max_file_bytes: int, max_total_bytes: int) -> List[Dict]:
+    """Parse a whole diff (tests, small inputs)."""
+    parser = DiffParser(max_file_bytes, max_total_bytes)
+    files = [file for file in map(parser.feed, lines) if file]
+    last = parser.close()
+    return files + [last] if last else files
+
+
+async def parse_stream(lines: AsyncIterator[str], max_file_bytes: int, max_total_bytes: int) -> AsyncIterator[Dict]:
+    """Yield files from a streamed diff (e.g. httpx's aiter_lines) as each one completes."""
+    parser = DiffParser(max_file_bytes, max_total_bytes)
+    async for line in lines:
+        file = parser.feed(line.rstrip("\r\n"))
+        if file:
+            yield file
+    last = parser.close()
+    if last:
+        yield last
@@ -0,0 +1,123 @@
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Optional, List, Dict, Tuple
+from config import settings
+from services.cache_service import SharedRedis
+
+
+class EventLog:
+    """
+    Bounded log of webhook event summaries.
+    
+    Backed by a capped Redis stream so every API process sees the same
+    history; falls back to an in-process ring buffer when Redis is down.
+    Only compact summaries are kept - the full payload stays in the
+    payload store and is referenced by `payload_hash`.
+    """
+    
+    STREAM_KEY = "pullsense:webhook_events"
+    TOTAL_KEY = "pullsense:webhook_events:total"
+    redis_client = SharedRedis()
+    
+    def __init__(self, maxlen: int = settings.WEBHOOK_LOG_MAXLEN):
+        self.maxlen = maxlen
+        
+        # Fallback storage
+        self._local = deque(maxlen=maxlen)
+        self._local_total = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def summarize(event_type: str, payload: dict, delivery_id: Optional[str] = None,
+                  pr_id: Optional[int] = None, payload_hash: Optional[str] = None) -> Dict:
+        """Reduce a webhook payload to the handful of fields we display."""
+        pr = payload.get("pull_request") or {}
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "event_type": event_type,
+            "action": payload.get("action"),
+            "delivery_id": delivery_id,
+            "repo": (payload.get("repository") or {}).get("full_name"),
+            "sender": (payload.get("sender") or {}).get("login"),
+            "pr_number": pr.get("number"),
+            "title": pr.get("title"),
+            "head_sha": (pr.get("head") or {}).get("sha"),
+            "pr_id": pr_id,
+            "payload_hash": payload_hash
+        }
+    
+    def append(self, summary: Dict) -> str:
+        """Record an event summary and return its id. Blocking."""
+        if self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline()
+                pipe.xadd(
+                    self.STREAM_KEY,
+                    {"data": json.dumps(summary)},
+                    maxlen=self.maxlen,
+                    approximate=True
+                )
+                pipe.incr(self.TOTAL_KEY)
+                event_id, _ = pipe.execute()
+                return event_id.decode()
+            except Exception as e:
+                print(f"Event log append error: {e}")
+        
+        with self._lock:
+            self._local_total += 1
+            event_id = str(self._local_total)
+            self._local.append((self._local_total, {"id": event_id, **summary}))
+            return event_id
+    
+    def total(self) -> int:
+        """Number of events received since the log was created (not just retained)."""
+        if self.redis_client:
+            try:
+                return int(self.redis_client.get(self.TOTAL_KEY) or 0)
+            except Exception as e:
+                print(f"Event log total error: {e}")
+        return self._local_total
+    
+    def page(self, limit: int = 10, before: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Newest-first page of events older than `before`.
+        
+        Returns (events, next_cursor); next_cursor is None on the last page.
+        """
+        if self.redis_client:
+            try:
+                entries = self.redis_client.xrevrange(
+                    self.STREAM_KEY,
+                    max=f"({before}" if before else "+",
+                    min="-",
+                    count=limit
+                )
+                events = [
+                    {"id": entry_id.decode(), **json.loads(fields[b"data"])}
+                    for entry_id, fields in entries
+                ]
+                return events, self._next_cursor(events, limit)
+            except Exception as e:
+                print(f"Event log read error: {e}")
+        
+        with self._lock:
+            snapshot = list(self._local)
+        
+        cutoff = int(before) if before and before.isdigit() else None
+        events = []
+        for seq, event in reversed(snapshot):
+            if cutoff is not None and seq >= cutoff:
+                continue
+            events.append(event)
+            if len(events) == limit:
+                break
+        return events, self._next_cursor(events, limit)
+    
+    @staticmethod
+    def _next_cursor(events: List[Dict], limit: int) -> Optional[str]:
+        return events[-1]["id"] if len(events) == limit else None
+
+# Singleton instance
+event_log = EventLog()
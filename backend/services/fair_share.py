@@ -0,0 +1,90 @@
+import time
+from functools import cached_property
+from typing import Optional
+from config import settings
+from services.cache_service import SharedRedis
+from services.rate_limiter import backoff_seconds
+
+# Drop expired leases, then take one if the repo is under its limit.
+# KEYS[1] = lease set, ARGV = lease id, now, expires_at, limit
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+    return 1
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3]) - tonumber(ARGV[2])))
+return 1
+"""
+
+
+class RepoFairShare:
+    """
+    Caps how many analyses one repository can have running at once.
+    
+    A job takes a lease (a member of the repo's sorted set, scored by
+    expiry) before it fetches anything and gives it back when its review
+    is saved or dropped. A job over the limit is requeued with a growing,
+    jittered delay (retry_in), so a monorepo opening 200 bot PRs occupies
+    at most REPO_MAX_CONCURRENT_ANALYSES slots and other repos keep moving;
+    after FAIR_SHARE_MAX_RETRIES it gives up instead of bouncing forever.
+    Leases expire on their own if a worker dies mid-job.
+    """
+    
+    redis_client = SharedRedis()
+    
+    def __init__(self):
+        self.limit = settings.REPO_MAX_CONCURRENT_ANALYSES
+        self.lease_seconds = settings.FAIR_SHARE_LEASE_SECONDS
+        self.max_retries = settings.FAIR_SHARE_MAX_RETRIES
+    
+    @cached_property
+    def _acquire(self):
+        return self.redis_client.register_script(ACQUIRE_SCRIPT)
+    
+    def _key(self, repo_name: str) -> str:
+        return f"pullsense:fair_share:{repo_name}"
+    
+    def acquire(self, repo_name: Optional[str], lease_id: Optional[str]) -> bool:
+        """Take (or renew) a slot for this job. True if it may run now."""
+        if not self.redis_client or not repo_name or not lease_id or self.limit <= 0:
+            return True
+        
+        now = time.time()
+        try:
+            return bool(self._acquire(
+                keys=[self._key(repo_name)],
+                args=[lease_id, now, now + self.lease_seconds, self.limit]
+            ))
+        except Exception as e:
+            print(f"Fair share error: {e}")
+            return True
+    
+    def retry_in(self, waits: int) -> Optional[float]:
+        """Seconds before a denied job tries again, after `waits` earlier denials; None once it should give up."""
+        if waits >= self.max_retries:
+            return None
+        return backoff_seconds(waits, base=settings.FAIR_SHARE_RETRY_SECONDS,
+                               cap=settings.FAIR_SHARE_RETRY_MAX_SECONDS)
+    
+    def release(self, repo_name: Optional[str], lease_id: Optional[str]):
+        if not self.redis_client or not repo_name or not lease_id:
+            return
+        try:
+            self.redis_client.zrem(self._key(repo_name), lease_id)
+        except Exception as e:
+            print(f"Fair share error: {e}")
+    
+    def running(self, repo_name: str) -> int:
+        if not self.redis_client:
+            return 0
+        key = self._key(repo_name)
+        self.redis_client.zremrangebyscore(key, "-inf", time.time())
+        return self.redis_client.zcard(key)
+
+# Singleton instance
+fair_share = RepoFairShare()
@@ -0,0 +1,363 @@
+import asyncio
+import math
+import os
+from contextlib import aclosing
+from typing import Optional, Dict, List, Tuple, AsyncIterator
+import httpx
+from config import settings
+from services.cache_service import cache
+from services.rate_limiter import rate_limiter, RateLimited
+from services.metrics import metrics
+from services.diff_parser import parse_stream
+
+# GitHub returns at most 100 files per page and 3000 files per PR
+FILES_PER_PAGE = 100
+MAX_FILE_PAGES = 30
+# ...and at most 300 files from the compare API (the rest are cut off)
+MAX_COMPARE_FILES = 300
+# Transient server errors retried, as GitHubService's PyGithub client does
+RETRY_STATUSES = (502, 503, 504)
+RETRY_ATTEMPTS = 3
+# Response headers kept with a stored copy and replayed on a 304
+STORED_HEADERS = ("etag", "last-modified", "link")
+
+
+class AsyncGitHubClient:
+    """
+    Non-blocking GitHub REST client behind GitHubService.get_pr_diff and
+    async_worker.py.
+    
+    One keep-alive httpx.AsyncClient per instance, speaking HTTP/2 where
+    the server offers it, so requests share a warm connection instead of a
+    TCP/TLS handshake each. The PR and its full diff (the .diff media type)
+    are requested together, and the diff is parsed into per-file hunks as
+    it streams in (services/diff_parser.py), so every changed file is seen
+    while only a bounded amount of patch text is kept. Diffs GitHub won't
+    render come from the files API instead, its pages requested
+    concurrently. Parsed diffs are cached per head SHA.
+    
+    Every GET is conditional once a resource has been seen: its ETag /
+    Last-Modified and body are kept in the shared cache, and a 304 (which
+    GitHub doesn't charge to the rate limit) is answered from that copy.
+    """
+    
+    def __init__(self, max_connections: int = None):
+        self.github_token = os.getenv("GITHUB_TOKEN")
+        self.max_connections = max_connections or settings.ASYNC_WORKER_CONCURRENCY
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            headers = {"Accept": "application/vnd.github+json"}
+            if self.github_token:
+                headers["Authorization"] = f"token {self.github_token}"
+            self._client = httpx.AsyncClient(
+                base_url=settings.GITHUB_API_URL,
+                headers=headers,
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            )
+        return self._client
+    
+    async def get_pr_diff(self, repo_full_name: str, pr_number: int,
+                          head_sha: Optional[str] = None) -> Optional[Dict]:
+        """
+        Fetch pull request details and changed files.
+        
+        Results are cached per head commit, so pass the `head_sha` the
+        caller expects (from the webhook) to be served from the cache;
+        without it GitHub is asked and the answer cached for next time.
+        
+        Returns:
+            Dict with PR details and file changes, or None on an API error
+        
+        Raises:
+            RateLimited if the shared GitHub budget is exhausted
+        """
+        if head_sha:
+            with metrics.stage("cache_lookup"):
+                cached_data = await asyncio.to_thread(cache.get, self._diff_key(repo_full_name, pr_number, head_sha))
+            if cached_data:
+                return cached_data
+        
+        with metrics.stage("rate_limit_wait"):
+            await rate_limiter.acquire_async("github", cost=2)  # pull, diff
+        try:
+            with metrics.stage("github_api"):
+                pull_path = f"/repos/{repo_full_name}/pulls/{pr_number}"
+                pr_response, files = await asyncio.gather(
+                    self._get(pull_path, endpoint="pull"),
+                    self._diff_files(pull_path)
+                )
+                pr = (await self._checked(pr_response)).json()
+            
+            diff_data = self._diff_data(pr, files)
+            # Keyed by the commit GitHub actually described, which may be newer than `head_sha`
+            actual_sha = (pr.get("head") or {}).get("sha")
+            if actual_sha:
+                await asyncio.to_thread(cache.set, self._diff_key(repo_full_name, pr_number, actual_sha),
+                                        diff_data, settings.GITHUB_DIFF_CACHE_TTL_SECONDS)
+            return diff_data
+        
+        except RateLimited:
+            raise
+        except Exception as e:
+            print(f"❌ GitHub API error: {e}")
+            return None
+    
+    async def get_pr_changes(self, repo_full_name: str, pr_number: int,
+                             base_sha: str, head_sha: str) -> Optional[Dict]:
+        """
+        Pull request details with only the files changed between two of its
+        commits (the compare API), for re-reviewing just a new push.
+        
+        Returns:
+            Dict shaped like get_pr_diff's plus base_sha / head_sha, or None
+            when base_sha..head_sha isn't a plain fast-forward (force push,
+            rebase), is too large to compare, or on an API error - the
+            caller then reviews the whole diff
+        
+        Raises:
+            RateLimited if the shared GitHub budget is exhausted
+        """
+        cache_key = f"github_changes:{repo_full_name}:{base_sha}...{head_sha}"
+        with metrics.stage("cache_lookup"):
+            cached_data = await asyncio.to_thread(cache.get, cache_key)
+        if cached_data:
+            return cached_data
+        
+        with metrics.stage("rate_limit_wait"):
+            await rate_limiter.acquire_async("github", cost=2)  # pull, compare
+        try:
+            with metrics.stage("github_api"):
+                pr_response, compare_response = await asyncio.gather(
+                    self._get(f"/repos/{repo_full_name}/pulls/{pr_number}", endpoint="pull"),
+                    self._get(f"/repos/{repo_full_name}/compare/{base_sha}...{head_sha}", endpoint="compare")
+                )
+                pr = (await self._checked(pr_response)).json()
+                compare = (await self._checked(compare_response)).json()
+            
+            changed = compare.get("files") or []
+            if compare.get("status") != "ahead" or len(changed) >= MAX_COMPARE_FILES:
+                print(f"↪️  {repo_full_name}#{pr_number}: {base_sha[:7]}...{head_sha[:7]} is "
+                      f"{compare.get('status')} with {len(changed)} files, reviewing the whole diff")
+                return None
+            
+            files, budget = [], settings.GITHUB_DIFF_MAX_BYTES
+            for file in changed:
+                entry, budget = self._file_entry(file, budget)
+                files.append(entry)
+            diff_data = {**self._diff_data(pr, files), "base_sha": base_sha, "head_sha": head_sha}
+            
+            # Two fixed commits: the changes can't go stale
+            await asyncio.to_thread(cache.set, cache_key, diff_data, settings.GITHUB_DIFF_CACHE_TTL_SECONDS)
+            return diff_data
+        
+        except RateLimited:
+            raise
+        except Exception as e:
+            print(f"❌ GitHub API error: {e}")
+            return None
+    
+    @staticmethod
+    def _diff_key(repo_full_name: str, pr_number: int, head_sha: str) -> str:
+        return f"github_diff:{repo_full_name}:{pr_number}:{head_sha}"
+    
+    @staticmethod
+    def _diff_data(pr: Dict, files: List[Dict]) -> Dict:
+        return {
+            "title": pr.get("title"),
+            "body": pr.get("body"),
+            "state": pr.get("state"),
+            "additions": pr.get("additions"),
+            "deletions": pr.get("deletions"),
+            "changed_files": pr.get("changed_files"),
+            "mergeable": pr.get("mergeable"),
+            "files": files
+        }
+    
+    async def _diff_files(self, pull_path: str) -> List[Dict]:
+        """
+        Every changed file, parsed from the streamed .diff as it arrives
+        (conditional, like _get). Falls back to the paginated files API
+        when GitHub won't render the diff (406: too many files or lines).
+        """
+        key = self._validators_key(pull_path, {"media": "diff"})
+        stored = await asyncio.to_thread(cache.get, key)
+        headers = {"Accept": "application/vnd.github.diff"}
+        if stored:
+            headers["If-None-Match"] = stored["etag"]
+        
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            async with self.client.stream("GET", pull_path, headers=headers) as response:
+                if response.status_code in RETRY_STATUSES and attempt < RETRY_ATTEMPTS:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                    continue
+                if response.status_code == 304 and stored:
+                    metrics.incr("github_requests_total", endpoint="diff", result="not_modified")
+                    return stored["files"]
+                if response.status_code == 406:
+                    metrics.incr("github_requests_total", endpoint="diff", result="too_large")
+                    break
+                metrics.incr("github_requests_total", endpoint="diff",
+                             result="fetched" if response.status_code == 200 else "error")
+                if self._rate_limited(response):
+                    raise await asyncio.to_thread(rate_limiter.exceeded, "github", response.headers)
+                response.raise_for_status()
+                files = [
+                    file async for file in parse_stream(
+                        response.aiter_lines(), settings.GITHUB_DIFF_MAX_FILE_BYTES, settings.GITHUB_DIFF_MAX_BYTES
+                    )
+                ]
+            if response.headers.get("etag"):
+                await asyncio.to_thread(cache.set, key, {"etag": response.headers["etag"], "files": files},
+                                        settings.GITHUB_VALIDATORS_TTL_SECONDS)
+            return files
+        
+        return await self._listed_files(f"{pull_path}/files")
+    
+    async def _listed_files(self, files_path: str) -> List[Dict]:
+        """The files API's view of the diff (patches missing for very large files), within the same byte budgets."""
+        await rate_limiter.acquire_async("github")
+        first_page = await self._checked(
+            await self._get(files_path, endpoint="files", per_page=FILES_PER_PAGE, page=1)
+        )
+        files, budget = [], settings.GITHUB_DIFF_MAX_BYTES
+        async with aclosing(self._file_pages(files_path, first_page, None)) as pages:
+            async for page in pages:
+                for file in page:
+                    entry, budget = self._file_entry(file, budget)
+                    files.append(entry)
+        return files
+    
+    @staticmethod
+    def _file_entry(file: Dict, budget: int) -> Tuple[Dict, int]:
+        """A files-API file in diff_data's shape, its patch dropped past the byte budgets; and the budget left."""
+        patch = file.get("patch")
+        if patch and (len(patch) > settings.GITHUB_DIFF_MAX_FILE_BYTES or len(patch) > budget):
+            patch = None
+        entry = {
+            "filename": file["filename"],
+            "status": file["status"],
+            "additions": file["additions"],
+            "deletions": file["deletions"],
+            "changes": file["changes"],
+            "patch": patch
+        }
+        if file.get("previous_filename"):
+            entry["previous_filename"] = file["previous_filename"]
+        if file.get("patch") and patch is None:
+            entry["truncated"] = True
+        return entry, budget - len(patch or "")
+    
+    async def _file_pages(self, files_path: str, first_page: httpx.Response,
+                          changed_files: Optional[int]) -> AsyncIterator[List[Dict]]:
+        """
+        Yield the PR's files a page at a time, in order. Pages after the
+        first are requested concurrently; closing the generator early
+        cancels the ones not yet needed.
+        """
+        yield first_page.json()
+        
+        last = self._last_page(first_page, changed_files)
+        if last <= 1:
+            return
+        await rate_limiter.acquire_async("github", cost=last - 1)
+        requests = [
+            asyncio.create_task(self._get(files_path, endpoint="files", per_page=FILES_PER_PAGE, page=page))
+            for page in range(2, last + 1)
+        ]
+        try:
+            for request in requests:
+                yield (await self._checked(await request)).json()
+        finally:
+            for request in requests:
+                request.cancel()
+    
+    @staticmethod
+    def _last_page(first_page: httpx.Response, changed_files: Optional[int]) -> int:
+        """Page count from the Link header (falling back to the PR's changed_files)."""
+        links = first_page.links
+        if "next" not in links:
+            return 1
+        try:
+            last = int(httpx.URL(links.get("last", {}).get("url", "")).params.get("page", 0))
+        except ValueError:
+            last = 0
+        last = last or math.ceil((changed_files or 0) / FILES_PER_PAGE)
+        return max(2, min(last, MAX_FILE_PAGES))
+    
+    async def _get(self, path: str, endpoint: str, **params) -> httpx.Response:
+        """
+        Conditional GET, retrying transient server errors with exponential
+        backoff. A 304 comes back as a 200 carrying the stored body.
+        """
+        key = self._validators_key(path, params)
+        stored = await asyncio.to_thread(cache.get, key)
+        headers = {}
+        if stored:
+            if stored["headers"].get("etag"):
+                headers["If-None-Match"] = stored["headers"]["etag"]
+            if stored["headers"].get("last-modified"):
+                headers["If-Modified-Since"] = stored["headers"]["last-modified"]
+        
+        for attempt in range(RETRY_ATTEMPTS + 1):
+            response = await self.client.get(path, params=params or None, headers=headers)
+            if response.status_code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS:
+                break
+            await asyncio.sleep(0.5 * 2 ** attempt)
+        
+        if response.status_code == 304 and stored:
+            metrics.incr("github_requests_total", endpoint=endpoint, result="not_modified")
+            # The 304's own headers carry the current rate-limit numbers
+            budget = {name: value for name, value in response.headers.items() if name.startswith("x-ratelimit-")}
+            return httpx.Response(
+                200,
+                headers={**stored["headers"], **budget},
+                content=stored["body"].encode(),
+                request=response.request
+            )
+        
+        metrics.incr("github_requests_total", endpoint=endpoint,
+                     result="fetched" if response.status_code == 200 else "error")
+        if response.status_code == 200 and ("etag" in response.headers or "last-modified" in response.headers):
+            await asyncio.to_thread(cache.set, key, {
+                "headers": {name: response.headers[name] for name in STORED_HEADERS if name in response.headers},
+                "body": response.text
+            }, settings.GITHUB_VALIDATORS_TTL_SECONDS)
+        return response
+    
+    @staticmethod
+    def _validators_key(path: str, params: Dict) -> str:
+        query = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        return f"github_validators:{path}?{query}"
+    
+    async def _checked(self, response: httpx.Response) -> httpx.Response:
+        """Raise RateLimited / HTTPStatusError for a failed response; feed its budget headers back."""
+        if self._rate_limited(response):
+            raise await asyncio.to_thread(rate_limiter.exceeded, "github", response.headers)
+        response.raise_for_status()
+        await asyncio.to_thread(rate_limiter.observe, "github", response.headers)
+        return response
+    
+    @staticmethod
+    def _rate_limited(response: httpx.Response) -> bool:
+        # Primary limit: 403 with nothing remaining; secondary limits: 429 or 403 + Retry-After
+        if response.status_code == 429:
+            return True
+        return response.status_code == 403 and (
+            response.headers.get("x-ratelimit-remaining") == "0" or "retry-after" in response.headers
+        )
+    
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+# Singleton instance
+github_async = AsyncGitHubClient()
@@ -1,96 +1,102 @@
-from services.cache_service import cache
-from github import Github
+from services.github_async import AsyncGitHubClient
+from services.rate_limiter import rate_limiter
+from urllib3.util.retry import Retry
 from typing import Optional, Dict
+import asyncio
 import os
+import threading
 from config import settings
 
+# Retry transient server errors only; rate limits go through rate_limiter
+# rather than PyGithub sleeping inside the worker until the reset time
+RETRY = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+              respect_retry_after_header=False)
+
 
 class GitHubService:
     """
     Service for interacting with GitHub API.
     Fetches real PR data, code diffs, and file contents.
+    
+    Diffs come from AsyncGitHubClient; the PyGithub `client` remains for
+    one-off calls.
     """
     
     def __init__(self):
         # Use token if available, otherwise anonymous (limited rate)
         self.github_token = os.getenv("GITHUB_TOKEN")
-        if self.github_token:
-            self.client = Github(self.github_token)
-            print("✅ GitHub client initialized with token")
-        else:
-            self.client = Github()
-            print("⚠️  GitHub client initialized without token (rate limited)")
+        self._client = None
+        self._async: Optional[AsyncGitHubClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_pid = None
+        self._lock = threading.Lock()
     
-    def get_pr_diff(self, repo_full_name: str, pr_number: int) -> Optional[Dict]:
+    @property
+    def client(self):
+        """PyGithub client, created on first use (importing PyGithub slows startup)."""
+        if self._client is None:
+            from github import Github
+            if self.github_token:
+                self._client = Github(self.github_token, base_url=settings.GITHUB_API_URL, retry=RETRY)
+                print("✅ GitHub client initialized with token")
+            else:
+                self._client = Github(base_url=settings.GITHUB_API_URL, retry=RETRY)
+                print("⚠️  GitHub client initialized without token (rate limited)")
+        return self._client
+    
+    def get_pr_diff(self, repo_full_name: str, pr_number: int, head_sha: Optional[str] = None) -> Optional[Dict]:
         """
         Fetch pull request details and diff from GitHub.
         
+        Blocking wrapper around AsyncGitHubClient.get_pr_diff (PR and its
+        diff fetched concurrently over one pooled HTTP/2 connection, cached
+        per `head_sha`), run on this process's GitHub event loop.
+        
         Returns:
             Dict with PR details and file changes
+        
+        Raises:
+            RateLimited if the shared GitHub budget is exhausted
+        """
+        return self._run("get_pr_diff", repo_full_name, pr_number, head_sha)
+    
+    def get_pr_changes(self, repo_full_name: str, pr_number: int,
+                       base_sha: str, head_sha: str) -> Optional[Dict]:
         """
-          # Check cache first
-        cache_key = f"github_diff:{repo_full_name}:{pr_number}"
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            print(f"📦 Using cached GitHub data for {repo_full_name} PR #{pr_number}")
-            return cached_data
+        PR details and only the files changed between base_sha and head_sha
+        (blocking wrapper around AsyncGitHubClient.get_pr_changes).
         
-        try:
-            # Get repository
-            repo = self.client.get_repo(repo_full_name)
-            
-            # Get pull request
-            pr = repo.get_pull(pr_number)
-            
-            # Get files changed
-            files = pr.get_files()
-            
-            # Build diff data
-            diff_data = {
-                "title": pr.title,
-                "body": pr.body,
-                "state": pr.state,
-                "additions": pr.additions,
-                "deletions": pr.deletions,
-                "changed_files": pr.changed_files,
-                "mergeable": pr.mergeable,
-                "files": []
-            }
-            
-            # Get individual file diffs (limit to prevent huge responses)
-            for file in files[:10]:  # Max 10 files
-                diff_data["files"].append({
-                    "filename": file.filename,
-                    "status": file.status,  # added, removed, modified
-                    "additions": file.additions,
-                    "deletions": file.deletions,
-                    "changes": file.changes,
-                    "patch": file.patch if file.patch else "Binary file or too large"
-                })
-                
-            if diff_data:
-                cache.set(cache_key, diff_data, expire=3600)  # Cache for 1 hour
-                print(f"💾 Cached GitHub data for {repo_full_name} PR #{pr_number}")
-            
-            
-                return diff_data
-
-            
-        except Exception as e:
-            print(f"❌ GitHub API error: {e}")
-            return None
+        Returns:
+            Dict like get_pr_diff's plus base_sha / head_sha, or None when
+            the whole diff should be reviewed instead
+        
+        Raises:
+            RateLimited if the shared GitHub budget is exhausted
+        """
+        return self._run("get_pr_changes", repo_full_name, pr_number, base_sha, head_sha)
+    
+    def _run(self, method: str, *args):
+        """Run an AsyncGitHubClient method on this process's GitHub loop and wait for it."""
+        loop = self._event_loop()  # (re)creates self._async
+        # run_coroutine_threadsafe carries our context over, so stage
+        # timings still land in the calling job's metrics.job()
+        future = asyncio.run_coroutine_threadsafe(getattr(self._async, method)(*args), loop)
+        return future.result()
+    
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        """A loop on a daemon thread, started on first use (and again in a forked worker)."""
+        if self._loop_pid != os.getpid():
+            with self._lock:
+                if self._loop_pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="github-io", daemon=True).start()
+                    self._async = AsyncGitHubClient(max_connections=settings.GITHUB_MAX_CONNECTIONS)
+                    self._loop, self._loop_pid = loop, os.getpid()
+        return self._loop
     
     def get_rate_limit(self) -> Dict:
-        """Check GitHub API rate limit status."""
-        try:
-            rate_limit = self.client.get_rate_limit()
-            return {
-                "limit": rate_limit.core.limit,
-                "remaining": rate_limit.core.remaining,
-                "reset": rate_limit.core.reset.isoformat()
-            }
-        except Exception as e:
-            return {"error": str(e)}
+        """GitHub API budget shared by all workers, as of the last response (no API call)."""
+        return rate_limiter.budget("github")
 
 # Singleton instance
 github_service = GitHubService()
\ No newline at end of file
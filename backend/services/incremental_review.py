@@ -0,0 +1,92 @@
+import re
+from typing import Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from config import settings
+from database import CodeReview, PullRequest
+from services.ai_analyzer import ANALYZER_VERSION
+
+# The per-file sections the analyzer asks for: "### File: path"
+FILE_HEADING = re.compile(r"^#{2,4}\s*File:\s*`?([^`\n]+?)`?\s*$", re.MULTILINE)
+
+
+def split_findings(analysis: str) -> Tuple[str, Dict[str, str]]:
+    """A review's overview and its per-file sections as {filename: notes}."""
+    analysis = analysis or ""
+    headings = list(FILE_HEADING.finditer(analysis))
+    if not headings:
+        return analysis.strip(), {}
+
+    findings = {}
+    for heading, following in zip(headings, headings[1:] + [None]):
+        notes = analysis[heading.end():following.start() if following else len(analysis)].strip()
+        if notes:
+            findings[heading.group(1).strip()] = notes
+    return analysis[:headings[0].start()].strip(), findings
+
+
+def render(overview: str, findings: Dict[str, str]) -> str:
+    """The inverse of split_findings: overview, then one section per file."""
+    sections = [overview] + [f"### File: {path}\n{notes}" for path, notes in sorted(findings.items())]
+    return "\n\n".join(section for section in sections if section)
+
+
+class IncrementalReview:
+    """
+    Re-reviews only what a push changed.
+
+    Reviews made with the code in the prompt keep their per-file sections
+    in CodeReview.file_findings. When the PR's head moves on, the next job
+    asks GitHub for the changes between that review's head_sha and the new
+    one (GitHubService.get_pr_changes) and sends only those files to the
+    LLM; review_fields() then adds the earlier notes on files the push
+    didn't touch, so every stored review still covers the whole PR.
+    """
+
+    def base_review(self, db: Session, pr: PullRequest) -> Optional[CodeReview]:
+        """The newest review of an earlier commit that this PR's next analysis can build on."""
+        if not settings.INCREMENTAL_ANALYSIS or not pr.head_sha:
+            return None
+        return db.query(CodeReview)\
+            .filter(
+                CodeReview.pull_request_id == pr.id,
+                CodeReview.analyzer_version == ANALYZER_VERSION,
+                CodeReview.analysis_status == "completed",
+                CodeReview.file_findings.isnot(None),
+                CodeReview.head_sha.isnot(None),
+                CodeReview.head_sha != pr.head_sha
+            )\
+            .order_by(CodeReview.created_at.desc(), CodeReview.id.desc())\
+            .first()
+
+    def review_fields(self, db: Session, context: Dict) -> Dict:
+        """analysis_text, file_findings and base_sha for the CodeReview of a finished analysis."""
+        result = context["result"]
+        analysis = result.get("analysis", "No analysis generated")
+        if result.get("status") != "completed":
+            return {"analysis_text": analysis}
+
+        diff_data = context.get("diff_data") or {}
+        base = None
+        if diff_data.get("base_sha") and context.get("base_review_id"):
+            base = db.get(CodeReview, context["base_review_id"])
+        if base is None:
+            if not result.get("used_real_diff"):
+                return {"analysis_text": analysis}
+            return {"analysis_text": analysis, "file_findings": split_findings(analysis)[1]}
+
+        overview, findings = split_findings(analysis)
+        touched = {file["filename"] for file in diff_data["files"]} |\
+            {file["previous_filename"] for file in diff_data["files"] if file.get("previous_filename")}
+        carried = {path: notes for path, notes in (base.file_findings or {}).items() if path not in touched}
+        findings = {**carried, **findings}
+
+        note = (f"_Incremental review: {len(diff_data['files'])} files changed since "
+                f"{base.head_sha[:7]}; notes on {len(carried)} other files are from review {base.id}._")
+        return {
+            "analysis_text": render(f"{note}\n\n{overview}", findings),
+            "file_findings": findings,
+            "base_sha": base.head_sha
+        }
+
+# Singleton instance
+incremental_review = IncrementalReview()
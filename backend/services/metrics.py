@@ -0,0 +1,233 @@
+import atexit
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+from config import settings
+from services.cache_service import SharedRedis
+
+# Upper bounds (seconds) for queue waits and whole jobs
+BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, math.inf)
+# Stages and HTTP handlers, down to cache lookups
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, math.inf)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, math.inf)
+
+# Everything /metrics exports: name -> (type, help, buckets)
+REGISTRY = {
+    "queue_wait_seconds": ("histogram", "Time from a job becoming due to a worker picking it up", BUCKETS),
+    "analysis_seconds": ("histogram", "Whole analysis, first stage start to review saved", BUCKETS),
+    "stage_seconds": ("histogram", "Duration of one analysis stage", LATENCY_BUCKETS),
+    "http_request_seconds": ("histogram", "API request handling time", LATENCY_BUCKETS),
+    "llm_tokens": ("histogram", "Tokens per completion request", TOKEN_BUCKETS),
+    "cache_requests_total": ("counter", "Cache lookups by result (hit/miss)", None),
+    "github_requests_total": ("counter", "GitHub API requests by endpoint and result (fetched/not_modified/error)", None),
+}
+
+# Stage timings of the job running in this thread / asyncio task
+_job_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("job_timings", default=None)
+
+
+def _bucket_field(bound: float) -> str:
+    return "le:+Inf" if bound == math.inf else f"le:{bound:g}"
+
+
+def _buckets(name: str):
+    entry = REGISTRY.get(name)
+    return entry[2] if entry and entry[2] else BUCKETS
+
+
+def _prometheus_labels(series: str, extra: str = "") -> str:
+    labels = []
+    for pair in filter(None, series.split(",")):
+        key, _, value = pair.partition("=")
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        labels.append(f'{key}="{value}"')
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metrics:
+    """
+    Histograms and counters shared by the API and every worker.
+    
+    Each series (a name plus labels, e.g. queue_wait_seconds with
+    priority=manual) is one Redis hash holding count, sum and a counter
+    per bucket, so readers get fleet-wide numbers. Falls back to
+    per-process memory without Redis.
+    
+    Recording never does I/O: observe() and incr() add to an in-process
+    buffer, and a background thread flushes it to Redis every
+    METRICS_FLUSH_SECONDS as one pipeline of HINCRBYs. That keeps them safe
+    on an asyncio loop and on hot paths like a local cache hit. The buffer
+    holds one entry per series, so it stays small whatever the traffic.
+    Readers flush this process's buffer first.
+    """
+    
+    PREFIX = "pullsense:metrics:"
+    redis_client = SharedRedis()
+    
+    def __init__(self, flush_seconds: float = None):
+        self.flush_seconds = flush_seconds or settings.METRICS_FLUSH_SECONDS
+        self._local: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._pending: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+    
+    @staticmethod
+    def _series(labels: Dict[str, Any]) -> str:
+        return ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    
+    def _record(self, name: str, series: str, fields: Dict[str, float]):
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+        with self._lock:
+            self._add(self._pending, name, series, fields)
+    
+    @staticmethod
+    def _add(target: Dict, name: str, series: str, fields: Dict[str, float]):
+        data = target.setdefault(name, {}).setdefault(series, {})
+        for field, amount in fields.items():
+            data[field] = data.get(field, 0) + amount
+    
+    def _start_flusher(self):
+        """One flush thread per process (again in a forked Celery child)."""
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            if self._flusher_pid is not None:
+                self._pending = {}  # inherited from the parent, which flushes it itself
+            else:
+                atexit.register(self.flush)
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True).start()
+    
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+    
+    def flush(self):
+        """Write this process's buffered observations to Redis (or the in-process fallback)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        if self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for name, series_fields in pending.items():
+                    for series, fields in series_fields.items():
+                        key = f"{self.PREFIX}{name}:{series}"
+                        pipe.sadd(f"{self.PREFIX}{name}:series", series)
+                        for field, amount in fields.items():
+                            if isinstance(amount, float):
+                                pipe.hincrbyfloat(key, field, amount)
+                            else:
+                                pipe.hincrby(key, field, amount)
+                pipe.execute()
+                return
+            except Exception as e:
+                print(f"Metrics error: {e}")
+        
+        with self._lock:
+            for name, series_fields in pending.items():
+                for series, fields in series_fields.items():
+                    self._add(self._local, name, series, fields)
+    
+    def observe(self, name: str, value: float, **labels):
+        """Record one observation. Never raises - metrics must not break a job."""
+        bound = next(b for b in _buckets(name) if value <= b)
+        self._record(name, self._series(labels), {"count": 1, "sum": float(value), _bucket_field(bound): 1})
+    
+    def incr(self, name: str, amount: int = 1, **labels):
+        """Bump a counter, e.g. cache_requests_total with result=hit. Never raises."""
+        self._record(name, self._series(labels), {"value": amount})
+    
+    @contextmanager
+    def job(self, timings: Dict[str, float]):
+        """Collect the stage() timings made inside this block into `timings` (one job's breakdown)."""
+        token = _job_timings.set(timings)
+        try:
+            yield timings
+        finally:
+            _job_timings.reset(token)
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block as stage_seconds{stage=name}, and add it to the current job's timings."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_seconds", elapsed, stage=name)
+            timings = _job_timings.get()
+            if timings is not None:
+                timings[name] = round(timings.get(name, 0.0) + elapsed, 4)
+    
+    def _raw(self, name: str) -> Dict[str, Dict[str, float]]:
+        self.flush()
+        if self.redis_client:
+            try:
+                series = sorted(s.decode() for s in self.redis_client.smembers(f"{self.PREFIX}{name}:series"))
+                pipe = self.redis_client.pipeline(transaction=False)
+                for s in series:
+                    pipe.hgetall(f"{self.PREFIX}{name}:{s}")
+                return {
+                    s: {k.decode(): float(v) for k, v in data.items()}
+                    for s, data in zip(series, pipe.execute())
+                }
+            except Exception as e:
+                print(f"Metrics error: {e}")
+        with self._lock:
+            return {s: dict(data) for s, data in self._local.get(name, {}).items()}
+    
+    def summary(self, name: str) -> Dict[str, Dict[str, Any]]:
+        """Per-series count, average and bucket-estimated p50/p95/p99 (upper bounds)."""
+        result = {}
+        for series, data in self._raw(name).items():
+            count = int(data.get("count", 0))
+            cumulative, quantiles = 0, {}
+            for bound in _buckets(name):
+                cumulative += data.get(_bucket_field(bound), 0)
+                for q in (0.5, 0.95, 0.99):
+                    if q not in quantiles and count and cumulative >= q * count:
+                        quantiles[q] = None if bound == math.inf else bound
+            result[series] = {
+                "count": count,
+                "avg_seconds": round(data.get("sum", 0.0) / count, 3) if count else None,
+                "p50_seconds": quantiles.get(0.5),
+                "p95_seconds": quantiles.get(0.95),
+                "p99_seconds": quantiles.get(0.99)
+            }
+        return result
+    
+    def counter(self, name: str) -> Dict[str, float]:
+        return {series: data.get("value", 0) for series, data in self._raw(name).items()}
+    
+    def prometheus(self) -> str:
+        """Every registered metric in the Prometheus text exposition format."""
+        lines = []
+        for name, (kind, help_text, buckets) in REGISTRY.items():
+            full_name = f"pullsense_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for series, data in self._raw(name).items():
+                if kind == "counter":
+                    lines.append(f"{full_name}{_prometheus_labels(series)} {data.get('value', 0):g}")
+                    continue
+                cumulative = 0
+                for bound in buckets:
+                    cumulative += data.get(_bucket_field(bound), 0)
+                    le = 'le="+Inf"' if bound == math.inf else f'le="{bound:g}"'
+                    lines.append(f"{full_name}_bucket{_prometheus_labels(series, le)} {cumulative:g}")
+                lines.append(f"{full_name}_sum{_prometheus_labels(series)} {data.get('sum', 0):g}")
+                lines.append(f"{full_name}_count{_prometheus_labels(series)} {data.get('count', 0):g}")
+        return "\n".join(lines) + "\n"
+
+# Singleton instance
+metrics = Metrics()
@@ -0,0 +1,47 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+from config import settings
+
+
+class OffloadService:
+    """
+    Runs blocking work (SQLAlchemy sessions, Celery/Redis enqueues) in
+    dedicated thread pools so async handlers never stall the event loop.
+    
+    DB and broker calls get separate pools: a slow SQLite fsync can't
+    starve task enqueues and vice versa.
+    """
+    
+    def __init__(self):
+        self.db_executor = ThreadPoolExecutor(
+            max_workers=settings.DB_OFFLOAD_WORKERS,
+            thread_name_prefix="pullsense-db"
+        )
+        self.broker_executor = ThreadPoolExecutor(
+            max_workers=settings.BROKER_OFFLOAD_WORKERS,
+            thread_name_prefix="pullsense-broker"
+        )
+    
+    async def run_db(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking database function in the DB pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.db_executor, partial(func, *args, **kwargs))
+    
+    async def run_broker(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking broker call in the broker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.broker_executor, partial(func, *args, **kwargs))
+    
+    async def enqueue(self, task, *args, **options):
+        """Async equivalent of `task.apply_async(args)` - returns the AsyncResult."""
+        return await self.run_broker(task.apply_async, args=args, **options)
+    
+    def shutdown(self):
+        """Wait for in-flight work and release the pools."""
+        self.db_executor.shutdown(wait=True)
+        self.broker_executor.shutdown(wait=True)
+
+# Singleton instance
+offload = OffloadService()
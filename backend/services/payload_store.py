@@ -0,0 +1,121 @@
+import hashlib
+import json
+import zlib
+from typing import Optional, Dict, Any
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from database import PayloadBlob, dialect_insert
+
+# Sub-objects that repeat across nearly every webhook for a repo. Each one
+# is stored as its own blob and referenced from the envelope, so 30 pushes
+# to the same repo keep one copy of the (large) repository object.
+SHARED_PATHS = [
+    ("repository",),
+    ("sender",),
+    ("organization",),
+    ("installation",),
+    ("pull_request", "user"),
+    ("pull_request", "head", "repo"),
+    ("pull_request", "base", "repo"),
+]
+
+REF_KEY = "$blob"
+
+
+class PayloadStore:
+    """
+    Content-addressed, compressed storage for webhook payloads.
+
+    Payloads are split into an envelope plus shared sub-objects, each
+    serialized canonically, hashed with sha256 and zlib-compressed into
+    `payload_blobs`. Writing the same content twice is a no-op.
+    """
+
+    def __init__(self, compression_level: int = 6):
+        self.compression_level = compression_level
+
+    def put(self, db: Session, payload: Dict[str, Any]) -> str:
+        """Store a payload in the caller's transaction and return its hash."""
+        envelope = json.loads(json.dumps(payload))  # private copy we can rewrite
+
+        for path in SHARED_PATHS:
+            parent = envelope
+            for key in path[:-1]:
+                parent = parent.get(key) if isinstance(parent, dict) else None
+            if isinstance(parent, dict) and isinstance(parent.get(path[-1]), dict):
+                parent[path[-1]] = {REF_KEY: self._put_blob(db, parent[path[-1]])}
+
+        return self._put_blob(db, envelope)
+
+    def get(self, db: Session, payload_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Load and reassemble a payload, or None if it isn't stored."""
+        if not payload_hash:
+            return None
+
+        envelope = self._get_blob(db, payload_hash)
+        if envelope is None:
+            return None
+
+        for path in SHARED_PATHS:
+            parent = envelope
+            for key in path[:-1]:
+                parent = parent.get(key) if isinstance(parent, dict) else None
+            ref = parent.get(path[-1]) if isinstance(parent, dict) else None
+            if isinstance(ref, dict) and set(ref) == {REF_KEY}:
+                parent[path[-1]] = self._get_blob(db, ref[REF_KEY])
+
+        return envelope
+
+    def _put_blob(self, db: Session, obj: Any) -> str:
+        encoded = json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+        digest = hashlib.sha256(encoded).hexdigest()
+
+        db.execute(
+            dialect_insert(db, PayloadBlob)
+            .values(
+                hash=digest,
+                data=zlib.compress(encoded, self.compression_level),
+                size=len(encoded)
+            )
+            .on_conflict_do_nothing(index_elements=["hash"])
+        )
+        return digest
+
+    def _get_blob(self, db: Session, digest: str) -> Optional[Any]:
+        data = db.query(PayloadBlob.data).filter_by(hash=digest).scalar()
+        if data is None:
+            return None
+        return json.loads(zlib.decompress(data))
+
+    def backfill_raw_data(self, db: Session, batch_size: int = 200) -> int:
+        """
+        Move payloads out of the legacy pull_requests.raw_data column.
+
+        Returns the number of rows migrated.
+        """
+        columns = {c["name"] for c in inspect(db.get_bind()).get_columns("pull_requests")}
+        if "raw_data" not in columns:
+            return 0
+
+        migrated = 0
+        while True:
+            rows = db.execute(text(
+                "SELECT id, raw_data FROM pull_requests "
+                "WHERE raw_data IS NOT NULL AND payload_hash IS NULL LIMIT :n"
+            ), {"n": batch_size}).fetchall()
+            if not rows:
+                break
+
+            for pr_id, raw_data in rows:
+                payload = json.loads(raw_data) if isinstance(raw_data, (str, bytes)) else raw_data
+                db.execute(
+                    text("UPDATE pull_requests SET payload_hash = :h, raw_data = NULL WHERE id = :id"),
+                    {"h": self.put(db, payload or {}), "id": pr_id}
+                )
+            db.commit()
+            migrated += len(rows)
+        return migrated
+
+# Singleton instance
+payload_store = PayloadStore()
+
@@ -0,0 +1,252 @@
+import asyncio
+import random
+import re
+import time
+from datetime import datetime, timezone
+from functools import cached_property
+from typing import Optional, Dict, Any, Mapping
+from config import settings
+from services.cache_service import SharedRedis
+
+# Refill the bucket for the time since it was last touched, then take
+# `cost` tokens if there are enough. Returns {granted, seconds_to_wait}
+# (as a string - Redis truncates Lua floats).
+# KEYS[1] = bucket hash, ARGV = now, cost, default capacity, default refill/s
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local b = redis.call('HMGET', KEYS[1], 'tokens', 'capacity', 'rate', 'updated', 'blocked_until')
+local capacity = tonumber(b[2]) or tonumber(ARGV[3])
+local rate = tonumber(b[3]) or tonumber(ARGV[4])
+local tokens = tonumber(b[1]) or capacity
+local updated = tonumber(b[4]) or now
+local blocked_until = tonumber(b[5]) or 0
+
+if now < blocked_until then
+    return {0, tostring(blocked_until - now)}
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local granted = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    granted = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], 86400)
+return {granted, tostring(wait)}
+"""
+
+# Defaults until an upstream's response headers say otherwise:
+# (requests per window, window seconds)
+UPSTREAMS = {
+    "github": (settings.GITHUB_RATE_LIMIT_PER_HOUR, 3600),
+    "openai": (settings.OPENAI_REQUESTS_PER_MINUTE, 60),
+}
+
+
+class RateLimited(Exception):
+    """An upstream's shared budget is exhausted; try again in `retry_after` seconds."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} rate limit reached, retry in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def backoff_seconds(attempt: int, retry_after: float = 0,
+                    base: Optional[float] = None, cap: Optional[float] = None) -> float:
+    """
+    Exponential backoff with jitter for the `attempt`-th retry (0-based).
+
+    Never shorter than the upstream's own retry hint, and spread over the
+    upper half of the window so workers that failed together don't all
+    come back together. `base` and `cap` default to the rate-limit settings.
+    """
+    base = settings.RATE_LIMIT_BACKOFF_SECONDS if base is None else base
+    cap = settings.RATE_LIMIT_BACKOFF_MAX_SECONDS if cap is None else cap
+    ceiling = min(cap, base * 2 ** min(attempt, 16))
+    return max(retry_after, random.uniform(ceiling / 2, ceiling))
+
+
+def _duration_seconds(value: str) -> Optional[float]:
+    """OpenAI reset headers: "1s", "6m0s", "20ms", "1h2m3.5s"."""
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value or "")
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class RateLimiter:
+    """
+    Token buckets in Redis, one per upstream (GitHub, OpenAI), shared by
+    every API process and worker.
+
+    Callers take a token before each request and feed the response's
+    rate-limit headers back, so the bucket tracks what the upstream
+    actually reports rather than each worker guessing on its own. A 429
+    (or GitHub's remaining count hitting zero) blocks the bucket until the
+    reset time. Workers wait for short gaps and otherwise get RateLimited,
+    which the tasks turn into a jittered exponential-backoff retry.
+    """
+
+    PREFIX = "pullsense:ratelimit:"
+    redis_client = SharedRedis()
+
+    def __init__(self):
+        self.max_wait_seconds = settings.RATE_LIMIT_MAX_WAIT_SECONDS
+        self._local: Dict[str, Dict[str, Any]] = {}  # last headers seen, without Redis
+
+    @cached_property
+    def _take(self):
+        return self.redis_client.register_script(TAKE_SCRIPT)
+
+    def _key(self, upstream: str) -> str:
+        return self.PREFIX + upstream
+
+    def take(self, upstream: str, cost: int = 1) -> float:
+        """Try to take `cost` tokens. Returns 0 if granted, else seconds until there may be enough."""
+        if not self.redis_client:
+            return 0
+
+        limit, window = UPSTREAMS[upstream]
+        try:
+            granted, wait = self._take(
+                keys=[self._key(upstream)],
+                args=[time.time(), cost, limit, limit / window]
+            )
+            return 0 if granted else float(wait)
+        except Exception as e:
+            print(f"Rate limiter error: {e}")
+            return 0
+
+    def acquire(self, upstream: str, cost: int = 1, max_wait: float = None):
+        """Take tokens, sleeping through short waits. Raises RateLimited for long ones. Blocking."""
+        max_wait = self.max_wait_seconds if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.take(upstream, cost)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimited(upstream, wait)
+            time.sleep(wait * random.uniform(1.0, 1.2))
+
+    async def acquire_async(self, upstream: str, cost: int = 1, max_wait: float = None):
+        """acquire() for the event loop: awaits instead of sleeping the thread."""
+        max_wait = self.max_wait_seconds if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = await asyncio.to_thread(self.take, upstream, cost)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimited(upstream, wait)
+            await asyncio.sleep(wait * random.uniform(1.0, 1.2))
+
+    def observe(self, upstream: str, headers: Optional[Mapping[str, Any]]):
+        """Sync the bucket with a response's rate-limit headers (GitHub or OpenAI style)."""
+        if not headers:
+            return
+        headers = {k.lower(): v for k, v in headers.items()}
+        now = time.time()
+
+        if "x-ratelimit-remaining-requests" in headers:
+            # OpenAI: reset is how long until the bucket is full again
+            remaining = headers.get("x-ratelimit-remaining-requests")
+            limit = headers.get("x-ratelimit-limit-requests")
+            reset_in = _duration_seconds(headers.get("x-ratelimit-reset-requests"))
+            reset_at = now + reset_in if reset_in is not None else None
+        elif "x-ratelimit-remaining" in headers:
+            # GitHub: reset is the epoch second the hourly window restarts
+            remaining = headers.get("x-ratelimit-remaining")
+            limit = headers.get("x-ratelimit-limit")
+            reset_at = float(headers["x-ratelimit-reset"]) if headers.get("x-ratelimit-reset") else None
+        else:
+            return
+
+        try:
+            remaining, limit = int(remaining), int(limit)
+        except (TypeError, ValueError):
+            return
+
+        state = {"tokens": remaining, "capacity": limit, "rate": limit / UPSTREAMS[upstream][1],
+                 "updated": now, "limit": limit, "remaining": remaining, "observed_at": now}
+        if reset_at:
+            state["reset_at"] = reset_at
+            if remaining <= 0:
+                state["blocked_until"] = reset_at
+        self._store(upstream, state)
+
+    def exceeded(self, upstream: str, headers: Optional[Mapping[str, Any]] = None) -> RateLimited:
+        """
+        Record a 429 / rate-limit error: block the bucket until the
+        upstream says to come back. Returns the RateLimited to raise.
+        """
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.time()
+        retry_after = None
+        try:
+            if headers.get("retry-after"):
+                retry_after = float(headers["retry-after"])
+            elif headers.get("x-ratelimit-reset"):
+                retry_after = float(headers["x-ratelimit-reset"]) - now
+            elif headers.get("x-ratelimit-reset-requests"):
+                retry_after = _duration_seconds(headers["x-ratelimit-reset-requests"])
+        except ValueError:
+            pass
+        retry_after = max(1.0, retry_after if retry_after is not None else settings.RATE_LIMIT_BACKOFF_SECONDS)
+
+        self._store(upstream, {"tokens": 0, "updated": now, "blocked_until": now + retry_after,
+                               "remaining": 0, "observed_at": now})
+        print(f"🚦 {upstream} rate limited, backing off {retry_after:.0f}s")
+        return RateLimited(upstream, retry_after)
+
+    def _store(self, upstream: str, state: Dict[str, Any]):
+        self._local.setdefault(upstream, {}).update(state)
+        if not self.redis_client:
+            return
+        try:
+            key = self._key(upstream)
+            pipe = self.redis_client.pipeline()
+            pipe.hset(key, mapping=state)
+            pipe.expire(key, 86400)
+            pipe.execute()
+        except Exception as e:
+            print(f"Rate limiter error: {e}")
+
+    def budget(self, upstream: str) -> Dict[str, Any]:
+        """What the shared bucket knows about an upstream's limit - no API call."""
+        state = dict(self._local.get(upstream, {}))
+        if self.redis_client:
+            try:
+                state = {k.decode(): float(v) for k, v in self.redis_client.hgetall(self._key(upstream)).items()}
+            except Exception as e:
+                print(f"Rate limiter error: {e}")
+
+        now = time.time()
+        default_limit, window = UPSTREAMS[upstream]
+        capacity = state.get("capacity", default_limit)
+        tokens = state.get("tokens", capacity)
+        tokens = min(capacity, tokens + max(0, now - state.get("updated", now)) * state.get("rate", default_limit / window))
+        if now < state.get("blocked_until", 0):
+            tokens = 0
+
+        def iso(ts):
+            return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+        return {
+            "limit": int(state.get("limit", default_limit)),
+            "remaining": int(tokens),
+            "reset": iso(state.get("reset_at")),
+            "blocked_until": iso(state["blocked_until"]) if now < state.get("blocked_until", 0) else None,
+            "observed_at": iso(state.get("observed_at")),
+            "shared": self.redis_client is not None
+        }
+
+# Singleton instance
+rate_limiter = RateLimiter()
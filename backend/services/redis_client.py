@@ -0,0 +1,55 @@
+import threading
+import redis
+import redis.asyncio as aioredis
+from config import settings
+
+# Pub/sub channel Celery workers and API processes use for dashboard updates
+WEBSOCKET_CHANNEL = "websocket_updates"
+# Task ids whose state changed (services/task_state.py)
+TASK_CHANNEL = "pullsense:task_updates"
+
+_lock = threading.Lock()
+_pool = None
+_async_pool = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Shared, pooled Redis client for this process.
+    
+    Every caller gets a client on the same ConnectionPool, so publishing or
+    caching reuses warm connections instead of opening one per call.
+    redis-py resets the pool after fork, so Celery prefork children are safe.
+    """
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = redis.ConnectionPool.from_url(
+                    settings.REDIS_URL,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+                    health_check_interval=30
+                )
+    return redis.Redis(connection_pool=_pool)
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Shared asyncio Redis client for the API's event loop."""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = aioredis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            health_check_interval=30
+        )
+    return aioredis.Redis(connection_pool=_async_pool)
+
+
+async def close_async_redis():
+    """Release the asyncio pool (API shutdown)."""
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.disconnect()
+        _async_pool = None
@@ -0,0 +1,51 @@
+import json
+import uuid
+from typing import Optional, Union, Dict, Any
+from services.cache_service import SharedRedis
+
+StageRef = Union[str, Dict[str, Any]]
+
+
+class StageStore:
+    """
+    Hands intermediate results between analysis pipeline stages.
+
+    Diffs can run to hundreds of KB, and putting them in task arguments
+    would push them through the broker once per stage. Stages pass a short
+    key instead; the context sits in Redis (with a TTL, in case a stage is
+    lost) until the persist stage deletes it. Without Redis the context
+    travels inline as the task argument.
+    """
+
+    PREFIX = "pullsense:stage:"
+    redis_client = SharedRedis()
+
+    def __init__(self, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+
+    def put(self, context: Dict[str, Any], ref: Optional[str] = None) -> StageRef:
+        """Store (or overwrite) a stage context and return its reference."""
+        if not self.redis_client:
+            return context
+
+        ref = ref if isinstance(ref, str) else uuid.uuid4().hex
+        self.redis_client.setex(self.PREFIX + ref, self.ttl_seconds, json.dumps(context))
+        return ref
+
+    def get(self, ref: StageRef) -> Optional[Dict[str, Any]]:
+        """Load a stage context, or None if it expired."""
+        if isinstance(ref, dict):
+            return ref
+
+        raw = self.redis_client.get(self.PREFIX + ref) if self.redis_client else None
+        return json.loads(raw) if raw else None
+
+    def delete(self, ref: StageRef):
+        if isinstance(ref, str) and self.redis_client:
+            try:
+                self.redis_client.delete(self.PREFIX + ref)
+            except Exception as e:
+                print(f"Stage store delete error: {e}")
+
+# Singleton instance
+stage_store = StageStore()
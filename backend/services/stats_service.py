@@ -0,0 +1,142 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from database import StatCounter, PullRequest, PullRequestEvent, CodeReview, dialect_insert
+
+
+class StatsService:
+    """
+    Rollup counters for /stats.
+    
+    Writers bump counters in the same transaction as the row they insert,
+    so /stats reads a handful of rows by primary key instead of counting
+    whole tables. Every bump updates four scopes: all-time and per-day,
+    globally and for the PR's repo.
+    """
+    
+    def increment(self, db: Session, name: str, repo_name: Optional[str] = None,
+                  amount: int = 1, when: Optional[datetime] = None):
+        """Add `amount` to a counter inside the caller's transaction."""
+        day = (when or datetime.utcnow()).date().isoformat()
+        for scope_repo, scope_day in self._scopes(repo_name, day):
+            stmt = dialect_insert(db, StatCounter).values(
+                name=name,
+                repo_name=scope_repo,
+                day=scope_day,
+                value=amount
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["name", "repo_name", "day"],
+                set_={"value": StatCounter.__table__.c.value + amount}
+            ))
+    
+    @staticmethod
+    def _scopes(repo_name: Optional[str], day: Optional[str]) -> List[tuple]:
+        """(repo_name, day) pairs a single event counts towards."""
+        scopes = [("", "")]
+        if day:
+            scopes.append(("", day))
+        if repo_name:
+            scopes.append((repo_name, ""))
+            if day:
+                scopes.append((repo_name, day))
+        return scopes
+    
+    def record_review(self, db: Session, status: str, repo_name: Optional[str] = None):
+        """Counters for a newly saved CodeReview."""
+        self.increment(db, "reviews", repo_name)
+        self.increment(db, f"reviews:{status}", repo_name)
+    
+    def snapshot(self, db: Session, repo_name: str = "", day: str = "") -> Dict[str, int]:
+        """All counters for one scope, e.g. {"prs": 10, "events": 31, "reviews": 8, "reviews:completed": 6}."""
+        rows = db.query(StatCounter.name, StatCounter.value)\
+            .filter(StatCounter.repo_name == repo_name, StatCounter.day == day)\
+            .all()
+        return dict(rows)
+    
+    def daily(self, db: Session, name: str, repo_name: str = "", days: int = 30) -> List[Dict]:
+        """One counter per day for the last `days` days, zero-filled."""
+        today = datetime.utcnow().date()
+        first = (today - timedelta(days=days - 1)).isoformat()
+        
+        values = dict(
+            db.query(StatCounter.day, StatCounter.value)
+            .filter(
+                StatCounter.name == name,
+                StatCounter.repo_name == repo_name,
+                StatCounter.day >= first
+            )
+            .all()
+        )
+        return [
+            {"day": d, "value": values.get(d, 0)}
+            for d in ((today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1))
+        ]
+    
+    def reconcile(self, db: Session) -> int:
+        """
+        Rebuild every counter from the source tables (full scans - run rarely).
+        
+        Fixes drift from rows written outside the normal paths. Returns the
+        number of counter rows written; the caller commits.
+        
+        Counter writers are locked out first, until the caller commits: a
+        write committed between the recount and the rewrite would otherwise
+        be overwritten. Writers already past their increment are waited for
+        (and counted); later ones apply their increment on top of the result.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            # Conflicts with the ROW EXCLUSIVE lock every INSERT/UPDATE takes; plain reads still go through
+            db.execute(text("LOCK TABLE stat_counters IN EXCLUSIVE MODE"))
+        # On SQLite this first write takes the database's write lock for the same effect
+        db.query(StatCounter).delete()
+        
+        totals = defaultdict(int)
+        
+        def add(name, repo_name, day, count):
+            # func.date() gives a string on SQLite and a date on Postgres
+            for scope_repo, scope_day in self._scopes(repo_name, str(day)[:10] if day else None):
+                totals[(name, scope_repo, scope_day)] += count
+        
+        pr_counts = db.query(
+            PullRequest.repo_name,
+            func.date(PullRequest.created_at),
+            func.count(PullRequest.id)
+        ).group_by(PullRequest.repo_name, func.date(PullRequest.created_at)).all()
+        for repo_name, day, count in pr_counts:
+            add("prs", repo_name, day, count)
+        
+        event_counts = db.query(
+            PullRequest.repo_name,
+            func.date(PullRequestEvent.created_at),
+            func.count(PullRequestEvent.id)
+        )\
+            .join(PullRequest, PullRequest.id == PullRequestEvent.pull_request_id)\
+            .group_by(PullRequest.repo_name, func.date(PullRequestEvent.created_at))\
+            .all()
+        for repo_name, day, count in event_counts:
+            add("events", repo_name, day, count)
+        
+        review_counts = db.query(
+            PullRequest.repo_name,
+            func.date(CodeReview.created_at),
+            CodeReview.analysis_status,
+            func.count(CodeReview.id)
+        )\
+            .join(PullRequest, PullRequest.id == CodeReview.pull_request_id)\
+            .group_by(PullRequest.repo_name, func.date(CodeReview.created_at), CodeReview.analysis_status)\
+            .all()
+        for repo_name, day, status, count in review_counts:
+            add("reviews", repo_name, day, count)
+            add(f"reviews:{status}", repo_name, day, count)
+        
+        db.bulk_insert_mappings(StatCounter, [
+            {"name": name, "repo_name": repo_name, "day": day, "value": value}
+            for (name, repo_name, day), value in totals.items()
+        ])
+        return len(totals)
+
+# Singleton instance
+stats_service = StatsService()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Optional, Dict, Any, List
+from services.cache_service import SharedRedis
+from services.redis_client import TASK_CHANNEL
+
+# queued -> fetching -> analyzing -> done | failed (a retry goes back to queued)
+STATES = ("queued", "fetching", "analyzing", "done", "failed")
+FINAL_STATES = ("done", "failed")
+
+
+class TaskStateStore:
+    """
+    Tracks where each analysis job is, by the task_id the API hands out.
+
+    Celery runs without a result backend, so the id used to lead nowhere.
+    Each job is a Redis hash holding its current state, a timestamp per
+    state reached, a version that goes up on every change and, once final,
+    the outcome (review_id, reused/superseded, or the error). Changes are
+    published on TASK_CHANNEL; each API process relays them to its
+    long-poll and SSE waiters, so clients hear about a change when it
+    happens instead of polling. Falls back to per-process memory without
+    Redis.
+    """
+
+    PREFIX = "pullsense:task:"
+    redis_client = SharedRedis()
+
+    def __init__(self, ttl_seconds: int = 86400, poll_seconds: float = 1.0):
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds  # waiters' fallback when there is no pub/sub
+        self._local: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    def set(self, task_id: Optional[str], state: str, **fields):
+        """Record a state change. Never raises - tracking must not break a job."""
+        if not task_id:
+            return
+
+        now = time.time()
+        update = {"state": state, "updated_at": now, f"{state}_at": now}
+        update.update({k: v for k, v in fields.items() if v is not None})
+
+        if self.redis_client:
+            try:
+                key = self.PREFIX + task_id
+                pipe = self.redis_client.pipeline()
+                pipe.hset(key, mapping={k: json.dumps(v) for k, v in update.items()})
+                pipe.hincrby(key, "version", 1)
+                pipe.expire(key, self.ttl_seconds)
+                pipe.publish(TASK_CHANNEL, task_id)
+                pipe.execute()
+                return
+            except Exception as e:
+                print(f"Task state error: {e}")
+
+        with self._lock:
+            task = self._local.setdefault(task_id, {"version": 0})
+            task.update(update)
+            task["version"] += 1
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """The job's current state, or None if unknown (or expired)."""
+        if self.redis_client:
+            try:
+                raw = self.redis_client.hgetall(self.PREFIX + task_id)
+                if not raw:
+                    return None
+                return {"task_id": task_id, **{k.decode(): json.loads(v) for k, v in raw.items()}}
+            except Exception as e:
+                print(f"Task state error: {e}")
+
+        with self._lock:
+            task = self._local.get(task_id)
+            return {"task_id": task_id, **task} if task else None
+
+    def notify(self, task_id: str):
+        """Wake this process's waiters for a task (called by the API's pub/sub relay)."""
+        for waiter in self._waiters.pop(task_id, []):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def wait(self, task_id: str, version: int = 0, timeout: float = 30) -> Optional[Dict[str, Any]]:
+        """
+        Return the task once its version is past `version` or it is final,
+        or its current state after `timeout` seconds - whichever comes first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Register before reading, so a change in between still wakes us
+            waiter = loop.create_future()
+            self._waiters.setdefault(task_id, []).append(waiter)
+            try:
+                task = await asyncio.to_thread(self.get, task_id)
+                remaining = deadline - loop.time()
+                if task is None or task["version"] > version or task["state"] in FINAL_STATES or remaining <= 0:
+                    return task
+                if not self.redis_client:
+                    remaining = min(remaining, self.poll_seconds)
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                waiters = self._waiters.get(task_id)
+                if waiters and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiters[task_id]
+
+# Singleton instance
+task_state = TaskStateStore()
@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Point the app at a throwaway SQLite file before anything imports database.py,
+# so running the suite never touches the developer's pullsense.db
+os.environ.setdefault(
+    "DATABASE_URL",
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pullsense-tests-'), 'pullsense.db')}"
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated_db():
+    """Every test runs against the fully migrated schema."""
+    from database import engine
+    import migrations
+    migrations.upgrade(engine)
+    return engine
+
+
+@pytest.fixture
+def eager_celery():
+    """Run Celery tasks inline; modules opt in with pytestmark = pytest.mark.usefixtures("eager_celery")."""
+    import celery_app
+    celery_app.app.conf.task_always_eager = True
+    yield celery_app.app
+    celery_app.app.conf.task_always_eager = False
+
+
+@pytest.fixture
+def isolated_metrics(monkeypatch):
+    """The metrics singleton with no Redis and nothing recorded yet."""
+    from services.metrics import metrics
+    monkeypatch.setattr(metrics, "redis_client", None)
+    monkeypatch.setattr(metrics, "_local", {})
+    monkeypatch.setattr(metrics, "_pending", {})
+    return metrics
+
+
+@pytest.fixture
+def webhook(request):
+    """
+    Builds pull_request webhook payloads.
+
+    The test data shares one database, so PRs land in the calling module's
+    REPO ("octo/tests" if it doesn't set one) unless repo= says otherwise;
+    extra keyword arguments (body, updated_at, ...) go into pull_request.
+    """
+    default_repo = getattr(request.module, "REPO", "octo/tests")
+
+    def build(number, sha=None, action="opened", repo=None, title=None, login="octocat", **pull_request):
+        return {
+            "action": action,
+            "pull_request": {
+                "number": number,
+                "title": title or f"PR {number}",
+                "state": "closed" if action == "closed" else "open",
+                "user": {"login": login},
+                "head": {"sha": sha or f"{number:040x}"},
+                **pull_request
+            },
+            "repository": {"full_name": repo or default_repo}
+        }
+
+    return build
@@ -0,0 +1,71 @@
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal, CodeReview
+import main
+import async_worker
+from async_worker import AsyncAnalysisWorker
+from services.ai_analyzer import analyzer
+from services.github_async import github_async
+
+REPO = "octo/async"
+
+
+def test_runs_analyses_concurrently_and_saves_in_batches(monkeypatch, webhook):
+    active = {"now": 0, "peak": 0}
+    batches = []
+
+    async def fake_diff(repo_name, pr_number, head_sha=None):
+        return {"changed_files": 1, "additions": 1, "deletions": 0, "files": []}
+
+    async def fake_analyze(pr_data):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.05)
+        active["now"] -= 1
+        return {"analysis": f"Reviewed {pr_data['title']}", "status": "completed", "model": "stub"}
+
+    monkeypatch.setattr(github_async, "get_pr_diff", fake_diff)
+    monkeypatch.setattr(analyzer, "analyze_pr_async", fake_analyze)
+    monkeypatch.setattr(async_worker, "review_saved", lambda context, review: None)
+
+    original_write = AsyncAnalysisWorker.write_batch
+    def record_batch(self, batch):
+        batches.append(len(batch))
+        original_write(self, batch)
+    monkeypatch.setattr(AsyncAnalysisWorker, "write_batch", record_batch)
+
+    pr_ids = [main.save_pull_request(webhook(n))["id"] for n in range(1, 13)]
+    worker = AsyncAnalysisWorker(concurrency=4, batch_size=5, batch_seconds=0.5)
+    asyncio.run(worker.process([{"pr_id": pr_id} for pr_id in pr_ids]))
+
+    assert active["peak"] == 4
+    assert worker.saved == 12
+    assert sum(batches) == 12 and max(batches) == 5
+
+    db = SessionLocal()
+    try:
+        reviews = db.query(CodeReview).filter(CodeReview.pull_request_id.in_(pr_ids)).all()
+        assert len(reviews) == 12
+        assert {r.analysis_text for r in reviews} == {f"Reviewed PR {n}" for n in range(1, 13)}
+    finally:
+        db.close()
+
+
+def test_failed_analysis_is_broadcast(monkeypatch, webhook):
+    broadcasts = []
+
+    async def broken_diff(repo_name, pr_number, head_sha=None):
+        raise RuntimeError("GitHub down")
+
+    monkeypatch.setattr(github_async, "get_pr_diff", broken_diff)
+    monkeypatch.setattr(async_worker, "broadcast_analysis_complete", lambda *args: broadcasts.append(args))
+
+    pr_id = main.save_pull_request(webhook(99))["id"]
+    worker = AsyncAnalysisWorker(concurrency=2, batch_size=5, batch_seconds=0.1)
+    asyncio.run(worker.process([{"pr_id": pr_id}]))
+
+    assert broadcasts == [(pr_id, "error", "octo/async", 99)]
+    assert worker.saved == 0
@@ -0,0 +1,90 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+from services.cache_service import CacheService, LocalLRU, encode, compress, decode, PLAIN, COMPRESSED
+from services.metrics import metrics
+
+
+class FakeRedis:
+    """get / setex / pttl / delete over a dict, plus the pipeline CacheService.get uses."""
+
+    def __init__(self):
+        self.data, self.ttl, self.calls = {}, {}, []
+
+    def get(self, key):
+        self.calls.append(("get", key))
+        return self.data.get(key)
+
+    def pttl(self, key):
+        return self.ttl.get(key, -2) * 1000
+
+    def setex(self, key, expire, value):
+        self.data[key], self.ttl[key] = value, expire
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        redis, results = self, []
+
+        class Pipeline:
+            def get(self, key):
+                results.append(redis.get(key))
+
+            def pttl(self, key):
+                results.append(redis.pttl(key))
+
+            def execute(self):
+                return results
+
+        return Pipeline()
+
+
+def two_tier(local_max_bytes=1024 * 1024):
+    service = CacheService(local_max_bytes=local_max_bytes)
+    service._redis_client, service._resolved = FakeRedis(), True
+    return service
+
+
+def test_values_round_trip_compact_and_compressed():
+    small = {"sha": "a" * 40, "files": 3}
+    large = {"files": [{"filename": f"src/f{i}.py", "patch": "+x\n" * 50} for i in range(50)]}
+
+    assert compress(encode(small))[:1] == PLAIN and decode(compress(encode(small))) == small
+    assert compress(encode(large))[:1] == COMPRESSED and decode(compress(encode(large))) == large
+    assert len(compress(encode(large))) < len(json.dumps(large)) / 10
+    assert decode(json.dumps(small).encode()) == small  # entries written before the binary format
+
+
+def test_local_tier_evicts_least_recently_used_past_its_size():
+    lru = LocalLRU(max_bytes=100)
+    lru.set("a", b"x" * 20, 60)
+    lru.set("b", b"x" * 20, 60)
+    lru.get("a")
+    for key in "cdef":
+        lru.set(key, b"x" * 20, 60)
+
+    assert lru.get("a") is not None and lru.get("b") is None
+    assert lru.size <= 100
+    lru.set("g", b"x" * 20, 0)
+    assert lru.get("g") is None  # expired
+
+
+def test_hits_are_served_and_counted_per_tier(isolated_metrics):
+    writer, reader = two_tier(), two_tier()
+    reader._redis_client = writer._redis_client  # two processes, one Redis
+
+    writer.set("github_diff:octo/repo:1:abc", {"files": []}, 600)
+    assert reader.get("github_diff:octo/repo:1:abc") == {"files": []}  # from Redis
+    assert reader.get("github_diff:octo/repo:1:abc") == {"files": []}  # from its local tier
+    assert reader.get("github_diff:octo/repo:1:def") is None
+
+    assert writer._redis_client.calls.count(("get", "pullsense:github_diff:octo/repo:1:abc")) == 1
+    assert reader.local.get("github_diff:octo/repo:1:abc")[:1] == PLAIN  # kept decompressed
+    assert metrics.counter("cache_requests_total") == {
+        "cache=github_diff,result=hit,tier=local": 1, "cache=github_diff,result=miss,tier=local": 2,
+        "cache=github_diff,result=hit,tier=redis": 1, "cache=github_diff,result=miss,tier=redis": 1
+    }
@@ -0,0 +1,102 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from fastapi.testclient import TestClient
+from database import engine, SessionLocal, PullRequest, PullRequestEvent, CodeReview
+import migrations
+import main
+
+REPO = "octo/canonical"
+
+
+def test_webhooks_upsert_one_pr_and_append_events(webhook):
+    first = main.save_pull_request(webhook(1, "a" * 40), delivery_id="d1")
+    second = main.save_pull_request(webhook(1, "b" * 40, action="synchronize"), delivery_id="d2")
+    third = main.save_pull_request(webhook(1, "c" * 40, action="synchronize", title="Renamed"), delivery_id="d3")
+    
+    assert first["created"] and not second["created"] and not third["created"]
+    assert first["id"] == second["id"] == third["id"]
+    
+    db = SessionLocal()
+    try:
+        prs = db.query(PullRequest).filter_by(repo_name="octo/canonical", pr_number=1).all()
+        assert len(prs) == 1
+        assert prs[0].head_sha == "c" * 40
+        assert prs[0].title == "Renamed"
+        assert prs[0].state == "open"
+        
+        events = db.query(PullRequestEvent).filter_by(pull_request_id=first["id"]).order_by(PullRequestEvent.id).all()
+        assert [e.delivery_id for e in events] == ["d1", "d2", "d3"]
+        assert [e.head_sha for e in events] == ["a" * 40, "b" * 40, "c" * 40]
+    finally:
+        db.close()
+
+
+def test_older_webhook_arriving_late_only_appends_its_event(webhook):
+    newer = main.save_pull_request(
+        webhook(2, "e" * 40, action="closed", title="Final", updated_at="2024-01-15T10:35:00Z"), delivery_id="late-2"
+    )
+    older = main.save_pull_request(
+        webhook(2, "d" * 40, action="synchronize", updated_at="2024-01-15T10:30:00Z"), delivery_id="late-1"
+    )
+    
+    assert not newer["stale"] and older["stale"]
+    assert older["head_sha"] == "e" * 40
+    
+    db = SessionLocal()
+    try:
+        pr = db.get(PullRequest, newer["id"])
+        assert (pr.head_sha, pr.title, pr.state, pr.action) == ("e" * 40, "Final", "closed", "closed")
+        assert pr.github_updated_at == datetime(2024, 1, 15, 10, 35)
+        
+        events = db.query(PullRequestEvent).filter_by(pull_request_id=pr.id).order_by(PullRequestEvent.id).all()
+        assert [e.delivery_id for e in events] == ["late-2", "late-1"]
+    finally:
+        db.close()
+
+
+def test_events_endpoint_lists_history_and_404s_unknown_prs(webhook):
+    pr = main.save_pull_request(webhook(3, "f" * 40), delivery_id="e1")
+    main.save_pull_request(webhook(3, "0" * 40, action="synchronize"), delivery_id="e2")
+    
+    client = TestClient(main.app)
+    events = client.get(f"/pull-requests/{pr['id']}/events").json()["events"]
+    assert [e["delivery_id"] for e in events] == ["e2", "e1"]
+    
+    response = client.get("/pull-requests/999999/events")
+    assert response.status_code == 404
+
+
+def test_migration_folds_duplicate_rows_into_one_pr():
+    start = datetime(2023, 6, 1)
+    with engine.begin() as conn:
+        # Recreate the pre-canonical shape: no unique key, one row per webhook
+        conn.execute(text("DROP INDEX IF EXISTS ux_pull_requests_repo_pr"))
+        conn.execute(text("DELETE FROM schema_migrations WHERE version = 6"))
+        ids = []
+        for i, action in enumerate(["opened", "synchronize", "synchronize"]):
+            ids.append(conn.execute(PullRequest.__table__.insert().values(
+                repo_name="octo/legacy", pr_number=9, title=f"v{i}", action=action,
+                created_at=start + timedelta(minutes=i)
+            )).inserted_primary_key[0])
+        conn.execute(CodeReview.__table__.insert().values(
+            pull_request_id=ids[1], analysis_status="completed", created_at=start + timedelta(minutes=5)
+        ))
+    
+    assert migrations.upgrade(engine) == [6]
+    
+    db = SessionLocal()
+    try:
+        prs = db.query(PullRequest).filter_by(repo_name="octo/legacy", pr_number=9).all()
+        assert len(prs) == 1
+        pr = prs[0]
+        assert pr.id == ids[0]
+        assert pr.title == "v2"
+        assert pr.analysis_status == "completed"
+        assert db.query(PullRequestEvent).filter_by(pull_request_id=pr.id).count() == 3
+        assert db.query(CodeReview).filter_by(pull_request_id=pr.id).count() == 1
+    finally:
+        db.close()
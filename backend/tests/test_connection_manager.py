@@ -0,0 +1,102 @@
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+import main
+from services.connection_manager import ConnectionManager, topics_for
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+def test_topics_for_message():
+    message = {"type": "analysis_complete", "data": {"pr_id": 4, "repo": "octo/repo"}}
+    assert topics_for(message) == {"all", "repo:octo/repo", "pr:4"}
+    assert topics_for({"type": "ping"}) == {"all"}
+
+
+def test_broadcast_only_reaches_subscribers():
+    async def scenario():
+        manager = ConnectionManager(queue_size=10)
+        everyone, repo_fan, pr_fan = FakeSocket(), FakeSocket(), FakeSocket()
+        for ws in (everyone, repo_fan, pr_fan):
+            await manager.connect(ws, accept=False)
+        manager.unsubscribe(repo_fan, ["all"])
+        manager.subscribe(repo_fan, ["repo:octo/a"])
+        manager.unsubscribe(pr_fan, ["all"])
+        manager.subscribe(pr_fan, ["pr:7"])
+
+        await manager.broadcast({"type": "pr_created", "data": {"pr_id": 1, "repo": "octo/a"}})
+        await manager.broadcast({"type": "pr_created", "data": {"pr_id": 7, "repo": "octo/b"}})
+        await asyncio.sleep(0.05)
+        return everyone, repo_fan, pr_fan
+
+    everyone, repo_fan, pr_fan = asyncio.run(scenario())
+    assert len(everyone.sent) == 2
+    assert len(repo_fan.sent) == 1 and '"octo/a"' in repo_fan.sent[0]
+    assert len(pr_fan.sent) == 1 and '"pr_id": 7' in pr_fan.sent[0]
+
+
+def test_slow_client_does_not_delay_others():
+    async def scenario():
+        manager = ConnectionManager(queue_size=5, slow_client_policy="drop")
+        slow, fast = FakeSocket(delay=10), FakeSocket()
+        await manager.connect(slow, accept=False)
+        await manager.connect(fast, accept=False)
+
+        for i in range(20):
+            await manager.broadcast({"type": "tick", "data": {"n": i}})
+            await asyncio.sleep(0)  # let the writers run, as between relayed messages
+        await asyncio.sleep(0.05)
+        return manager, slow, fast
+
+    manager, slow, fast = asyncio.run(scenario())
+    assert len(fast.sent) == 20
+    # One frame is stuck in send_text, five wait in the queue, the rest were dropped
+    assert manager.clients[slow].queue.qsize() == 5
+    assert manager.dropped == 14
+
+
+def test_disconnect_policy_closes_slow_client():
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, slow_client_policy="disconnect")
+        slow = FakeSocket(delay=10)
+        await manager.connect(slow, accept=False)
+        for i in range(5):
+            await manager.broadcast({"type": "tick", "data": {"n": i}})
+            await asyncio.sleep(0)  # let the writers run, as between relayed messages
+        await asyncio.sleep(0.05)
+        return manager, slow
+
+    manager, slow = asyncio.run(scenario())
+    assert slow.closed
+    assert manager.slow_disconnects == 1
+    assert not manager.clients
+    assert not manager.subscriptions
+
+
+def test_ws_subscribe_command():
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"action": "subscribe", "topics": ["repo:octo/repo"]})
+        assert ws.receive_json() == {"type": "subscriptions", "topics": ["all", "repo:octo/repo"]}
+
+        ws.send_json({"action": "unsubscribe", "topics": ["all"]})
+        assert ws.receive_json()["topics"] == ["repo:octo/repo"]
+
+        ws.send_text("hello")
+        assert ws.receive_json() == {"type": "echo", "message": "hello"}
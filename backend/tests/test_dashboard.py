@@ -0,0 +1,117 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from database import engine, SessionLocal, PullRequest, CodeReview
+import main
+
+client = TestClient(main.app)
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the engine inside a `with` block."""
+    
+    def __enter__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+        return self
+    
+    def __exit__(self, *exc):
+        event.remove(engine, "before_cursor_execute", self._count)
+    
+    def _count(self, *args):
+        self.count += 1
+
+
+def setup_module(module):
+    db = SessionLocal()
+    start = datetime(2024, 1, 1)
+    try:
+        for i in range(30):
+            pr = PullRequest(
+                repo_name="octo/dash",
+                pr_number=i,
+                title=f"PR {i}",
+                author="alice",
+                action="opened",
+                created_at=start + timedelta(minutes=i)
+            )
+            db.add(pr)
+            db.flush()
+            if i % 2 == 0:
+                # Two reviews - the dashboard must pick the newer one
+                db.add(CodeReview(pull_request_id=pr.id, analysis_status="error",
+                                  created_at=start + timedelta(minutes=i, seconds=1)))
+                db.add(CodeReview(pull_request_id=pr.id, analysis_status="completed",
+                                  created_at=start + timedelta(minutes=i, seconds=2)))
+                pr.analysis_status = "completed"
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_dashboard_is_one_query():
+    with QueryCounter() as counter:
+        data = client.get("/dashboard", params={"repo": "octo/dash"}).json()
+    
+    assert counter.count == 1
+    assert data["total_prs"] == 20
+    assert data["analyzed"] == 10
+    
+    newest = data["pull_requests"][0]
+    assert newest["pr_number"] == 29
+    assert newest["analysis_status"] == "not_analyzed"
+    assert data["pull_requests"][1]["analysis_status"] == "completed"
+
+
+def test_analysis_lookup_is_one_query():
+    db = SessionLocal()
+    pr_id = db.query(PullRequest.id).filter_by(repo_name="octo/dash", pr_number=4).scalar()
+    db.close()
+    
+    with QueryCounter() as counter:
+        data = client.get(f"/pull-requests/{pr_id}/analysis").json()
+    
+    assert counter.count == 1
+    assert data["pull_request"]["number"] == 4
+    assert data["analysis"]["status"] == "completed"
+
+
+def test_keyset_pages_cover_everything_once():
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 7, "repo": "octo/dash"}
+        if cursor:
+            params["cursor"] = cursor
+        data = client.get("/pull-requests", params=params).json()
+        seen.extend(pr["number"] for pr in data["pull_requests"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert seen == list(range(29, -1, -1))
+
+
+def test_dashboard_filters_and_pages():
+    first = client.get("/dashboard", params={"limit": 5, "repo": "octo/dash"}).json()
+    assert [pr["pr_number"] for pr in first["pull_requests"]] == [29, 28, 27, 26, 25]
+    
+    second = client.get("/dashboard", params={
+        "limit": 5, "repo": "octo/dash", "cursor": first["next_cursor"]
+    }).json()
+    assert [pr["pr_number"] for pr in second["pull_requests"]] == [24, 23, 22, 21, 20]
+    
+    assert client.get("/dashboard", params={"repo": "nobody/else"}).json()["pull_requests"] == []
+
+
+def test_status_filter():
+    data = client.get("/pull-requests", params={"repo": "octo/dash", "status": "completed", "limit": 100}).json()
+    assert [pr["number"] for pr in data["pull_requests"]] == list(range(28, -1, -2))
+
+
+def test_bad_cursor_is_rejected():
+    assert client.get("/pull-requests", params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+from services.diff_parser import parse, parse_stream
+
+DIFF = """\
+diff --git a/app.py b/app.py
+index 83db48f..bf269f4 100644
+--- a/app.py
++++ b/app.py
+@@ -1,3 +1,4 @@
+ import os
+-import sys
++import json
++import re
+ 
+@@ -10,2 +11,2 @@ def main():
+-    run()
++    run(debug=True)
+diff --git a/new.py b/new.py
+new file mode 100644
+index 0000000..e69de29
+--- /dev/null
++++ b/new.py
+@@ -0,0 +1 @@
++print("hi")
+diff --git a/old.py b/old.py
+deleted file mode 100644
+index e69de29..0000000
+--- a/old.py
++++ /dev/null
+@@ -1 +0,0 @@
+-print("bye")
+diff --git a/src/a.py b/src/b.py
+similarity index 90%
+rename from src/a.py
+rename to src/b.py
+diff --git a/logo.png b/logo.png
+index 1111111..2222222 100644
+Binary files a/logo.png and b/logo.png differ
+"""
+
+
+def test_files_match_the_pull_request_files_api():
+    files = parse(DIFF.splitlines(), 10_000, 10_000)
+
+    assert [(f["filename"], f["status"], f["additions"], f["deletions"]) for f in files] == [
+        ("app.py", "modified", 3, 2), ("new.py", "added", 1, 0), ("old.py", "removed", 0, 1),
+        ("src/b.py", "renamed", 0, 0), ("logo.png", "modified", 0, 0)
+    ]
+    assert files[0]["patch"].splitlines()[0] == "@@ -1,3 +1,4 @@"
+    assert files[0]["patch"].splitlines()[-1] == "+    run(debug=True)"
+    assert files[3]["previous_filename"] == "src/a.py" and files[3]["patch"] is None
+    assert files[4]["binary"] and files[4]["patch"] is None
+
+
+def test_hunk_lines_that_look_like_headers_are_content():
+    diff = ["diff --git a/x.sql b/x.sql", "--- a/x.sql", "+++ b/x.sql",
+            "@@ -1,2 +1,2 @@", "--- a comment", "+++ another comment"]
+
+    (file,) = parse(diff, 10_000, 10_000)
+
+    assert file["filename"] == "x.sql"
+    assert (file["additions"], file["deletions"]) == (1, 1)
+
+
+def test_patch_text_is_capped_per_file_and_overall():
+    files = parse(DIFF.splitlines(), 40, 60)
+
+    assert files[0]["truncated"] and files[0]["patch"] == "@@ -1,3 +1,4 @@\n import os\n-import sys"
+    assert files[0]["additions"] == 3  # counted past the cap
+    assert files[1]["truncated"] and files[1]["patch"] == "@@ -0,0 +1 @@"
+    assert files[2]["truncated"] and files[2]["patch"] is None  # overall budget spent
+    assert "truncated" not in files[3]
+
+
+def test_stream_yields_each_file_as_it_completes():
+    async def lines():
+        for line in DIFF.splitlines(keepends=True):
+            yield line
+
+    async def collect():
+        return [f["filename"] async for f in parse_stream(lines(), 10_000, 10_000)]
+
+    assert asyncio.run(collect()) == ["app.py", "new.py", "old.py", "src/b.py", "logo.png"]
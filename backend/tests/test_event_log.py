@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.event_log import EventLog
+
+
+def make_log(maxlen):
+    log = EventLog(maxlen=maxlen)
+    log.redis_client = None  # exercise the in-process ring buffer
+    return log
+
+
+def test_summary_drops_payload():
+    payload = {
+        "action": "opened",
+        "pull_request": {"number": 7, "title": "Fix bug", "head": {"sha": "abc123"}, "body": "x" * 10000},
+        "repository": {"full_name": "octo/repo"},
+        "sender": {"login": "alice"}
+    }
+    summary = EventLog.summarize("pull_request", payload, delivery_id="d-1", pr_id=3)
+    
+    assert summary["repo"] == "octo/repo"
+    assert summary["pr_number"] == 7
+    assert summary["head_sha"] == "abc123"
+    assert summary["pr_id"] == 3
+    assert "payload" not in summary
+    assert "x" * 100 not in str(summary)
+
+
+def test_ring_buffer_is_bounded():
+    log = make_log(maxlen=5)
+    for i in range(50):
+        log.append({"event_type": "ping", "n": i})
+    
+    events, _ = log.page(limit=100)
+    assert log.total() == 50
+    assert [e["n"] for e in events] == [49, 48, 47, 46, 45]
+
+
+def test_pagination_walks_newest_first():
+    log = make_log(maxlen=100)
+    for i in range(25):
+        log.append({"event_type": "ping", "n": i})
+    
+    seen = []
+    cursor = None
+    while True:
+        events, cursor = log.page(limit=10, before=cursor)
+        seen.extend(e["n"] for e in events)
+        if cursor is None:
+            break
+    
+    assert seen == list(range(24, -1, -1))
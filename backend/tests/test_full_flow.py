@@ -43,6 +43,7 @@ def test_complete_flow():
         headers={"X-GitHub-Event": "pull_request"}
     )
     print(f"   Response: {response.json()}")
+    task_id = response.json().get("task_id")
     
     # 2. Check dashboard
     print("\n2️⃣ Checking dashboard...")
@@ -56,17 +57,23 @@ def test_complete_flow():
     pr_id = latest_pr["pr_id"]
     print(f"   Latest PR ID: {pr_id}")
     
-    # 3. Wait for analysis
+    # 3. Wait for analysis - long-poll the task instead of polling the PR
     print("\n3️⃣ Waiting for AI analysis to complete...")
-    for i in range(10):  # Wait up to 10 seconds
-        time.sleep(1)
-        response = requests.get(f"{BASE_URL}/pull-requests/{pr_id}/analysis")
-        result = response.json()
-        
-        if result.get("status") != "pending":
+    version = 0
+    deadline = time.time() + 120  # includes the debounce window
+    while task_id and time.time() < deadline:
+        task = requests.get(
+            f"{BASE_URL}/tasks/{task_id}/wait",
+            params={"version": version, "timeout": 30}
+        ).json()
+        version = task["version"]
+        print(f"   ... {task['state']}")
+        if task["state"] in ("done", "failed"):
             print("   ✅ Analysis complete!")
             break
-        print(f"   ... waiting {i+1}s")
+    
+    response = requests.get(f"{BASE_URL}/pull-requests/{pr_id}/analysis")
+    result = response.json()
     
     # 4. Display analysis
     print("\n4️⃣ Analysis Result:")
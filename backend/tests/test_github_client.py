@@ -0,0 +1,173 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import httpx
+
+import services.github_async as github_async_module
+from services.github_async import AsyncGitHubClient
+from services.github_service import GitHubService
+from services.metrics import metrics
+
+
+DIFF_ACCEPT = "application/vnd.github.diff"
+
+
+def fake_github(changed_files, requests, fail_first=(), serve_diff=True, head_sha="f" * 40):
+    """
+    Handler for httpx.MockTransport: one PR with `changed_files` files, as
+    a .diff or 100 per page (the .diff answers 406 without `serve_diff`).
+    """
+    failed = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        path = request.url.path
+        if path in fail_first and path not in failed:
+            failed.add(path)
+            return httpx.Response(503)
+        if request.headers.get("Accept") == DIFF_ACCEPT:
+            if not serve_diff:
+                return httpx.Response(406)
+            diff = "".join(
+                f"diff --git a/src/f{i}.py b/src/f{i}.py\n--- a/src/f{i}.py\n+++ b/src/f{i}.py\n@@ -1 +1 @@\n+x\n"
+                for i in range(changed_files)
+            )
+            return httpx.Response(200, text=diff)
+        if path.endswith("/files"):
+            page = int(request.url.params.get("page", 1))
+            last = max(1, -(-changed_files // 100))
+            headers = {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4000", "X-RateLimit-Reset": "0"}
+            if page < last:
+                base = f"https://api.github.com{path}?per_page=100"
+                headers["Link"] = f'<{base}&page={page + 1}>; rel="next", <{base}&page={last}>; rel="last"'
+            start = (page - 1) * 100
+            files = [
+                {"filename": f"src/f{i}.py", "status": "modified", "additions": 1, "deletions": 0,
+                 "changes": 1, "patch": "@@ -1 +1 @@\n+x"}
+                for i in range(start, min(start + 100, changed_files))
+            ]
+            return httpx.Response(200, json=files, headers=headers)
+        return httpx.Response(200, json={"title": "Paged", "body": "", "state": "open", "additions": changed_files,
+                                         "deletions": 0, "changed_files": changed_files, "mergeable": True,
+                                         "head": {"sha": head_sha}})
+
+    return handler
+
+
+def mocked_client(handler) -> AsyncGitHubClient:
+    client = AsyncGitHubClient()
+    client._client = httpx.AsyncClient(base_url="https://api.github.com", transport=httpx.MockTransport(handler))
+    return client
+
+
+def file_pages(requests):
+    return sorted(int(r.url.params["page"]) for r in requests if r.url.path.endswith("/files"))
+
+
+def test_every_file_comes_from_the_streamed_diff():
+    requests = []
+    client = mocked_client(fake_github(250, requests))
+
+    diff = asyncio.run(client.get_pr_diff("octo/paged", 1))
+
+    assert diff["changed_files"] == 250
+    assert [f["filename"] for f in diff["files"]] == [f"src/f{i}.py" for i in range(250)]
+    assert diff["files"][0]["patch"] == "@@ -1 +1 @@\n+x"
+    assert file_pages(requests) == []
+
+
+def test_file_pages_are_fetched_in_order_when_the_diff_is_too_large():
+    requests = []
+    client = mocked_client(fake_github(250, requests, serve_diff=False))
+
+    diff = asyncio.run(client.get_pr_diff("octo/paged", 2))
+
+    assert [f["filename"] for f in diff["files"]] == [f"src/f{i}.py" for i in range(250)]
+    assert file_pages(requests) == [1, 2, 3]
+
+
+def test_patches_past_the_byte_budget_are_dropped(monkeypatch):
+    monkeypatch.setattr(github_async_module.settings, "GITHUB_DIFF_MAX_BYTES", 100)
+    client = mocked_client(fake_github(20, []))
+
+    files = asyncio.run(client.get_pr_diff("octo/budget", 6))["files"]
+
+    assert len(files) == 20  # every file is still listed, with its counts
+    kept = [f for f in files if f["patch"]]
+    assert 0 < len(kept) < 20
+    assert all(f["truncated"] and f["additions"] == 1 for f in files[len(kept):])
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, "sleep", lambda seconds: real_sleep(0))  # skip the backoff
+    requests = []
+    client = mocked_client(fake_github(3, requests, fail_first=("/repos/octo/flaky/pulls/3",)))
+
+    diff = asyncio.run(client.get_pr_diff("octo/flaky", 3))
+
+    assert diff["title"] == "Paged"
+    # The PR and its .diff share the path; whichever went first was retried
+    assert [r.url.path for r in requests].count("/repos/octo/flaky/pulls/3") == 3
+
+
+def test_service_runs_the_async_client_for_blocking_callers():
+    requests = []
+    service = GitHubService()
+    service._event_loop()
+    service._async._client = httpx.AsyncClient(base_url="https://api.github.com",
+                                               transport=httpx.MockTransport(fake_github(3, requests)))
+
+    timings = {}
+    with metrics.job(timings):
+        diff = service.get_pr_diff("octo/sync", 4)
+
+    assert [f["filename"] for f in diff["files"]] == ["src/f0.py", "src/f1.py", "src/f2.py"]
+    assert "github_api" in timings  # stage timings reach the calling job
+
+
+def test_unchanged_resources_are_served_from_304s(monkeypatch, isolated_metrics):
+    store = {}
+    monkeypatch.setattr(github_async_module.cache, "get", store.get)
+    monkeypatch.setattr(github_async_module.cache, "set", lambda key, value, expire=3600: store.__setitem__(key, value))
+
+    inner, conditional = [], []
+    handler = fake_github(3, inner)
+
+    def with_etags(request: httpx.Request) -> httpx.Response:
+        etag = f'"{request.url.path}:{request.url.query.decode()}"'
+        if request.headers.get("If-None-Match") == etag:
+            conditional.append(request.url.path)
+            return httpx.Response(304, headers={"ETag": etag, "X-RateLimit-Remaining": "4000"})
+        response = handler(request)
+        response.headers["ETag"] = etag
+        return response
+
+    client = mocked_client(with_etags)
+    first = asyncio.run(client.get_pr_diff("octo/etag", 5))  # no head SHA: not served from the diff cache
+    second = asyncio.run(client.get_pr_diff("octo/etag", 5))
+
+    assert second == first
+    assert conditional == ["/repos/octo/etag/pulls/5", "/repos/octo/etag/pulls/5"]  # PR and its .diff
+    assert metrics.counter("github_requests_total") == {
+        "endpoint=diff,result=fetched": 1, "endpoint=diff,result=not_modified": 1,
+        "endpoint=pull,result=fetched": 1, "endpoint=pull,result=not_modified": 1
+    }
+
+
+def test_diffs_are_cached_per_head_sha(monkeypatch):
+    store = {}
+    monkeypatch.setattr(github_async_module.cache, "get", store.get)
+    monkeypatch.setattr(github_async_module.cache, "set", lambda key, value, expire=3600: store.__setitem__(key, value))
+    requests = []
+    client = mocked_client(fake_github(3, requests, head_sha="a" * 40))
+
+    first = asyncio.run(client.get_pr_diff("octo/sha", 7, "a" * 40))
+    fetched = len(requests)
+    again = asyncio.run(client.get_pr_diff("octo/sha", 7, "a" * 40))
+    assert again == first and len(requests) == fetched  # same commit: no GitHub calls
+
+    asyncio.run(client.get_pr_diff("octo/sha", 7, "b" * 40))  # a push: never the old commit's diff
+    assert len(requests) == 2 * fetched
@@ -0,0 +1,124 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from celery.exceptions import Retry
+from fastapi.testclient import TestClient
+
+from config import settings
+from database import SessionLocal, CodeReview
+import main
+import celery_app
+import services.ai_analyzer
+import services.analysis_dedup
+from services.analysis_dedup import analysis_dedup
+from services.github_service import github_service
+from services.ai_analyzer import analyzer
+
+REPO = "octo/idempotent"
+pytestmark = pytest.mark.usefixtures("eager_celery")
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = {"github": 0, "llm": 0}
+
+    def fake_diff(repo_name, pr_number, head_sha=None):
+        calls["github"] += 1
+        return {"changed_files": 1, "additions": 2, "deletions": 0, "files": []}
+
+    def fake_analyze(pr_data):
+        calls["llm"] += 1
+        return {"analysis": "Fine", "status": "completed", "model": "stub"}
+
+    monkeypatch.setattr(github_service, "get_pr_diff", fake_diff)
+    monkeypatch.setattr(analyzer, "analyze_pr", fake_analyze)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: None)
+    return calls
+
+
+def review_count(pr_id):
+    db = SessionLocal()
+    try:
+        return db.query(CodeReview).filter_by(pull_request_id=pr_id).count()
+    finally:
+        db.close()
+
+
+def test_same_commit_reuses_stored_review(calls, webhook):
+    pr = main.save_pull_request(webhook(1, "a1" * 20))
+    first = celery_app.analyze_pr_task.delay(pr["id"]).get()
+    second = celery_app.analyze_pr_task.delay(pr["id"]).get()
+
+    assert first["status"] == "fetched"
+    assert second["status"] == "reused"
+    assert calls == {"github": 1, "llm": 1}
+    assert review_count(pr["id"]) == 1
+
+
+def test_new_head_sha_is_analyzed_again(calls, webhook):
+    pr = main.save_pull_request(webhook(2, "b1" * 20))
+    celery_app.analyze_pr_task.delay(pr["id"]).get()
+    main.save_pull_request(webhook(2, "b2" * 20, action="synchronize"))
+    result = celery_app.analyze_pr_task.delay(pr["id"]).get()
+
+    assert result["status"] == "fetched"
+    assert calls["llm"] == 2
+    assert review_count(pr["id"]) == 2
+
+
+def test_new_analyzer_version_is_not_reused(calls, monkeypatch, webhook):
+    pr = main.save_pull_request(webhook(3, "c1" * 20))
+    celery_app.analyze_pr_task.delay(pr["id"]).get()
+
+    monkeypatch.setattr(services.ai_analyzer, "ANALYZER_VERSION", "next-model:1")
+    monkeypatch.setattr(services.analysis_dedup, "ANALYZER_VERSION", "next-model:1")
+    result = celery_app.analyze_pr_task.delay(pr["id"]).get()
+
+    assert result["status"] == "fetched"
+    assert calls["llm"] == 2
+
+
+def test_force_reanalyzes(calls, webhook):
+    pr = main.save_pull_request(webhook(4, "d1" * 20))
+    celery_app.analyze_pr_task.delay(pr["id"]).get()
+    result = celery_app.analyze_pr_task.delay(pr["id"], force=True).get()
+
+    assert result["status"] == "fetched"
+    assert calls["llm"] == 2
+
+
+def test_manual_trigger_returns_stored_review(calls, monkeypatch, webhook):
+    dispatched = []
+    monkeypatch.setattr(main.analysis_scheduler, "dispatch", lambda *a, **kw: dispatched.append(kw) or "task-1")
+
+    pr = main.save_pull_request(webhook(5, "e1" * 20))
+    celery_app.analyze_pr_task.delay(pr["id"]).get()
+
+    client = TestClient(main.app)
+    response = client.post(f"/analyze/{pr['id']}")
+    assert response.status_code == 200
+    assert response.json()["reused"] is True
+    assert dispatched == []
+
+    response = client.post(f"/analyze/{pr['id']}?force=true")
+    assert response.json()["task_id"] == "task-1"
+    assert dispatched[0]["force"] is True
+
+
+def test_duplicate_in_flight_waits_for_the_first(calls, monkeypatch, webhook):
+    retries = []
+
+    def fake_retry(countdown=None, **kwargs):
+        retries.append(countdown)
+        return Retry(when=countdown)
+
+    pr = main.save_pull_request(webhook(6, "f1" * 20))
+    monkeypatch.setattr(analysis_dedup, "acquire", lambda *args: False)
+    monkeypatch.setattr(celery_app.analyze_pr_task, "retry", fake_retry)
+
+    with pytest.raises(Retry):
+        celery_app.analyze_pr_task.run(pr["id"])
+    assert retries == [settings.ANALYSIS_LOCK_RETRY_SECONDS]
+    assert calls == {"github": 0, "llm": 0}
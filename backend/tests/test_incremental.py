@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import httpx
+import pytest
+
+from database import SessionLocal, CodeReview
+import main
+import celery_app
+from services.ai_analyzer import analyzer
+from services.github_async import AsyncGitHubClient
+from services.github_service import github_service
+from services.incremental_review import split_findings, render
+
+REPO = "octo/incremental"
+pytestmark = pytest.mark.usefixtures("eager_celery")
+
+
+def changed(*names):
+    return [{"filename": name, "status": "modified", "additions": 1, "deletions": 0, "changes": 1,
+             "patch": "@@ -1 +1 @@\n+x"} for name in names]
+
+
+def test_findings_round_trip():
+    text = "Overall fine.\n\n### File: `api.py`\nMissing auth check.\n\n### File: db.py\nN+1 query."
+
+    overview, findings = split_findings(text)
+
+    assert overview == "Overall fine."
+    assert findings == {"api.py": "Missing auth check.", "db.py": "N+1 query."}
+    assert split_findings(render(overview, findings)) == (overview, findings)
+
+
+def test_push_reanalyzes_only_changed_files_and_keeps_other_notes(monkeypatch, webhook):
+    calls = []
+    prompts = []
+
+    def fake_diff(repo_name, pr_number, head_sha=None):
+        calls.append("full")
+        return {"changed_files": 2, "additions": 2, "deletions": 0, "files": changed("api.py", "db.py")}
+
+    def fake_changes(repo_name, pr_number, base_sha, head_sha):
+        calls.append(("changes", base_sha, head_sha))
+        return {"changed_files": 2, "additions": 3, "deletions": 0, "files": changed("api.py"),
+                "base_sha": base_sha, "head_sha": head_sha}
+
+    def fake_analyze(pr_data):
+        files = [f["filename"] for f in pr_data["diff_data"]["files"]]
+        prompts.append(files)
+        notes = "".join(f"\n\n### File: {name}\nNotes on {name} v{len(prompts)}." for name in files)
+        return {"analysis": f"Review {len(prompts)}.{notes}", "status": "completed",
+                "model": "stub", "used_real_diff": True}
+
+    monkeypatch.setattr(github_service, "get_pr_diff", fake_diff)
+    monkeypatch.setattr(github_service, "get_pr_changes", fake_changes)
+    monkeypatch.setattr(analyzer, "analyze_pr", fake_analyze)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: None)
+
+    pr = main.save_pull_request(webhook(1, "a1" * 20))
+    celery_app.analyze_pr_task.delay(pr["id"]).get()
+    main.save_pull_request(webhook(1, "a2" * 20, action="synchronize"))
+    celery_app.analyze_pr_task.delay(pr["id"]).get()
+
+    assert calls == ["full", ("changes", "a1" * 20, "a2" * 20)]
+    assert prompts == [["api.py", "db.py"], ["api.py"]]
+
+    db = SessionLocal()
+    try:
+        first, second = db.query(CodeReview).filter_by(pull_request_id=pr["id"]).order_by(CodeReview.id)
+        assert first.base_sha is None
+        assert second.base_sha == "a1" * 20
+        assert second.file_findings == {"api.py": "Notes on api.py v2.", "db.py": "Notes on db.py v1."}
+        assert "Review 2." in second.analysis_text and "Notes on db.py v1." in second.analysis_text
+    finally:
+        db.close()
+
+    # force reviews the whole diff again
+    main.save_pull_request(webhook(1, "a3" * 20, action="synchronize"))
+    celery_app.analyze_pr_task.delay(pr["id"], force=True).get()
+    assert calls[-1] == "full"
+
+
+def compare_client(status, files):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if "/compare/" in request.url.path:
+            return httpx.Response(200, json={"status": status, "files": files})
+        return httpx.Response(200, json={"title": "Iterative PR", "changed_files": 5})
+
+    client = AsyncGitHubClient()
+    client._client = httpx.AsyncClient(base_url="https://api.github.com", transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_compare_returns_only_the_new_changes():
+    client = compare_client("ahead", changed("api.py"))
+
+    diff = asyncio.run(client.get_pr_changes("octo/incremental", 2, "b1" * 20, "b2" * 20))
+
+    assert [f["filename"] for f in diff["files"]] == ["api.py"]
+    assert diff["changed_files"] == 5
+    assert (diff["base_sha"], diff["head_sha"]) == ("b1" * 20, "b2" * 20)
+
+
+def test_force_pushes_fall_back_to_the_whole_diff():
+    client = compare_client("diverged", changed("api.py"))
+
+    assert asyncio.run(client.get_pr_changes("octo/incremental", 3, "c1" * 20, "c2" * 20)) is None
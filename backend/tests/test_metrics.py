@@ -0,0 +1,127 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+from database import SessionLocal, CodeReview
+import main
+import celery_app
+from services.analysis_scheduler import analysis_scheduler
+from services.github_service import github_service
+from services.ai_analyzer import analyzer
+from services.metrics import Metrics, metrics
+from services.task_state import task_state
+
+
+def local_metrics():
+    recorder = Metrics()
+    recorder.redis_client = None
+    return recorder
+
+
+def test_stages_add_up_into_the_job():
+    recorder = local_metrics()
+    timings = {}
+    with recorder.job(timings):
+        with recorder.stage("github_api"):
+            time.sleep(0.01)
+        with recorder.stage("github_api"):
+            pass
+    with recorder.stage("outside"):
+        pass
+
+    assert set(timings) == {"github_api"}
+    assert timings["github_api"] >= 0.01
+    summary = recorder.summary("stage_seconds")
+    assert summary["stage=github_api"]["count"] == 2
+    assert summary["stage=outside"]["count"] == 1
+
+
+def test_prometheus_buckets_are_cumulative():
+    recorder = local_metrics()
+    recorder.observe("llm_tokens", 120, kind="prompt")
+    recorder.observe("llm_tokens", 900, kind="prompt")
+    recorder.incr("cache_requests_total", cache="github_diff", result="hit")
+
+    lines = recorder.prometheus().splitlines()
+    assert "# TYPE pullsense_llm_tokens histogram" in lines
+    assert 'pullsense_llm_tokens_bucket{kind="prompt",le="100"} 0' in lines
+    assert 'pullsense_llm_tokens_bucket{kind="prompt",le="250"} 1' in lines
+    assert 'pullsense_llm_tokens_bucket{kind="prompt",le="1000"} 2' in lines
+    assert 'pullsense_llm_tokens_bucket{kind="prompt",le="+Inf"} 2' in lines
+    assert 'pullsense_llm_tokens_count{kind="prompt"} 2' in lines
+    assert 'pullsense_llm_tokens_sum{kind="prompt"} 1020' in lines
+    assert 'pullsense_cache_requests_total{cache="github_diff",result="hit"} 1' in lines
+
+
+def test_recording_is_buffered_until_a_flush():
+    pipelines = []
+
+    class CountingRedis:
+        def pipeline(self, transaction=True):
+            pipelines.append([])
+            commands = pipelines[-1]
+
+            class Pipeline:
+                def __getattr__(self, command):
+                    return lambda *args: commands.append((command,) + args)
+
+                def execute(self):
+                    return []
+
+            return Pipeline()
+
+    recorder = Metrics(flush_seconds=3600)
+    recorder.redis_client = CountingRedis()
+    for _ in range(100):
+        recorder.incr("cache_requests_total", cache="github_diff", tier="local", result="hit")
+        recorder.observe("stage_seconds", 0.002, stage="cache_lookup")
+    assert pipelines == []  # no I/O on the recording path
+
+    recorder.flush()
+    assert len(pipelines) == 1
+    assert ("hincrby", "pullsense:metrics:cache_requests_total:cache=github_diff,result=hit,tier=local",
+            "value", 100) in pipelines[0]
+
+
+@pytest.mark.usefixtures("eager_celery")
+def test_review_stores_stage_timings_and_tokens(monkeypatch, webhook):
+    def analyzed(pr_data):
+        return {"analysis": "ok", "status": "completed", "model": "stub",
+                "usage": {"prompt_tokens": 812, "completion_tokens": 97}}
+
+    monkeypatch.setattr(github_service, "get_pr_diff", lambda repo_name, pr_number, head_sha=None: None)
+    monkeypatch.setattr(analyzer, "analyze_pr", analyzed)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: None)
+
+    pr = main.save_pull_request(webhook(19, "19" * 20, repo="octo/metrics"))
+    task_id = analysis_scheduler.dispatch(pr["id"], priority_class="manual")
+    review_id = task_state.get(task_id)["review_id"]
+
+    db = SessionLocal()
+    try:
+        review = db.query(CodeReview).filter_by(id=review_id).first()
+        assert {"github_fetch", "payload_load"} <= set(review.stage_timings)
+        assert review.prompt_tokens == 812
+        assert review.completion_tokens == 97
+    finally:
+        db.close()
+
+    analysis = TestClient(main.app).get(f"/pull-requests/{pr['id']}/analysis").json()["analysis"]
+    assert analysis["tokens"] == {"prompt": 812, "completion": 97}
+    assert "github_fetch" in analysis["stage_timings"]
+
+
+def test_metrics_endpoint_exports_request_latency(isolated_metrics):
+    client = TestClient(main.app)
+    client.get("/tasks/abc")
+    client.get("/tasks/def")
+    expected = 'pullsense_http_request_seconds_count{method="GET",route="/tasks/{task_id}",status="404"} 2'
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert expected in response.text
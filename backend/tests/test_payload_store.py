@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from database import Base, SessionLocal, PayloadBlob
+from services.payload_store import payload_store
+
+
+def webhook_payload(action, number, repo="octo/store"):
+    repository = {"id": 1, "full_name": repo, "description": "x" * 500, "owner": {"login": "octo"}}
+    user = {"login": f"{repo}-dev", "id": 7}
+    return {
+        "action": action,
+        "number": number,
+        "pull_request": {"number": number, "title": f"PR {number}", "user": user,
+                         "head": {"sha": f"{number:040x}", "repo": repository}},
+        "repository": repository,
+        "sender": user
+    }
+
+
+def blob_count(db):
+    return db.query(PayloadBlob).count()
+
+
+def test_put_get_round_trip():
+    db = SessionLocal()
+    try:
+        payload = webhook_payload("opened", 1)
+        payload_hash = payload_store.put(db, payload)
+        db.commit()
+
+        assert payload_store.get(db, payload_hash) == payload
+        assert payload_store.get(db, "0" * 64) is None
+        assert payload_store.get(db, None) is None
+    finally:
+        db.close()
+
+
+def test_shared_sub_objects_are_stored_once():
+    db = SessionLocal()
+    try:
+        before = blob_count(db)
+        first = payload_store.put(db, webhook_payload("opened", 2, repo="octo/dedup"))
+        db.commit()
+        # repository (also the head repo), sender (also pull_request.user), envelope
+        assert blob_count(db) - before == 3
+
+        second = payload_store.put(db, webhook_payload("synchronize", 2, repo="octo/dedup"))
+        again = payload_store.put(db, webhook_payload("synchronize", 2, repo="octo/dedup"))
+        db.commit()
+        assert second != first and again == second
+        assert blob_count(db) - before == 4  # only the new envelope
+    finally:
+        db.close()
+
+
+def test_backfill_moves_raw_data_and_clears_the_column(tmp_path):
+    # A pre-payload-store database: pull_requests still has raw_data
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    payloads = [webhook_payload("opened", n) for n in range(3)]
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE pull_requests ADD COLUMN raw_data TEXT"))
+        for n, payload in enumerate(payloads):
+            conn.execute(text(
+                "INSERT INTO pull_requests (repo_name, pr_number, raw_data) VALUES ('octo/store', :n, :raw)"
+            ), {"n": n, "raw": json.dumps(payload)})
+
+    db = Session(bind=engine)
+    try:
+        assert payload_store.backfill_raw_data(db, batch_size=2) == 3
+        rows = db.execute(text(
+            "SELECT raw_data, payload_hash FROM pull_requests ORDER BY pr_number"
+        )).fetchall()
+        assert all(raw_data is None for raw_data, _ in rows)
+        assert [payload_store.get(db, payload_hash) for _, payload_hash in rows] == payloads
+        assert payload_store.backfill_raw_data(db) == 0  # nothing left to move
+    finally:
+        db.close()
+        engine.dispose()
@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from database import SessionLocal, CodeReview, PullRequest
+import main
+import celery_app
+from services.github_service import github_service
+from services.ai_analyzer import analyzer
+
+REPO = "octo/pipeline"
+pytestmark = pytest.mark.usefixtures("eager_celery")
+
+
+def test_stages_are_routed_to_their_own_queues():
+    router = celery_app.app.amqp.router
+    for task, queue in [
+        ("celery_app.analyze_pr_task", "github"),
+        ("celery_app.analyze_stage_task", "llm"),
+        ("celery_app.persist_stage_task", "db"),
+    ]:
+        assert router.route({}, task)["queue"].name == queue
+
+
+def test_pipeline_runs_fetch_analyze_persist(monkeypatch, webhook):
+    seen = {}
+    broadcasts = []
+
+    def fake_diff(repo_name, pr_number, head_sha=None):
+        return {"changed_files": 1, "additions": 3, "deletions": 1, "files": []}
+
+    def fake_analyze(pr_data):
+        seen.update(pr_data)
+        return {"analysis": "Looks good", "status": "completed", "model": "stub"}
+
+    monkeypatch.setattr(github_service, "get_pr_diff", fake_diff)
+    monkeypatch.setattr(analyzer, "analyze_pr", fake_analyze)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: broadcasts.append(args))
+
+    pr = main.save_pull_request(webhook(1, "d" * 40, body="Adds the thing"))
+    result = celery_app.analyze_pr_task.delay(pr["id"]).get()
+
+    assert result["status"] == "fetched"
+    assert seen["body"] == "Adds the thing"
+    assert seen["diff_data"]["additions"] == 3
+    assert broadcasts == [(pr["id"], "completed", "octo/pipeline", 1)]
+
+    db = SessionLocal()
+    try:
+        review = db.query(CodeReview).filter_by(pull_request_id=pr["id"]).one()
+        assert review.analysis_text == "Looks good"
+        assert review.head_sha == "d" * 40
+        assert db.get(PullRequest, pr["id"]).analysis_status == "completed"
+    finally:
+        db.close()
+
+
+def test_analysis_failure_is_broadcast_and_not_persisted(monkeypatch, webhook):
+    broadcasts = []
+
+    def broken_analyze(pr_data):
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(github_service, "get_pr_diff", lambda repo_name, pr_number, head_sha=None: None)
+    monkeypatch.setattr(analyzer, "analyze_pr", broken_analyze)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: broadcasts.append(args))
+
+    pr = main.save_pull_request(webhook(2, "e" * 40))
+    celery_app.analyze_pr_task.delay(pr["id"])
+
+    assert broadcasts == [(pr["id"], "error", "octo/pipeline", 2)]
+    db = SessionLocal()
+    try:
+        assert db.query(CodeReview).filter_by(pull_request_id=pr["id"]).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from celery.exceptions import Retry
+from fastapi.testclient import TestClient
+from config import settings
+import main
+import celery_app
+from services.analysis_scheduler import analysis_scheduler, PRIORITIES
+from services.fair_share import fair_share
+from services.metrics import Metrics, metrics
+
+
+def payload(login, additions=10, deletions=5):
+    return {"pull_request": {"user": {"login": login}, "additions": additions, "deletions": deletions}}
+
+
+def test_classify_bots_and_large_diffs_as_bulk():
+    assert analysis_scheduler.classify(payload("alice")) == "small"
+    assert analysis_scheduler.classify(payload("dependabot[bot]")) == "bulk"
+    assert analysis_scheduler.classify(payload("some-app[bot]")) == "bulk"
+    assert analysis_scheduler.classify(payload("alice", additions=5000)) == "bulk"
+    assert analysis_scheduler.classify({}) == "small"
+
+
+def test_dispatch_sets_celery_priority(monkeypatch):
+    sent = []
+
+    class Result:
+        id = "task-1"
+
+    def fake_apply_async(args=None, kwargs=None, **options):
+        sent.append((args, kwargs, options))
+        return Result()
+
+    monkeypatch.setattr(celery_app.analyze_pr_task, "apply_async", fake_apply_async)
+
+    analysis_scheduler.dispatch(7, priority_class="manual")
+    analysis_scheduler.dispatch(8, generation=3, delay=20, priority_class="bulk")
+
+    (args, kwargs, options), (bulk_args, bulk_kwargs, bulk_options) = sent
+    assert args == [7] and kwargs["priority_class"] == "manual"
+    assert options["priority"] == PRIORITIES["manual"] == 0
+    assert bulk_kwargs["generation"] == 3
+    assert bulk_options["priority"] == PRIORITIES["bulk"]
+    assert bulk_options["countdown"] == 20
+    assert bulk_kwargs["due_at"] - kwargs["due_at"] >= 19
+
+
+def test_histogram_summary():
+    m = Metrics()
+    m.redis_client = None  # in-process fallback
+    for value in [0.05] * 6 + [3] * 3 + [100]:
+        m.observe("queue_wait_seconds", value, priority="small")
+    m.observe("queue_wait_seconds", 0.2, priority="manual")
+
+    summary = m.summary("queue_wait_seconds")
+    assert summary["priority=small"]["count"] == 10
+    assert summary["priority=small"]["p50_seconds"] == 0.1
+    assert summary["priority=small"]["p95_seconds"] == 120
+    assert summary["priority=manual"]["avg_seconds"] == 0.2
+
+
+def test_stats_reports_queue_wait_per_class(isolated_metrics):
+    metrics.observe("queue_wait_seconds", 1.5, priority="bulk")
+
+    response = TestClient(main.app).get("/stats")
+    assert response.status_code == 200
+    assert response.json()["queue_wait_seconds"]["bulk"]["count"] == 1
+
+
+def test_fair_share_retries_back_off_with_jitter_then_stop(monkeypatch):
+    monkeypatch.setattr(fair_share, "max_retries", 6)
+    first = [fair_share.retry_in(0) for _ in range(50)]
+    later = [fair_share.retry_in(5) for _ in range(50)]
+    base, cap = settings.FAIR_SHARE_RETRY_SECONDS, settings.FAIR_SHARE_RETRY_MAX_SECONDS
+    assert all(base / 2 <= d <= base for d in first)
+    assert all(min(cap, base * 32) / 2 <= d <= cap for d in later)
+    assert len(set(later)) > 1  # jittered
+    assert fair_share.retry_in(6) is None
+
+
+def test_denied_job_gives_up_after_the_retry_cap(monkeypatch, webhook):
+    retries, broadcasts = [], []
+
+    def fake_retry(countdown=None, kwargs=None, **options):
+        retries.append(kwargs["fair_share_waits"])
+        return Retry(when=countdown)
+
+    pr = main.save_pull_request(webhook(1, repo="octo/fair"))
+    monkeypatch.setattr(fair_share, "acquire", lambda *args: False)
+    monkeypatch.setattr(fair_share, "max_retries", 2)
+    monkeypatch.setattr(celery_app.analyze_pr_task, "retry", fake_retry)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: broadcasts.append(args))
+
+    for waits in range(2):
+        with pytest.raises(Retry):
+            celery_app.analyze_pr_task.run(pr["id"], fair_share_waits=waits)
+    result = celery_app.analyze_pr_task.run(pr["id"], fair_share_waits=2)
+
+    assert retries == [1, 2]
+    assert result["status"] == "error"
+    assert broadcasts == [(pr["id"], "error", "octo/fair", 1)]
@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from database import engine, SessionLocal, PullRequest, CodeReview
+import migrations
+import main
+
+
+def query_plan(query) -> str:
+    """SQLite's EXPLAIN QUERY PLAN for an ORM query, as one string."""
+    compiled = query.statement.compile(dialect=engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_migrations_are_recorded_and_idempotent():
+    assert migrations.applied_versions(engine) >= {v for v, _, _ in migrations.MIGRATIONS}
+    assert migrations.upgrade(engine) == []
+
+
+def test_recent_prs_use_created_at_index():
+    db = SessionLocal()
+    try:
+        plan = query_plan(db.query(PullRequest).order_by(PullRequest.created_at.desc()).limit(20))
+    finally:
+        db.close()
+    assert "ix_pull_requests_created_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_deep_keyset_page_is_a_range_seek():
+    db = SessionLocal()
+    try:
+        cursor = main.encode_cursor(datetime(2024, 1, 1), 500)
+        plan = query_plan(main.filter_prs(db.query(PullRequest.id), cursor=cursor).limit(21))
+    finally:
+        db.close()
+    assert "SEARCH pull_requests USING COVERING INDEX ix_pull_requests_created_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_filtered_pages_use_their_index():
+    db = SessionLocal()
+    cursor = main.encode_cursor(datetime(2024, 1, 1), 500)
+    try:
+        for field, index in [
+            ("repo", "ix_pull_requests_repo_created"),
+            ("author", "ix_pull_requests_author_created"),
+            ("action", "ix_pull_requests_action_created"),
+            ("status", "ix_pull_requests_status_created"),
+        ]:
+            query = main.filter_prs(db.query(PullRequest.id), cursor=cursor, **{field: "x"}).limit(21)
+            plan = query_plan(query)
+            assert index in plan, plan
+            assert "TEMP B-TREE" not in plan
+    finally:
+        db.close()
+
+
+def test_latest_review_uses_composite_index():
+    db = SessionLocal()
+    try:
+        plan = query_plan(
+            db.query(CodeReview)
+            .filter_by(pull_request_id=1)
+            .order_by(CodeReview.created_at.desc())
+            .limit(1)
+        )
+    finally:
+        db.close()
+    assert "SEARCH code_reviews USING INDEX ix_code_reviews_pr_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_pr_lookup_uses_repo_pr_index():
+    db = SessionLocal()
+    try:
+        plan = query_plan(db.query(PullRequest).filter_by(repo_name="octo/repo", pr_number=5))
+    finally:
+        db.close()
+    assert "ux_pull_requests_repo_pr" in plan
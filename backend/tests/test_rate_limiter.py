@@ -0,0 +1,147 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import httpx
+import openai
+import pytest
+from celery.exceptions import Retry
+from fastapi.testclient import TestClient
+
+from config import settings
+import main
+import celery_app
+from services.ai_analyzer import analyzer
+from services.github_service import github_service
+from services.rate_limiter import RateLimiter, RateLimited, backoff_seconds, rate_limiter
+from services.stage_store import stage_store
+from services.task_state import task_state
+
+
+def local_limiter():
+    limiter = RateLimiter()
+    limiter.redis_client = None
+    return limiter
+
+
+def test_backoff_grows_with_jitter_and_honours_retry_after():
+    first = [backoff_seconds(0) for _ in range(50)]
+    later = [backoff_seconds(4) for _ in range(50)]
+    assert all(1 <= b <= 2 for b in first)
+    assert all(16 <= b <= 32 for b in later)
+    assert len(set(later)) > 1  # jittered
+    assert backoff_seconds(0, retry_after=60) == 60
+    assert backoff_seconds(50) <= 300
+
+
+def test_budget_follows_github_headers():
+    limiter = local_limiter()
+    reset = int(time.time()) + 1200
+    limiter.observe("github", {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4321",
+                               "X-RateLimit-Reset": str(reset)})
+
+    budget = limiter.budget("github")
+    assert budget["limit"] == 5000
+    assert 4321 <= budget["remaining"] <= 4322
+    assert budget["blocked_until"] is None
+
+    limiter.observe("github", {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "0",
+                               "X-RateLimit-Reset": str(reset)})
+    budget = limiter.budget("github")
+    assert budget["remaining"] == 0
+    assert budget["blocked_until"] == budget["reset"]
+
+
+def test_openai_429_blocks_the_bucket():
+    limiter = local_limiter()
+    error = limiter.exceeded("openai", {"retry-after": "7"})
+    assert isinstance(error, RateLimited)
+    assert error.retry_after == 7
+    assert limiter.budget("openai")["blocked_until"] is not None
+
+
+def test_analyzer_raises_on_openai_429(monkeypatch):
+    response = httpx.Response(429, headers={"retry-after": "3"},
+                              request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    error = openai.RateLimitError("Rate limit reached", response=response, body=None)
+    monkeypatch.setattr(rate_limiter, "_local", {})
+
+    with pytest.raises(RateLimited) as raised:
+        analyzer._rate_limited({"title": "PR"}, error)
+    assert raised.value.retry_after == 3
+
+
+def test_analysis_stage_retries_instead_of_failing(monkeypatch):
+    broadcasts, retries = [], []
+
+    def throttled(pr_data):
+        raise RateLimited("openai", 12)
+
+    def fake_retry(countdown=None, **kwargs):
+        retries.append(countdown)
+        return Retry(when=countdown)
+
+    monkeypatch.setattr(analyzer, "analyze_pr", throttled)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: broadcasts.append(args))
+    monkeypatch.setattr(celery_app.analyze_stage_task, "retry", fake_retry)
+
+    context = {"pr_id": 1, "repo_name": "octo/limits", "pr_number": 1, "generation": None,
+               "title": "PR", "body": "", "author": "gail", "diff_data": None}
+    with pytest.raises(Retry):
+        celery_app.analyze_stage_task.run(context)
+
+    assert retries and retries[0] >= 12
+    assert broadcasts == []
+
+
+def openai_throttled(pr_data):
+    raise RateLimited("openai", 1)
+
+
+def test_analysis_stage_retry_renews_the_stage_context(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(stage_store, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(analyzer, "analyze_pr", openai_throttled)
+    monkeypatch.setattr(celery_app.analyze_stage_task, "retry", lambda countdown=None, **kwargs: Retry(when=countdown))
+
+    ref = stage_store.put({"pr_id": 1, "repo_name": "octo/limits", "pr_number": 1, "generation": None,
+                           "title": "PR", "body": "", "author": "gail", "diff_data": None})
+    stage_store.redis_client.expire(stage_store.PREFIX + ref, 5)  # nearly expired
+    with pytest.raises(Retry):
+        celery_app.analyze_stage_task.run(ref)
+
+    assert stage_store.redis_client.ttl(stage_store.PREFIX + ref) > 5
+
+
+def test_analysis_stage_gives_up_after_the_retry_cap(monkeypatch):
+    broadcasts = []
+    monkeypatch.setattr(settings, "RATE_LIMIT_MAX_RETRIES", 0)
+    monkeypatch.setattr(analyzer, "analyze_pr", openai_throttled)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: broadcasts.append(args))
+
+    context = {"pr_id": 1, "repo_name": "octo/limits", "pr_number": 1, "generation": None, "task_id": "capped-1",
+               "title": "PR", "body": "", "author": "gail", "diff_data": None}
+    result = celery_app.analyze_stage_task.run(context)
+
+    assert result["status"] == "error"
+    assert task_state.get("capped-1")["state"] == "failed"
+    assert broadcasts == [(1, "error", "octo/limits", 1)]
+
+
+def test_expired_stage_context_fails_the_job(monkeypatch):
+    monkeypatch.setattr(stage_store, "get", lambda ref: None)
+    for stage, job_id in [(celery_app.analyze_stage_task, "expired-1"), (celery_app.persist_stage_task, "expired-2")]:
+        assert stage.run("gone", job_id=job_id)["status"] == "error"
+        assert task_state.get(job_id)["state"] == "failed"
+        assert task_state.get(job_id)["error"] == "stage context expired"
+
+
+def test_rate_limit_endpoint_does_not_call_github(monkeypatch):
+    def no_api_calls():
+        raise AssertionError("spent an API call")
+
+    monkeypatch.setattr(github_service.client, "get_rate_limit", no_api_calls)
+    response = TestClient(main.app).get("/github/rate-limit")
+    assert response.status_code == 200
+    assert response.json()["limit"] > 0
@@ -0,0 +1,117 @@
+import sys
+import os
+import asyncio
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from services.connection_manager import ConnectionManager
+from services.redis_client import WEBSOCKET_CHANNEL, TASK_CHANNEL
+from tests.test_connection_manager import FakeSocket
+
+
+class FakePubSub:
+    """Replays queued messages from listen(), then waits like an idle subscription."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        self.channels.extend(channels)
+
+    async def listen(self):
+        for channel, data in self.messages:
+            yield {"type": "message", "channel": channel.encode(), "data": data}
+        await asyncio.Event().wait()
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, messages=(), reachable=True):
+        self.pubsubs = []
+        self.messages = list(messages)
+        self.reachable = reachable
+        self.published = []
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        self.pubsubs.append(FakePubSub(self.messages))
+        return self.pubsubs[-1]
+
+    async def publish(self, channel, data):
+        if not self.reachable:
+            raise ConnectionError("no redis")
+        self.published.append((channel, json.loads(data)))
+
+
+async def local_clients(monkeypatch):
+    """A fresh ConnectionManager with one client on "all" and one on repo:octo/a only."""
+    manager = ConnectionManager(queue_size=10)
+    everyone, repo_fan = FakeSocket(), FakeSocket()
+    await manager.connect(everyone, accept=False)
+    await manager.connect(repo_fan, accept=False)
+    manager.unsubscribe(repo_fan, ["all"])
+    manager.subscribe(repo_fan, ["repo:octo/a"])
+    monkeypatch.setattr(main, "manager", manager)
+    return everyone, repo_fan
+
+
+def test_relay_routes_updates_to_subscribers_and_task_changes_to_waiters(monkeypatch):
+    notified = []
+    redis = FakeRedis([
+        (TASK_CHANNEL, b"task-1"),
+        (WEBSOCKET_CHANNEL, json.dumps({"type": "pr_created", "data": {"pr_id": 1, "repo": "octo/a"}}).encode()),
+        (WEBSOCKET_CHANNEL, b"{not json"),
+        (WEBSOCKET_CHANNEL, json.dumps({"type": "pr_created", "data": {"pr_id": 2, "repo": "octo/b"}}).encode()),
+    ])
+    monkeypatch.setattr(main, "get_async_redis", lambda: redis)
+    monkeypatch.setattr(main.task_state, "notify", notified.append)
+
+    async def scenario():
+        everyone, repo_fan = await local_clients(monkeypatch)
+        relay = asyncio.create_task(main.relay_websocket_updates())
+        await asyncio.sleep(0.05)
+        relay.cancel()
+        await asyncio.gather(relay, return_exceptions=True)
+        return everyone, repo_fan
+
+    everyone, repo_fan = asyncio.run(scenario())
+    assert redis.pubsubs[0].channels == [WEBSOCKET_CHANNEL, TASK_CHANNEL]
+    assert notified == ["task-1"]
+    assert len(everyone.sent) == 2  # the malformed update was dropped
+    assert len(repo_fan.sent) == 1 and '"octo/a"' in repo_fan.sent[0]
+    assert redis.pubsubs[0].closed
+
+
+def test_publish_goes_through_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(main, "get_async_redis", lambda: redis)
+    message = {"type": "analysis_complete", "data": {"pr_id": 3, "repo": "octo/a"}}
+
+    async def scenario():
+        everyone, _ = await local_clients(monkeypatch)
+        await main.publish_update(message)
+        await asyncio.sleep(0.05)
+        return everyone
+
+    everyone = asyncio.run(scenario())
+    assert redis.published == [(WEBSOCKET_CHANNEL, message)]
+    assert everyone.sent == []  # delivered by the relay, not directly
+
+
+def test_publish_falls_back_to_local_broadcast_without_redis(monkeypatch):
+    monkeypatch.setattr(main, "get_async_redis", lambda: FakeRedis(reachable=False))
+
+    async def scenario():
+        everyone, repo_fan = await local_clients(monkeypatch)
+        await main.publish_update({"type": "analysis_complete", "data": {"pr_id": 3, "repo": "octo/a"}})
+        await main.publish_update({"type": "analysis_complete", "data": {"pr_id": 4, "repo": "octo/b"}})
+        await asyncio.sleep(0.05)
+        return everyone, repo_fan
+
+    everyone, repo_fan = asyncio.run(scenario())
+    assert len(everyone.sent) == 2
+    assert len(repo_fan.sent) == 1 and '"pr_id": 3' in repo_fan.sent[0]
@@ -0,0 +1,116 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uuid
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from config import settings
+from database import SessionLocal, CodeReview
+import celery_app
+from services.ai_analyzer import analyzer
+from services.analysis_scheduler import AnalysisScheduler, analysis_scheduler
+from services.task_state import task_state
+
+REPO = "octo/scheduler"
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    """A scheduler on fakeredis that records dispatches and revokes instead of sending them."""
+    scheduler = AnalysisScheduler()
+    scheduler.redis_client = fakeredis.FakeRedis()
+    scheduler.dispatched, scheduler.revoked = [], []
+
+    def fake_dispatch(pr_id, generation=None, delay=0, task_id=None, **options):
+        scheduler.dispatched.append((pr_id, generation, task_id))
+        return task_id
+
+    monkeypatch.setattr(settings, "ANALYSIS_WORKER", "celery")
+    monkeypatch.setattr(scheduler, "dispatch", fake_dispatch)
+    monkeypatch.setattr(celery_app.app.control, "revoke", scheduler.revoked.append)
+    return scheduler
+
+
+def test_same_head_sha_keeps_the_pending_job(scheduler):
+    first = scheduler.schedule(1, REPO, 1, "a" * 40)
+    again = scheduler.schedule(1, REPO, 1, "a" * 40)
+
+    assert again == first
+    assert scheduler.dispatched == [(1, 1, first)]
+    assert scheduler.revoked == []
+
+
+def test_new_head_sha_bumps_the_generation_and_revokes_the_old_task(scheduler):
+    first = scheduler.schedule(2, REPO, 2, "a" * 40)
+    second = scheduler.schedule(2, REPO, 2, "b" * 40)
+
+    assert second != first
+    assert [generation for _, generation, _ in scheduler.dispatched] == [1, 2]
+    assert scheduler.revoked == [first]
+    assert task_state.get(first)["outcome"] == "superseded"
+    assert not scheduler.is_current(REPO, 2, 1)
+    assert scheduler.is_current(REPO, 2, 2)
+
+
+def test_closed_cancels_the_pending_job(scheduler):
+    first = scheduler.schedule(3, REPO, 3, "a" * 40)
+    scheduler.cancel(REPO, 3)
+
+    assert scheduler.revoked == [first]
+    assert not scheduler.is_current(REPO, 3, 1)
+
+    scheduler.cancel(REPO, 3)  # nothing pending: nothing more to revoke
+    assert scheduler.revoked == [first]
+
+
+def test_redelivery_after_finish_reschedules(scheduler):
+    first = scheduler.schedule(4, REPO, 4, "a" * 40)
+    scheduler.finish(REPO, 4, 1)
+    again = scheduler.schedule(4, REPO, 4, "a" * 40)
+
+    assert again != first
+    assert [generation for _, generation, _ in scheduler.dispatched] == [1, 2]
+    assert scheduler.revoked == []  # the finished task isn't revoked
+
+
+def stale_context(pr_number):
+    """An inline stage context (no stage store) for generation 1 of a PR now at generation 2."""
+    analysis_scheduler.redis_client.hset(analysis_scheduler._key(REPO, pr_number), "generation", 2)
+    return {
+        "pr_id": pr_number, "repo_name": REPO, "pr_number": pr_number, "generation": 1,
+        "head_sha": "c" * 40, "task_id": str(uuid.uuid4()), "title": "Stale", "body": "",
+        "author": "octocat", "diff_data": None, "started_at": 0.0,
+        "result": {"analysis": "late", "status": "completed", "model": "stub"}
+    }
+
+
+@pytest.fixture
+def shared_scheduler(monkeypatch):
+    monkeypatch.setattr(analysis_scheduler, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(analyzer, "analyze_pr", lambda pr_data: pytest.fail("stale job reached the LLM"))
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: pytest.fail("stale job broadcast"))
+    return analysis_scheduler
+
+
+def test_stale_generation_is_skipped_before_analysis(shared_scheduler):
+    context = stale_context(5)
+    result = celery_app.analyze_stage_task.run(context)
+
+    assert result["status"] == "superseded"
+    assert task_state.get(context["task_id"])["outcome"] == "superseded"
+
+
+def test_stale_generation_is_not_persisted(shared_scheduler):
+    context = stale_context(6)
+    result = celery_app.persist_stage_task.run(context)
+
+    assert result["status"] == "skipped"
+    assert task_state.get(context["task_id"])["outcome"] == "skipped"
+    db = SessionLocal()
+    try:
+        assert db.query(CodeReview).filter_by(pull_request_id=6, head_sha="c" * 40).count() == 0
+    finally:
+        db.close()
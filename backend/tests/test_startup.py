@@ -0,0 +1,80 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import subprocess
+from fastapi.testclient import TestClient
+
+import main
+from services.cache_service import cache, CacheService
+
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_api_builds_no_clients():
+    # Unroutable Redis: an import-time connection attempt would hang here
+    env = dict(os.environ, REDIS_URL="redis://10.255.255.1:6379/0", OPENAI_API_KEY="sk-test")
+    probe = ("import sys, main; from services.cache_service import cache; "
+             "print('openai' in sys.modules, 'github' in sys.modules, cache._resolved)")
+    result = subprocess.run([sys.executable, "-c", probe], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-3:] == ["False", "False", "False"]
+
+
+def test_redis_is_resolved_on_first_use_and_retried_after_a_backoff(monkeypatch):
+    attempts = []
+
+    class Reachable:
+        def ping(self):
+            return True
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("no redis")
+        return Reachable()
+
+    import services.cache_service as cache_module
+    monkeypatch.setattr(cache_module, "get_redis", flaky)
+    lazy = CacheService()
+    assert attempts == []
+    assert lazy.redis_client is None
+    assert lazy.redis_client is None
+    assert attempts == [1]  # not again before REDIS_RETRY_SECONDS
+
+    lazy._retry_at = 0.0
+    assert isinstance(lazy.redis_client, Reachable)
+    assert isinstance(lazy.redis_client, Reachable)
+    assert attempts == [1, 1]  # connected: never re-checked
+
+
+def test_ready_reports_each_dependency(monkeypatch):
+    client = TestClient(main.app)
+
+    monkeypatch.setattr(cache, "ping", lambda: True)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["checks"] == {"database": True, "redis": True}
+
+    monkeypatch.setattr(cache, "ping", lambda: False)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"] == {"database": True, "redis": False}
+
+
+def test_not_ready_while_services_use_their_fallbacks(monkeypatch):
+    class Reachable:
+        def ping(self):
+            return True
+
+    # Redis answers, but this process's services are on in-process state
+    import services.cache_service as cache_module
+    monkeypatch.setattr(cache_module, "get_redis", lambda: Reachable())
+    monkeypatch.setattr(cache, "_redis_client", None)
+    monkeypatch.setattr(cache, "_resolved", False)
+    monkeypatch.setattr(cache, "_retry_at", float("inf"))
+    response = TestClient(main.app).get("/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["redis"] is False
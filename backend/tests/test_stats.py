@@ -0,0 +1,82 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from datetime import datetime
+from fastapi.testclient import TestClient
+from database import SessionLocal, StatCounter
+from services.stats_service import stats_service
+import main
+
+client = TestClient(main.app)
+
+
+def setup_module(module):
+    # Other test modules insert rows directly - start from consistent counters
+    db = SessionLocal()
+    stats_service.reconcile(db)
+    db.commit()
+    db.close()
+
+
+def test_counters_follow_writes_and_match_reconcile(webhook):
+    before = client.get("/stats").json()
+    
+    for number in range(3):
+        main.save_pull_request(webhook(number, action="edited", repo="octo/stats-a"))
+    main.save_pull_request(webhook(1, action="edited", repo="octo/stats-b"))
+    
+    db = SessionLocal()
+    try:
+        pr_id = db.query(main.PullRequest.id).filter_by(repo_name="octo/stats-a").first().id
+        db.add(main.CodeReview(pull_request_id=pr_id, analysis_status="completed"))
+        stats_service.record_review(db, "completed", "octo/stats-a")
+        db.commit()
+    finally:
+        db.close()
+    
+    after = client.get("/stats").json()
+    assert after["total_prs"] == before["total_prs"] + 4
+    assert after["total_reviews"] == before["total_reviews"] + 1
+    
+    repo_a = client.get("/stats", params={"repo": "octo/stats-a"}).json()
+    assert repo_a["total_prs"] == 3
+    assert repo_a["reviews_by_status"] == {"completed": 1}
+    
+    today = datetime.utcnow().date().isoformat()
+    series = client.get("/stats/daily", params={"repo": "octo/stats-b", "days": 3}).json()["days"]
+    assert series[-1] == {"day": today, "value": 1}
+    
+    # Incremental counters agree with a full rebuild
+    db = SessionLocal()
+    try:
+        incremental = {(c.name, c.repo_name, c.day): c.value for c in db.query(StatCounter)}
+        stats_service.reconcile(db)
+        db.commit()
+        rebuilt = {(c.name, c.repo_name, c.day): c.value for c in db.query(StatCounter)}
+    finally:
+        db.close()
+    assert incremental == rebuilt
+
+
+def test_writes_during_reconcile_wait_and_are_not_lost(webhook):
+    recount = SessionLocal()
+    stats_service.reconcile(recount)  # locked out writers until it commits
+    
+    writer = threading.Thread(target=main.save_pull_request,
+                              args=(webhook(1, action="edited", repo="octo/stats-race"),))
+    writer.start()
+    time.sleep(0.3)
+    assert writer.is_alive()  # its increment waits for the rebuild
+    recount.commit()
+    recount.close()
+    writer.join(timeout=10)
+    
+    db = SessionLocal()
+    try:
+        assert stats_service.snapshot(db, repo_name="octo/stats-race")["prs"] == 1
+        assert stats_service.snapshot(db)["prs"] == db.query(main.PullRequest).count()
+    finally:
+        db.close()
@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import celery_app
+from services.analysis_scheduler import analysis_scheduler
+from services.task_state import task_state
+from services.github_service import github_service
+from services.ai_analyzer import analyzer
+
+REPO = "octo/tasks"
+pytestmark = pytest.mark.usefixtures("eager_celery")
+
+
+def test_task_moves_through_states_to_done(monkeypatch, webhook):
+    monkeypatch.setattr(github_service, "get_pr_diff", lambda repo_name, pr_number, head_sha=None: None)
+    monkeypatch.setattr(analyzer, "analyze_pr", lambda pr_data: {"analysis": "ok", "status": "completed", "model": "stub"})
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: None)
+
+    pr = main.save_pull_request(webhook(1, "1a" * 20))
+    task_id = analysis_scheduler.dispatch(pr["id"], priority_class="manual")
+
+    response = TestClient(main.app).get(f"/tasks/{task_id}")
+    assert response.status_code == 200
+    task = response.json()
+    assert task["state"] == "done"
+    assert task["outcome"] == "analyzed"
+    assert task["review_id"]
+    assert task["pr_id"] == pr["id"]
+    assert task["queued_at"] <= task["fetching_at"] <= task["analyzing_at"] <= task["done_at"]
+
+
+def test_failed_task_records_error(monkeypatch, webhook):
+    def broken(pr_data):
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(github_service, "get_pr_diff", lambda repo_name, pr_number, head_sha=None: None)
+    monkeypatch.setattr(analyzer, "analyze_pr", broken)
+    monkeypatch.setattr(celery_app, "broadcast_analysis_complete", lambda *args: None)
+
+    pr = main.save_pull_request(webhook(2, "2b" * 20))
+    task_id = analysis_scheduler.dispatch(pr["id"])
+
+    task = task_state.get(task_id)
+    assert task["state"] == "failed"
+    assert task["error"] == "LLM down"
+
+
+def test_unknown_task_is_404():
+    client = TestClient(main.app)
+    assert client.get("/tasks/nope").status_code == 404
+    assert client.get("/tasks/nope/wait").status_code == 404
+
+
+def test_long_poll_returns_on_change():
+    task_state.set("poll-1", "queued")
+
+    async def scenario():
+        waiter = asyncio.create_task(task_state.wait("poll-1", version=1, timeout=10))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        task_state.set("poll-1", "fetching")
+        task_state.notify("poll-1")  # what the pub/sub relay does
+        return await waiter
+
+    start = time.monotonic()
+    task = asyncio.run(scenario())
+    assert task["state"] == "fetching"
+    assert task["version"] == 2
+    assert time.monotonic() - start < 2
+
+
+def test_long_poll_times_out_with_current_state():
+    task_state.set("poll-2", "analyzing")
+    response = TestClient(main.app).get("/tasks/poll-2/wait", params={"version": 1, "timeout": 0.1})
+    assert response.json()["state"] == "analyzing"
+
+
+def test_event_stream_ends_with_final_state():
+    task_state.set("sse-1", "queued")
+    task_state.set("sse-1", "done", outcome="reused", review_id=7)
+
+    with TestClient(main.app).stream("GET", "/tasks/sse-1/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        frames = [line for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert [json.loads(frame[6:])["state"] for frame in frames] == ["done"]